@@ -0,0 +1,58 @@
+from bisect import bisect_left, bisect_right
+
+from fixed_point import from_units, to_units
+
+
+class ThresholdIndex:
+    """
+    BUY/SELL targets parsed once into parallel sorted arrays: `values` (float,
+    for comparing prices) and `units` (integer 1e-8 fixed point, the key the
+    trigger times are stored under).
+
+    A buy level fires when price <= level and a sell level when price >= level,
+    so the triggered range is always a suffix (buy) or prefix (sell) of the
+    sorted levels and is found by bisection: O(log n + k) per price update.
+    """
+
+    def __init__(self, targets=()):
+        self._source = tuple(targets)
+
+        parsed = {}
+        for target in self._source:
+            try:
+                units = to_units(target)
+            except (TypeError, ValueError):
+                continue
+            parsed[units] = from_units(units)
+
+        self.units = sorted(parsed)
+        self.values = [parsed[u] for u in self.units]
+        self.by_units = parsed
+
+    def matches(self, targets):
+        if not isinstance(targets, tuple):
+            targets = tuple(targets)
+        return self._source == targets
+
+    def buy_triggered(self, price):
+        """Levels at or above `price`, lowest first."""
+        i = bisect_left(self.values, price)
+        return zip(self.values[i:], self.units[i:])
+
+    def sell_triggered(self, price):
+        """Levels at or below `price`, lowest first."""
+        i = bisect_right(self.values, price)
+        return zip(self.values[:i], self.units[:i])
+
+    def __contains__(self, units):
+        return units in self.by_units
+
+    def __len__(self):
+        return len(self.values)
+
+
+def refresh_index(index, targets):
+    """Return `index` if it was built from `targets`, otherwise a fresh index."""
+    if index is not None and index.matches(targets):
+        return index
+    return ThresholdIndex(targets)
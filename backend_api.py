@@ -1,17 +1,33 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 from pydantic import BaseModel
 from typing import List
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import requests
+import httpx
 import uuid
 import asyncio
+import time
+import threading
 import discord
 from fastapi import BackgroundTasks
+from persistence import JsonStateWriter
+from price_history import PriceHistory
+from sqlite_store import SqlitePriceHistory, SqliteStore, read_json
+from shared_state import ChangeFeed, LeaderLease
+from event_stream import EventBroker, format_sse
+from discord_delivery import DiscordDelivery
+from token_alerts import TokenAlertIndex
+from fixed_point import format_time, parse_time, to_units, triggers_from_json, triggers_to_json, units_key
+from metrics import (
+    ALERT_EVALUATIONS, ALERTS_FIRED, CHECK_CYCLE_SECONDS, CHECK_LATENESS_SECONDS, STATE_WRITE_SECONDS,
+    UPSTREAM_REQUESTS, UPSTREAM_SECONDS,
+)
 
 app = FastAPI()
 
@@ -25,20 +41,99 @@ app.add_middleware(
 
 CONFIG_PATH = "/shared/config.json"
 STATE_PATH = "/shared/jupiter-latest.json"
+ALERTS_PATH = "/shared/discord-alerts.json"
+HISTORY_PATH = "/shared/price-history.bin"
+
+# "json" keeps state in the files above; "sqlite" keeps it in one WAL database and the files become import/export
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "/shared/monitor.db")
+store = SqliteStore(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else None
+
+# Ring buffer size (default ≈ 91 days of 1-minute checks) and how many points /api/state inlines
+PRICE_HISTORY_CAPACITY = int(os.getenv("PRICE_HISTORY_CAPACITY", "131072"))
+LATEST_PRICES_LIMIT = 100
+HISTORY_MAX_BUCKETS = 2000
+
+# Keep-alive comment interval for /api/stream (proxies drop idle connections)
+SSE_HEARTBEAT_SECONDS = 15
+
+# Pushes price ticks, triggers and config changes to open dashboards
+event_broker = EventBroker()
+
+# Bumped on every change to what /api/state returns; doubles as its ETag and the SSE event id
+state_version = 0
+# Restarts reset the counter, so ETags also carry a per-process tag
+STATE_EPOCH = uuid.uuid4().hex[:8]
+
+# This process in the change log and the leader lease (uvicorn --workers runs several)
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+if store is not None:
+    # Workers number changes through the store's log, so they agree on versions and ETags
+    STATE_EPOCH = store.epoch()
+    state_version = store.last_change_id()
+
+def state_changed(event: str, data):
+    global state_version
+    if store is not None:
+        # Logged for the other workers (see ChangeFeed); they publish it under the same id
+        change_id = store.record_change(event, data, WORKER_ID)
+        # Apply only theirs that came first, so dashboards get events in the log's order
+        change_feed.poll(until=change_id)
+        if change_id <= state_version:
+            return  # the log was pruned past us and a resync snapshot already covers this change
+        state_version = change_id
+    else:
+        state_version += 1
+    event_broker.publish(state_version, event, data)
+
+# Debounced, atomic writers — many updates in a burst become one write
+config_writer = JsonStateWriter(CONFIG_PATH)
+state_writer = JsonStateWriter(STATE_PATH)
+alerts_writer = JsonStateWriter(ALERTS_PATH)
 
 state = {
     "usd_amount": 100.0,
     "buy_alerts": [],
     "sell_alerts": [],
-    "latest_prices": [],
     "alert_reset_minutes": 0,
+    # Level units -> epoch seconds; rendered as {".8f": ISO} only in JSON
     "last_triggered_buy": {},
     "last_triggered_sell": {},
     "alerts": [],
 }
 
+# Latest status per pair from a multi-pair monitor, keyed by pair key
+pair_states = {}
+# Pair resets for the monitor, keyed by (pair, side, level): sent when it connects and
+# whenever a new one is made, until its status shows the level re-armed or fired again
+pair_resets = {}
+# One queue per connected monitor channel of what to send it
+monitor_outboxes = set()
+
+# Multi-token Discord alerts indexed by (contract, pair, type); rebuilt by load_state()
+token_alerts = TokenAlertIndex()
+
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 
+# Run the Jupiter price monitor inside this process instead of as main.py
+EMBEDDED_MONITOR = os.getenv("EMBEDDED_MONITOR", "0") == "1"
+
+# A standalone main.py reads config.json and jupiter-latest.json, so SQLite mode still mirrors them for it
+MIRROR_JSON = store is None or not EMBEDDED_MONITOR
+
+# Whether this process runs the one-per-deployment jobs (Discord bot, embedded monitor, JSON mirror).
+# With SQLite, workers sharing the database take turns through a lease (see LeaderLease).
+is_leader = store is None
+
+def mirrors_json():
+    return MIRROR_JSON and is_leader
+
+# Dexscreener accepts up to 30 comma-separated addresses per tokens request
+DEXSCREENER_TOKENS_URL = "https://api.dexscreener.com/latest/dex/tokens/"
+DEXSCREENER_BATCH_SIZE = int(os.getenv("DEXSCREENER_BATCH_SIZE", "30"))
+DEXSCREENER_CONCURRENCY = int(os.getenv("DEXSCREENER_CONCURRENCY", "4"))
+
 # Discord bot client (singleton)
 discord_client = None
 
@@ -49,63 +144,315 @@ def get_discord_client():
         discord_client = discord.Client(intents=intents)
     return discord_client
 
-async def send_discord_message(channel_id: int, message: str):
-    client = get_discord_client()
-    if not client.is_ready():
-        await client.wait_until_ready()
-    channel = await client.fetch_channel(channel_id)
-    await channel.send(message)
+# Cached channels, per-channel digests and rate-limit buckets on top of the client
+discord_delivery = None
+
+def get_discord_delivery():
+    global discord_delivery
+    if discord_delivery is None:
+        discord_delivery = DiscordDelivery(get_discord_client())
+    return discord_delivery
+
+# Pooled async client for Dexscreener polling (never blocks the event loop)
+dexscreener_client = None
+
+def get_dexscreener_client():
+    global dexscreener_client
+    if dexscreener_client is None:
+        dexscreener_client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=DEXSCREENER_CONCURRENCY),
+        )
+    return dexscreener_client
+
+async def fetch_dexscreener_batch(client, contracts, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            resp = await client.get(DEXSCREENER_TOKENS_URL + ",".join(contracts))
+        except httpx.HTTPError as e:
+            UPSTREAM_REQUESTS.labels("dexscreener", "error").inc()
+            print(f"[ALERT ERROR] Dexscreener request failed: {e}")
+            return {}
+        finally:
+            UPSTREAM_SECONDS.labels("dexscreener").observe(time.perf_counter() - started)
+    UPSTREAM_REQUESTS.labels("dexscreener", str(resp.status_code)).inc()
+    if resp.status_code != 200:
+        print(f"[ALERT ERROR] Dexscreener returned {resp.status_code} for {len(contracts)} contracts")
+        return {}
+
+    # Keep Dexscreener's ordering so the first matching pair still wins
+    by_contract = {}
+    for p in resp.json().get("pairs") or []:
+        address = p.get("baseToken", {}).get("address")
+        if address:
+            by_contract.setdefault(address, []).append(p)
+        # A contract may only trade as the quote side; it needs the pair seen from its end
+        address = p.get("quoteToken", {}).get("address")
+        flipped = quote_side(p) if address else None
+        if flipped:
+            by_contract.setdefault(address, []).append(flipped)
+    return by_contract
+
+def quote_side(p):
+    """Pair `p` as seen from its quote token (sides swapped, prices inverted), or None if it has no price."""
+    try:
+        native = float(p["priceNative"])
+        usd = float(p["priceUsd"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if native <= 0:
+        return None
+    # No fdv: Dexscreener's is the base token's
+    return {"baseToken": p["quoteToken"], "quoteToken": p["baseToken"], "priceNative": 1 / native, "priceUsd": usd / native}
+
+async def fetch_dexscreener_pairs(contracts):
+    """Fetch pairs for every contract using batched multi-token requests."""
+    contracts = list(contracts)
+    client = get_dexscreener_client()
+    semaphore = asyncio.Semaphore(DEXSCREENER_CONCURRENCY)
+    batches = [contracts[i:i + DEXSCREENER_BATCH_SIZE] for i in range(0, len(contracts), DEXSCREENER_BATCH_SIZE)]
+    results = await asyncio.gather(*(fetch_dexscreener_batch(client, b, semaphore) for b in batches))
+
+    pairs_by_contract = {}
+    for result in results:
+        for address, pairs in result.items():
+            pairs_by_contract.setdefault(address, []).extend(pairs)
+            # EVM addresses may come back in a different case than they were entered
+            pairs_by_contract.setdefault(address.lower(), pairs_by_contract[address])
+    return pairs_by_contract
 
 async def check_alerts_loop():
+    global discord_client, discord_delivery
     await asyncio.sleep(5)  # Wait for FastAPI and Discord bot to be ready
     client = get_discord_client()
     await client.login(DISCORD_BOT_TOKEN)
-    await client.connect()
-    while True:
-        try:
-            await check_all_alerts()
-        except Exception as e:
-            print(f"[ALERT CHECK ERROR] {e}")
-        await asyncio.sleep(60)
+    # connect() runs the gateway until shutdown, so keep it off the polling path
+    gateway = asyncio.create_task(client.connect())
+    try:
+        await client.wait_until_ready()
+        while True:
+            try:
+                await check_all_alerts()
+            except Exception as e:
+                print(f"[ALERT CHECK ERROR] {e}")
+            await asyncio.sleep(60)
+    finally:
+        # Stopped because another worker took over: log this bot out so only one is connected
+        gateway.cancel()
+        await client.close()
+        discord_client = discord_delivery = None
 
 async def check_all_alerts():
-    alerts = state.get("alerts", [])
-    for alert in alerts:
-        try:
-            # Fetch price/marketcap from Dexscreener
-            url = f"https://api.dexscreener.com/latest/dex/tokens/{alert['contract']}"
-            resp = requests.get(url, timeout=10)
-            if resp.status_code != 200:
-                continue
-            data = resp.json()
-            pair_data = None
-            for p in data.get('pairs', []):
-                if p['quoteToken']['symbol'] == alert['pair']:
-                    pair_data = p
-                    break
-            if not pair_data:
-                continue
-            if alert['type'] == 'price':
-                value = float(pair_data.get('priceUsd', 0)) if alert['pair'] == 'USD' else float(pair_data.get('priceNative', 0))
-            elif alert['type'] == 'marketcap':
-                value = float(pair_data.get('fdv', 0))
-            else:
+    if not len(token_alerts):
+        return
+
+    # One Dexscreener lookup per contract, no matter how many alerts share it
+    pairs_by_contract = await fetch_dexscreener_pairs(token_alerts.contracts())
+
+    # Everything triggered for a channel in this pass goes out as one digest
+    messages_by_channel = {}
+    observed = {}
+    for key in list(token_alerts.keys()):
+        contract = key[0]
+        pairs = pairs_by_contract.get(contract) or pairs_by_contract.get(contract.lower()) or []
+        value = observed_value(key, pairs)
+        if value is None:
+            continue
+        observed[key] = value
+        ALERT_EVALUATIONS.labels("discord").inc()
+        for alert in token_alerts.crossings(key, value):
+            ALERTS_FIRED.labels("discord").inc()
+            try:
+                channel_id = int(alert['channel_id'])
+            except (TypeError, ValueError):
+                # Only alerts saved before channel ids were validated; don't let one drop the others' digests
+                print(f"[ALERT ERROR] Alert {alert.get('id')} has an invalid channel id {alert['channel_id']!r}")
                 continue
-            should_trigger = (
-                (alert['condition'] == 'above' and value > alert['value']) or
-                (alert['condition'] == 'below' and value < alert['value'])
-            )
-            if should_trigger:
-                msg = f"**{alert['ticker']}/{alert['pair']}**\nAlert: {alert['type'].capitalize()} {alert['condition']} {alert['value']}\nCurrent: {value}\nContract: `{alert['contract']}`"
-                await send_discord_message(int(alert['channel_id']), msg)
+            messages_by_channel.setdefault(channel_id, []).append(alert_message(alert, value))
+    write_alert_values(observed)
+
+    if messages_by_channel or get_discord_delivery().pending:
+        started = time.monotonic()
+        await get_discord_delivery().send_digests(messages_by_channel)
+        count = sum(len(m) for m in messages_by_channel.values())
+        print(f"📨 Delivered {count} alert(s) to {len(messages_by_channel)} channel(s) in {time.monotonic() - started:.2f}s")
+
+def observed_value(key, pairs):
+    """Current value for an alert key (contract, pair, type) from its Dexscreener pairs, or None."""
+    _, pair, alert_type = key
+    try:
+        pair_data = None
+        for p in pairs:
+            if p['quoteToken']['symbol'] == pair:
+                pair_data = p
+                break
+        if not pair_data:
+            return None
+        if alert_type == 'price':
+            return float(pair_data.get('priceUsd', 0)) if pair == 'USD' else float(pair_data.get('priceNative', 0))
+        if alert_type == 'marketcap':
+            return float(pair_data['fdv']) if pair_data.get('fdv') is not None else None
+    except Exception as e:
+        print(f"[ALERT ERROR] {e}")
+    return None
+
+def alert_message(alert, value):
+    return f"**{alert['ticker']}/{alert['pair']}**\nAlert: {alert['type'].capitalize()} {alert['condition']} {alert['value']}\nCurrent: {value}\nContract: `{alert['contract']}`"
+
+class InProcessMonitorSink:
+    """
+    Receives the embedded monitor's trigger/price/reset events. The monitor
+    runs its blocking quote cycle in a worker thread, so every update is
+    handed to the event loop instead of touching `state` from that thread.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def trigger(self, side, units, fired_at):
+        async def _trigger():
+            apply_trigger(side, units, fired_at)
+        # Waits until `state` has it: a config snapshot the monitor takes after this must include it
+        asyncio.run_coroutine_threadsafe(_trigger(), self.loop).result()
+
+    def price(self, timestamp, buy_price, sell_price):
+        # Same rule as PriceData: only complete quotes make it into the chart
+        if buy_price is None or sell_price is None:
+            return
+        self.loop.call_soon_threadsafe(apply_price, {
+            "timestamp": timestamp,
+            "buy_price": buy_price,
+            "sell_price": sell_price
+        })
+
+    def reset(self, side, units):
+        async def _reset():
+            if not is_leader:
+                return False  # a reset the cleaner started just before this worker stopped leading
+            try:
+                return apply_reset(side, units)
+            except HTTPException:
+                return False
+        return asyncio.run_coroutine_threadsafe(_reset(), self.loop).result()
+
+class MonitorConfigProvider:
+    """Hands the embedded monitor its config; it only takes a snapshot when version() moved."""
+
+    def version(self):
+        return monitor_config_version
+
+    def snapshot(self):
+        # Shallow copies are taken atomically, so the monitor thread never sees a half-updated list
+        return {
+            "usd_amount": state["usd_amount"],
+            "buy_alerts": list(state["buy_alerts"]),
+            "sell_alerts": list(state["sell_alerts"]),
+            "alert_reset_minutes": state["alert_reset_minutes"],
+            "triggered_buy": dict(state["last_triggered_buy"]),
+            "triggered_sell": dict(state["last_triggered_sell"]),
+        }
+
+async def run_embedded_monitor():
+    import main as monitor
+
+    monitor.embed(InProcessMonitorSink(asyncio.get_running_loop()), MonitorConfigProvider())
+
+    if monitor.PAIRS_FILE:
+        await monitor.run_multi_pair(monitor.PAIRS_FILE)
+        return
+    if not monitor.INPUT_MINT or not monitor.OUTPUT_MINT:
+        print("❌ Missing INPUT_MINT/OUTPUT_MINT — embedded monitor not started.")
+        return
+
+    print("🚀 Jupiter Price Monitor started (embedded).")
+    # Sleeps on the cooldown heap between expiries; its resets hop onto this loop via the sink.
+    # Stopped with the rest of the monitor, so a worker that lost the lease issues no more resets.
+    cleaner_stop = threading.Event()
+    threading.Thread(target=monitor.background_alert_cleaner, args=(cleaner_stop,), name="cooldown-cleaner", daemon=True).start()
+    # Streamed prices share this loop; ticks are evaluated in worker threads like check_prices()
+    stream_dropped = asyncio.Event()
+    stream = monitor.create_price_stream(wake=stream_dropped.set)
+    stream_task = asyncio.create_task(stream.run()) if stream else None
+    try:
+        await run_embedded_checks(monitor, stream_dropped)
+    finally:
+        cleaner_stop.set()
+        monitor.cooldown_timers.wake()
+        if stream_task:
+            stream_task.cancel()
+
+async def run_embedded_checks(monitor, stream_dropped):
+    poll = monitor.create_poll()
+    due = time.monotonic()
+    while True:
+        started = time.monotonic()
+        CHECK_LATENESS_SECONDS.labels("single").observe(max(0.0, started - due))
+        delay = monitor.CHECK_INTERVAL
+        try:
+            delay = monitor.next_check_delay(poll, await asyncio.to_thread(monitor.check_prices))
         except Exception as e:
-            print(f"[ALERT ERROR] {e}")
+            print(f"❌ Error: {e}")
+        CHECK_CYCLE_SECONDS.labels("single").observe(time.monotonic() - started)
+        due = started + monitor.stream_poll_delay(delay)
+        # A dropped stream cuts the wait short
+        try:
+            await asyncio.wait_for(stream_dropped.wait(), max(0.0, due - time.monotonic()))
+            stream_dropped.clear()
+        except asyncio.TimeoutError:
+            pass
+
+background_tasks = []
+# Jobs only the leader runs; cancelled if it loses the lease
+leader_tasks = []
+
+def start_leader_tasks():
+    global is_leader
+    is_leader = True
+    if store is not None:
+        # Catch up on the log first, above all the last leader's Discord pass
+        change_feed.poll()
+    if mirrors_json():
+        # Whatever the previous leader mirrored may be behind the store
+        config_writer.merge(config_document())
+        write_state()
+    loop = asyncio.get_event_loop()
+    if DISCORD_BOT_TOKEN:
+        leader_tasks.append(loop.create_task(check_alerts_loop()))
+    if EMBEDDED_MONITOR:
+        leader_tasks.append(loop.create_task(run_embedded_monitor()))
+
+def stop_leader_tasks():
+    global is_leader
+    is_leader = False
+    for task in leader_tasks:
+        task.cancel()
+    leader_tasks.clear()
 
 @app.on_event("startup")
 def start_background_tasks():
-    if DISCORD_BOT_TOKEN:
-        loop = asyncio.get_event_loop()
-        loop.create_task(check_alerts_loop())
+    if store is None:
+        start_leader_tasks()
+        return
+    # Shared with every worker on this database: follow their changes, and run the leader's jobs while holding the lease
+    loop = asyncio.get_event_loop()
+    lease = LeaderLease(store, "leader", WORKER_ID)
+    background_tasks.append(loop.create_task(change_feed.run()))
+    background_tasks.append(loop.create_task(lease.run(start_leader_tasks, stop_leader_tasks)))
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    tasks = leader_tasks + background_tasks
+    stop_leader_tasks()
+    for task in background_tasks:
+        task.cancel()
+    # Let the Discord bot log out and the lease hand over before the store closes
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if dexscreener_client is not None:
+        await dexscreener_client.aclose()
+    price_history.close()
+    if store is not None:
+        store.close()
 
 def safe_parse_alerts(value: str):
     try:
@@ -123,6 +470,10 @@ def load_env_defaults():
         print(f"⚠️ Failed to load ENV defaults: {e}")
 
 def load_state():
+    if store is not None:
+        load_store_state()
+        return
+
     if os.path.exists(CONFIG_PATH):
         try:
             with open(CONFIG_PATH) as f:
@@ -138,34 +489,159 @@ def load_state():
         try:
             with open(STATE_PATH) as f:
                 s = json.load(f)
-                state["latest_prices"] = s.get("latest_prices", [])
-                state["last_triggered_buy"] = s.get("last_triggered_buy", {})
-                state["last_triggered_sell"] = s.get("last_triggered_sell", {})
+                # One-time import of the chart from before the binary history store
+                if not len(price_history):
+                    for entry in s.get("latest_prices", []):
+                        record_price(entry)
+                state["last_triggered_buy"] = triggers_from_json(s.get("last_triggered_buy", {}))
+                state["last_triggered_sell"] = triggers_from_json(s.get("last_triggered_sell", {}))
         except Exception as e:
             print(f"⚠️ Failed to load jupiter-latest.json: {e}")
 
-def write_config():
+    last_values = {}
+    if os.path.exists(ALERTS_PATH):
+        try:
+            with open(ALERTS_PATH) as f:
+                a = json.load(f)
+                state["alerts"] = a.get("alerts", [])
+                last_values = {tuple(k.split("|", 2)): v for k, v in a.get("last_values", {}).items()}
+        except Exception as e:
+            print(f"⚠️ Failed to load discord-alerts.json: {e}")
+
+    global token_alerts
+    token_alerts = TokenAlertIndex(state["alerts"], last_values)
+
+def load_store_state():
+    # First start on SQLite: take over what the JSON backend left behind (once, however many workers start)
     try:
-        with open(CONFIG_PATH, "w") as f:
-            json.dump({
-                "usd_amount": state["usd_amount"],
-                "buy_alerts": state["buy_alerts"],
-                "sell_alerts": state["sell_alerts"],
-                "alert_reset_minutes": state["alert_reset_minutes"]
-            }, f, indent=2)
+        documents = read_json(CONFIG_PATH), read_json(STATE_PATH), read_json(ALERTS_PATH)
+        if store.import_documents(*documents, defaults=state, replace=False):
+            price_history.refresh()
+            print(f"📥 Imported /shared/*.json into {SQLITE_PATH}")
     except Exception as e:
-        print(f"❌ Failed to write config.json: {e}")
+        print(f"⚠️ Failed to import JSON state into {SQLITE_PATH}: {e}")
+
+    load_store_config()
+    # Price ticks stay in the table until /api/state or /api/history asks for them
+    state["alerts"] = store.alerts()
+
+    global token_alerts
+    token_alerts = TokenAlertIndex(state["alerts"], store.alert_values())
+
+def load_store_config():
+    settings = store.settings()
+    state["usd_amount"] = settings.get("usd_amount", state["usd_amount"])
+    state["alert_reset_minutes"] = settings.get("alert_reset_minutes", state["alert_reset_minutes"])
+    state["buy_alerts"], state["last_triggered_buy"] = store.levels("buy")
+    state["sell_alerts"], state["last_triggered_sell"] = store.levels("sell")
 
+# Bumped whenever config or trigger times change, so the embedded monitor can skip unchanged reloads
+monitor_config_version = 0
+
+def bump_monitor_config():
+    global monitor_config_version
+    monitor_config_version += 1
+
+def config_document():
+    # Copies, since the writer serializes them later on its own thread
+    return {
+        "usd_amount": state["usd_amount"],
+        "buy_alerts": list(state["buy_alerts"]),
+        "sell_alerts": list(state["sell_alerts"]),
+        "alert_reset_minutes": state["alert_reset_minutes"]
+    }
+
+def write_config():
+    bump_monitor_config()
+    config = config_document()
+    if mirrors_json():
+        config_writer.merge(config)
+    state_changed("config", config)
+
+def write_alerts():
+    alerts_writer.merge({"alerts": [dict(a) for a in state["alerts"]]})
+
+def write_alert_values(observed):
+    # Last observed value per alert key, so a restart doesn't re-fire alerts already past their threshold
+    if store is not None:
+        store.set_alert_values(observed)
+        if observed:
+            # Not for dashboards: the other workers replay them, so whoever leads next goes on from here
+            store.record_change("alert_values", [[*key, value] for key, value in observed.items()], WORKER_ID)
+        return
+    alerts_writer.merge({
+        "last_values": {"|".join(key): value for key, value in token_alerts.last_values.items()}
+    })
+
+@STATE_WRITE_SECONDS.labels("write_state").time()
 def write_state():
+    if not mirrors_json():
+        return
+    # Formatted when the debounced write runs, not on every trigger
+    state_writer.merge({
+        "last_triggered_buy": lambda: triggers_to_json(dict(state["last_triggered_buy"])),
+        "last_triggered_sell": lambda: triggers_to_json(dict(state["last_triggered_sell"])),
+    })
+
+if store is not None:
+    price_history = SqlitePriceHistory(store, PRICE_HISTORY_CAPACITY)
+else:
+    price_history = PriceHistory(HISTORY_PATH, PRICE_HISTORY_CAPACITY)
+
+def to_epoch_ms(timestamp: str) -> int:
+    return int(parse_time(timestamp) * 1000)
+
+def record_price(entry: dict):
     try:
-        with open(STATE_PATH, "w") as f:
-            json.dump({
-                "latest_prices": state["latest_prices"],
-                "last_triggered_buy": state["last_triggered_buy"],
-                "last_triggered_sell": state["last_triggered_sell"]
-            }, f, indent=2)
-    except Exception as e:
-        print(f"❌ Failed to write jupiter-latest.json: {e}")
+        price_history.append(to_epoch_ms(entry["timestamp"]), float(entry["buy_price"]), float(entry["sell_price"]))
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"⚠️ Skipping malformed price entry {entry}: {e}")
+        return
+    state_changed("price", price_history.latest(1)[0])
+
+def apply_remote_change(change_id: int, event: str, data):
+    """A change another API worker made: refresh what it touched, then tell this worker's dashboards."""
+    global state_version
+    if event == "alert_values":
+        # The leader's Discord pass: the same crossings() calls leave this index (last values and
+        # not-yet-evaluated alerts) exactly like the leader's, so a failover doesn't re-send or skip alerts
+        for contract, pair, alert_type, value in data:
+            token_alerts.crossings((contract, pair, alert_type), value)
+        return
+    if event in ("config", "trigger", "reset"):
+        load_store_config()
+        bump_monitor_config()
+        if mirrors_json():
+            config_writer.merge(config_document())
+            write_state()
+        if event == "config":
+            # Our view of the store, which may already include later changes
+            data = config_document()
+    elif event in ("price", "history"):
+        price_history.refresh()
+    elif event == "pair_reset":
+        apply_pair_reset(data)
+    elif event == "alerts":
+        if "added" in data and token_alerts.add(dict(data["added"])):
+            state["alerts"].append(dict(data["added"]))
+        elif "deleted" in data and token_alerts.remove(data["deleted"]) is not None:
+            state["alerts"] = [a for a in state["alerts"] if a["id"] != data["deleted"]]
+    state_version = change_id
+    event_broker.publish(change_id, event, data)
+
+def resync_from_store(change_id: int):
+    """Fell behind the pruned change log: reload everything and let dashboards refetch."""
+    global state_version, token_alerts
+    load_store_config()
+    state["alerts"] = store.alerts()
+    token_alerts = TokenAlertIndex(state["alerts"], store.alert_values())
+    price_history.refresh()
+    bump_monitor_config()
+    state_version = change_id
+    event_broker.publish(change_id, "snapshot", state_snapshot())
+
+if store is not None:
+    change_feed = ChangeFeed(store, WORKER_ID, apply_remote_change, resync_from_store, since=state_version)
 
 load_env_defaults()
 load_state()
@@ -196,6 +672,11 @@ class ResetAlert(BaseModel):
     side: str
     price: float
 
+class PairResetAlert(BaseModel):
+    pair: str
+    side: str
+    price: float
+
 # New AlertModel for multi-token, multi-type alerts
 class AlertModel(BaseModel):
     contract: str
@@ -208,18 +689,138 @@ class AlertModel(BaseModel):
     channel_id: str
     id: str = None
 
+STATE_FIELDS = set(state) | {"latest_prices"}
+
+def state_snapshot(fields=None, since_ms=None):
+    snapshot = {k: v for k, v in state.items() if fields is None or k in fields}
+    for field in ("last_triggered_buy", "last_triggered_sell"):
+        if field in snapshot:
+            snapshot[field] = triggers_to_json(snapshot[field])
+    if fields is None or "latest_prices" in fields:
+        if since_ms is None:
+            snapshot["latest_prices"] = price_history.latest(LATEST_PRICES_LIMIT)
+        else:
+            snapshot["latest_prices"] = price_history.since(since_ms, LATEST_PRICES_LIMIT)
+        last = price_history.last_timestamp()
+        # Pass back as `since=` to get only newer points next time
+        snapshot["cursor"] = last / 1000 if last is not None else since_ms / 1000 if since_ms else None
+    return snapshot
+
+# Serialized /api/state bodies for the current version, keyed by query
+_state_bodies = {}
+_state_bodies_version = None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
 @app.get("/api/state")
-async def get_state():
-    return state
+async def get_state(
+    request: Request,
+    fields: str = Query(None, description="Comma-separated top-level fields to return"),
+    since: float = Query(None, description="Only price points newer than this (epoch seconds, see `cursor`)"),
+):
+    global _state_bodies_version
+
+    field_set = None
+    if fields:
+        field_set = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = field_set - STATE_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    etag = f'W/"{STATE_EPOCH}-{state_version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if _state_bodies_version != state_version:
+        _state_bodies.clear()
+        _state_bodies_version = state_version
+    key = (fields and ",".join(sorted(field_set)), since)
+    body = _state_bodies.get(key)
+    if body is None:
+        since_ms = int(since * 1000) if since is not None else None
+        body = json.dumps(state_snapshot(field_set, since_ms), separators=(",", ":"))
+        if len(_state_bodies) < 64:
+            _state_bodies[key] = body
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/stream")
+async def stream_events(request: Request):
+    """
+    Server-Sent Events: a `snapshot` of the full state first, then small
+    deltas as they happen — `price`, `trigger`, `reset`, `config`,
+    `history` (chart cleared), `alerts` (multi-token alert added/removed) and
+    `pair_trigger` / `pair_reset` (a multi-pair level fired / was re-armed).
+    """
+    queue = event_broker.subscribe()
+
+    async def events():
+        try:
+            yield format_sse(state_version, "snapshot", state_snapshot())
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if message is None:
+                    return  # fell too far behind; the client reconnects and resyncs
+                yield message
+        finally:
+            event_broker.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/api/history")
+async def get_history(
+    start: float = Query(None, description="Range start, epoch seconds (default: oldest sample)"),
+    end: float = Query(None, description="Range end, epoch seconds (default: now)"),
+    resolution: int = Query(None, ge=1, description="Bucket width in seconds (default: fits `points`)"),
+    points: int = Query(500, ge=1, le=HISTORY_MAX_BUCKETS, description="Target bucket count when no resolution is given"),
+):
+    end_ms = int((end if end is not None else datetime.now(timezone.utc).timestamp()) * 1000)
+    if start is not None:
+        start_ms = int(start * 1000)
+    else:
+        start_ms = price_history.first_timestamp() or end_ms
+    if start_ms > end_ms:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    if resolution is None:
+        resolution = max(1, -(-(end_ms - start_ms) // (points * 1000)))
+    if (end_ms - start_ms) // (resolution * 1000) > HISTORY_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Resolution too fine: more than {HISTORY_MAX_BUCKETS} buckets")
+
+    return {
+        "start": start_ms / 1000,
+        "end": end_ms / 1000,
+        "resolution": resolution,
+        "columns": ["t", "count", "buy_open", "buy_high", "buy_low", "buy_close",
+                    "sell_open", "sell_high", "sell_low", "sell_close"],
+        "buckets": [
+            [b[0] / 1000, *b[1:]]
+            for b in price_history.buckets(start_ms, end_ms, resolution * 1000)
+        ],
+    }
 
 @app.post("/api/usd")
 async def set_usd(alert: AlertValue):
     if alert.value <= 0:
         raise HTTPException(status_code=400, detail="USD amount must be positive")
     state["usd_amount"] = alert.value
-    state["latest_prices"] = []  # Clear chart 🧹
+    if store is not None:
+        store.set_setting("usd_amount", alert.value)
+    price_history.clear()  # Clear chart 🧹 (prices for another amount aren't comparable)
+    state_changed("history", {"cleared": True})
     write_config()
-    write_state()  # ✅ To persist wipe
     return {"success": True}
 
 
@@ -228,6 +829,8 @@ async def set_buy_alerts(alerts: AlertList):
     # Combine current alerts with new ones
     combined = set(state["buy_alerts"]) | set(alerts.values)
     state["buy_alerts"] = sorted(combined)
+    if store is not None:
+        store.add_levels("buy", alerts.values)
     write_config()
     return {"success": True}
 
@@ -236,28 +839,35 @@ async def set_sell_alerts(alerts: AlertList):
     # Combine current alerts with new ones
     combined = set(state["sell_alerts"]) | set(alerts.values)
     state["sell_alerts"] = sorted(combined)
+    if store is not None:
+        store.add_levels("sell", alerts.values)
     write_config()
     return {"success": True}
 
+def remove_level(side: str, value: float) -> bool:
+    # Compared in fixed point, so 0.1 + 0.2 still finds the 0.3 level
+    units = to_units(value)
+    levels = state[f"{side}_alerts"]
+    kept = [v for v in levels if to_units(v) != units]
+    if len(kept) == len(levels):
+        return False
+    state[f"{side}_alerts"] = kept
+    state[f"last_triggered_{side}"].pop(units, None)
+    if store is not None:
+        store.remove_level(side, units)
+    write_config()
+    write_state()
+    return True
+
 @app.delete("/api/buy")
 async def delete_buy_alert(alert: AlertValue):
-    value = round(alert.value, 8)
-    if value in state["buy_alerts"]:
-        state["buy_alerts"].remove(value)
-        state["last_triggered_buy"].pop(f"{value:.8f}", None)
-        write_config()
-        write_state()
+    if remove_level("buy", alert.value):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Buy alert not found")
 
 @app.delete("/api/sell")
 async def delete_sell_alert(alert: AlertValue):
-    value = round(alert.value, 8)
-    if value in state["sell_alerts"]:
-        state["sell_alerts"].remove(value)
-        state["last_triggered_sell"].pop(f"{value:.8f}", None)
-        write_config()
-        write_state()
+    if remove_level("sell", alert.value):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Sell alert not found")
 
@@ -266,52 +876,171 @@ async def set_reset_minutes(config: ResetConfig):
     if config.minutes < 0:
         raise HTTPException(status_code=400, detail="Minutes must be >= 0")
     state["alert_reset_minutes"] = config.minutes
+    if store is not None:
+        store.set_setting("alert_reset_minutes", config.minutes)
     write_config()
     return {"success": True, "minutes": config.minutes}
 
+def apply_reset(side: str, units: int) -> bool:
+    if side not in ("buy", "sell"):
+        raise HTTPException(status_code=400, detail="Invalid alert side")
+    if not any(to_units(v) == units for v in state[f"{side}_alerts"]):
+        raise HTTPException(status_code=404, detail=f"{side.capitalize()} alert not found")
+    state[f"last_triggered_{side}"].pop(units, None)
+    if store is not None:
+        store.reset(side, units)
+    bump_monitor_config()
+    write_state()
+    state_changed("reset", {"side": side, "key": units_key(units)})
+    return True
+
+def apply_trigger(side: str, units: int, fired_at: float):
+    if side not in ("buy", "sell"):
+        return
+    state[f"last_triggered_{side}"][units] = fired_at
+    if store is not None:
+        store.trigger(side, units, fired_at)
+    bump_monitor_config()
+    write_state()
+    state_changed("trigger", {"side": side, "key": units_key(units), "timestamp": format_time(fired_at)})
+
+def apply_price(entry: dict):
+    record_price(entry)
+
 @app.post("/api/reset-alert")
 async def reset_single_alert(data: ResetAlert):
-    key = f"{data.price:.8f}"
-    now = datetime.now().isoformat()
-    if data.side == "buy":
-        if key in [f"{v:.8f}" for v in state["buy_alerts"]]:
-            state["last_triggered_buy"].pop(key, None)
-            write_state()
-            return {"success": True}
-        raise HTTPException(status_code=404, detail="Buy alert not found")
-    elif data.side == "sell":
-        if key in [f"{v:.8f}" for v in state["sell_alerts"]]:
-            state["last_triggered_sell"].pop(key, None)
-            write_state()
-            return {"success": True}
-        raise HTTPException(status_code=404, detail="Sell alert not found")
-    raise HTTPException(status_code=400, detail="Invalid alert side")
+    apply_reset(data.side, to_units(data.price))
+    return {"success": True}
 
 @app.post("/api/trigger")
 async def update_last_triggered(data: TriggerUpdate):
-    price_key = f"{data.price:.8f}"
-    if data.side == "buy":
-        state["last_triggered_buy"][price_key] = data.timestamp
-    elif data.side == "sell":
-        state["last_triggered_sell"][price_key] = data.timestamp
-    write_state()
+    try:
+        fired_at = parse_time(data.timestamp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid timestamp")
+    apply_trigger(data.side, to_units(data.price), fired_at)
     return {"success": True}
 
 @app.post("/api/price")
 async def update_price(data: PriceData):
-    state["latest_prices"].append(data.dict())
-    state["latest_prices"] = state["latest_prices"][-100:]
-    write_state()
+    apply_price(data.dict())
     return {"success": True}
 
-app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+def apply_monitor_event(event: dict):
+    """
+    One event off the monitor channel. Events with a `pair` key come from a
+    sharded multi-pair monitor; without one they mean the same as a POST to
+    /api/trigger or /api/price.
+    """
+    kind = event.get("type")
+    key = event.get("pair")
+    if kind == "pairs":
+        # The monitor's full pair list: forget the ones it no longer watches
+        keep = set(event["keys"])
+        for stale in [k for k in pair_states if k not in keep]:
+            del pair_states[stale]
+        for stale in [r for r in pair_resets if r[0] not in keep]:
+            del pair_resets[stale]
+        if store is not None:
+            store.keep_pair_states(keep)
+    elif key is None:
+        if kind == "trigger":
+            apply_trigger(event["side"], to_units(event["price"]), parse_time(event["timestamp"]))
+        elif kind == "price":
+            apply_price(event)
+    elif kind == "pair":
+        # Too many per cycle to stream to dashboards; read them from /api/pairs
+        pair_states[key] = event["state"]
+        for reset_key, reset in list(pair_resets.items()):
+            # Done once the level shows re-armed, or fired again since
+            if reset_key[0] == key and event["state"][f"last_triggered_{reset['side']}"].get(reset["key"]) != reset["before"]:
+                del pair_resets[reset_key]
+    elif kind == "trigger":
+        data = {"pair": key, "side": event["side"], "key": event["price"], "timestamp": event["timestamp"]}
+        if store is not None:
+            # Through the change log, so dashboards connected to any worker see it
+            state_changed("pair_trigger", data)
+        else:
+            # No state_version bump: /api/state doesn't cover pairs
+            event_broker.publish(state_version, "pair_trigger", data)
 
-@app.get("/{full_path:path}")
-async def serve_index(full_path: str):
-    index_path = os.path.join("frontend", "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
-    raise HTTPException(status_code=404, detail="Page not found")
+def apply_pair_reset(data: dict):
+    """Re-arm a multi-pair level here and have the monitor do the same."""
+    state = pair_states.get(data["pair"])
+    if state is not None:
+        state[f"last_triggered_{data['side']}"].pop(data["key"], None)
+    pair_resets[(data["pair"], data["side"], data["key"])] = data
+    for outbox in monitor_outboxes:
+        outbox.put_nowait({"type": "reset", **data})
+
+@app.post("/api/pairs/reset-alert")
+async def reset_pair_alert(data: PairResetAlert):
+    if data.side not in ("buy", "sell"):
+        raise HTTPException(status_code=400, detail="Invalid alert side")
+    pair = store.pair_state(data.pair) if store is not None else pair_states.get(data.pair)
+    if pair is None:
+        raise HTTPException(status_code=404, detail="Pair not found")
+    units = to_units(data.price)
+    if not any(to_units(v) == units for v in pair[f"{data.side}_alerts"]):
+        raise HTTPException(status_code=404, detail=f"{data.side.capitalize()} alert not found")
+    key = units_key(units)
+    before = pair[f"last_triggered_{data.side}"].get(key)
+    if before is None:
+        return {"success": True}  # not fired, nothing to re-arm
+    # Carries the trigger being reset, so a monitor that fired the level again since keeps that one
+    reset = {"pair": data.pair, "side": data.side, "key": key, "before": before}
+    apply_pair_reset(reset)
+    if store is not None:
+        pair[f"last_triggered_{data.side}"].pop(key, None)
+        store.set_pair_states({data.pair: pair})
+        # Through the change log: the monitor may be connected to another worker
+        state_changed("pair_reset", reset)
+    else:
+        event_broker.publish(state_version, "pair_reset", reset)
+    return {"success": True}
+
+async def send_to_monitor(ws: WebSocket, outbox: asyncio.Queue):
+    while True:
+        await ws.send_json(await outbox.get())
+
+@app.websocket("/api/monitor/events")
+async def monitor_events(ws: WebSocket):
+    """
+    The monitor's event channel: every frame is {"events": [...]}, applied in
+    order. Pair resets go the other way, one message each.
+    """
+    await ws.accept()
+    outbox = asyncio.Queue()
+    for reset in pair_resets.values():
+        outbox.put_nowait({"type": "reset", **reset})
+    monitor_outboxes.add(outbox)
+    sender = asyncio.create_task(send_to_monitor(ws, outbox))
+    try:
+        while True:
+            frame = await ws.receive_json()
+            updated = set()
+            for event in frame.get("events", []):
+                try:
+                    apply_monitor_event(event)
+                except (HTTPException, KeyError, TypeError, ValueError) as e:
+                    print(f"⚠️ Skipping monitor event {event}: {e}")
+                    continue
+                if event.get("type") == "pair":
+                    updated.add(event["pair"])
+            if store is not None:
+                # One transaction per frame, so /api/pairs on any worker sees the whole cycle
+                store.set_pair_states({key: pair_states[key] for key in updated if key in pair_states})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        monitor_outboxes.discard(outbox)
+        sender.cancel()
+
+@app.get("/api/pairs")
+async def get_pairs():
+    if store is not None:
+        return store.pair_states()
+    return list(pair_states.values())
 
 def get_token_info_from_dexscreener(contract: str):
     url = f"https://api.dexscreener.com/latest/dex/tokens/{contract}"
@@ -332,33 +1061,67 @@ async def token_info(contract: str = Query(..., description="Token contract addr
     return get_token_info_from_dexscreener(contract)
 
 @app.get("/api/alerts")
-async def get_alerts():
-    return state["alerts"]
+async def get_alerts(guild_id: str = None, channel_id: str = None, contract: str = None):
+    if guild_id is None and channel_id is None and contract is None:
+        return state["alerts"]
+    if store is not None:
+        return store.alerts(guild_id, channel_id, contract)
+    return [
+        a for a in state["alerts"]
+        if (guild_id is None or a["guild_id"] == guild_id)
+        and (channel_id is None or a["channel_id"] == channel_id)
+        and (contract is None or a["contract"] == contract)
+    ]
 
 @app.post("/api/alerts")
 async def add_alert(alert: AlertModel):
     # Assign a unique id if not provided
     if not alert.id:
         alert.id = str(uuid.uuid4())
-    # Prevent duplicates (same contract, pair, type, condition, value)
-    for a in state["alerts"]:
-        if (
-            a["contract"] == alert.contract and
-            a["pair"] == alert.pair and
-            a["type"] == alert.type and
-            a["condition"] == alert.condition and
-            a["value"] == alert.value
-        ):
-            raise HTTPException(status_code=400, detail="Duplicate alert")
-    state["alerts"].append(alert.dict())
-    write_config()
+    if alert.condition not in ("above", "below"):
+        raise HTTPException(status_code=400, detail="Condition must be 'above' or 'below'")
+    # Delivery needs Discord's numeric snowflake ids
+    if not (alert.channel_id.isascii() and alert.channel_id.isdigit()):
+        raise HTTPException(status_code=400, detail="Channel ID must be a numeric Discord ID")
+    # Duplicates (same contract, pair, type, condition, value) are rejected by the index
+    entry = alert.dict()
+    if not token_alerts.add(entry):
+        raise HTTPException(status_code=400, detail="Duplicate alert")
+    state["alerts"].append(entry)
+    if store is not None:
+        store.add_alert(entry)
+    else:
+        write_alerts()
+    state_changed("alerts", {"added": alert.dict()})
     return {"success": True, "id": alert.id}
 
 @app.delete("/api/alerts/{alert_id}")
 async def delete_alert(alert_id: str):
-    before = len(state["alerts"])
-    state["alerts"] = [a for a in state["alerts"] if a["id"] != alert_id]
-    if len(state["alerts"]) == before:
+    if token_alerts.remove(alert_id) is None:
         raise HTTPException(status_code=404, detail="Alert not found")
-    write_config()
+    state["alerts"] = [a for a in state["alerts"] if a["id"] != alert_id]
+    if store is not None:
+        store.delete_alert(alert_id)
+    else:
+        write_alerts()
+    state_changed("alerts", {"deleted": alert_id})
     return {"success": True}
+
+@app.get("/metrics")
+async def metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Several workers: a scrape must cover all of them, not whichever one answered
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Static UI last: the "/" mount matches every path, so API routes must be registered first
+app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
+
+@app.get("/{full_path:path}")
+async def serve_index(full_path: str):
+    index_path = os.path.join("frontend", "index.html")
+    if os.path.exists(index_path):
+        return FileResponse(index_path)
+    raise HTTPException(status_code=404, detail="Page not found")
@@ -0,0 +1,274 @@
+"""
+Replay a historical price series against BUY/SELL levels and report when
+each level would have fired, with the same rules as the live monitor:
+a buy level fires when the buy price is <= the level, a sell level when the
+sell price is >= the level, and a level that fired is blocked until
+ALERT_RESET_MINUTES have passed (forever when it is 0).
+
+    python backtest.py prices.csv --buy 0.9,0.95 --sell 1.1 --reset-minutes 0,15,60
+
+Prices are read from a CSV (timestamp,buy_price,sell_price), an .npz with
+ts/buy/sell arrays, or the API's price-history.bin.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from alert_index import ThresholdIndex
+from fixed_point import units_key
+from price_history import HEADER, MAGIC
+
+# Ticks per block; the crossing search skips whole blocks via a sparse table of block minimums
+BLOCK = 16
+
+
+def to_ms(ts):
+    ts = np.asarray(ts, dtype=np.int64)
+    # Epoch seconds stay below 1e11 until the year 5138
+    if len(ts) and ts.max() < 100_000_000_000:
+        ts = ts * 1000
+    return ts
+
+
+def parse_timestamp(value):
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.astimezone()  # the monitor writes naive local time
+    return int(dt.timestamp() * 1000)
+
+
+def load_csv(path):
+    with open(path, newline="") as f:
+        header = next(csv.reader(f))
+    columns = [header.index(name) for name in ("timestamp", "buy_price", "sell_price")]
+    try:
+        data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=columns, ndmin=2)
+        return to_ms(data[:, 0]), data[:, 1], data[:, 2]
+    except ValueError:
+        pass  # ISO timestamps
+
+    ts, buy, sell = [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            ts.append(parse_timestamp(row["timestamp"]))
+            buy.append(float(row["buy_price"] or "nan"))
+            sell.append(float(row["sell_price"] or "nan"))
+    return np.array(ts, dtype=np.int64), np.array(buy), np.array(sell)
+
+
+def load_history(path):
+    with open(path, "rb") as f:
+        magic, capacity, count, head = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a price history file")
+    columns = np.memmap(path, mode="r", offset=HEADER.size, dtype=np.uint8, shape=(capacity * 24,))
+    order = (head - count + np.arange(count)) % capacity
+    ts = columns[:capacity * 8].view(np.int64)[order]
+    buy = columns[capacity * 8:capacity * 16].view(np.float64)[order]
+    sell = columns[capacity * 16:].view(np.float64)[order]
+    return ts, buy, sell
+
+
+def load_prices(path):
+    """(ts ms int64, buy, sell) arrays sorted by time."""
+    if path.endswith(".bin"):
+        ts, buy, sell = load_history(path)
+    elif path.endswith(".npz"):
+        with np.load(path) as data:
+            ts, buy, sell = to_ms(data["ts"]), data["buy"], data["sell"]
+    else:
+        ts, buy, sell = load_csv(path)
+
+    buy, sell = np.asarray(buy, dtype=np.float64), np.asarray(sell, dtype=np.float64)
+    if len(ts) and np.any(np.diff(ts) < 0):
+        order = np.argsort(ts, kind="stable")
+        ts, buy, sell = ts[order], buy[order], sell[order]
+    return ts, buy, sell
+
+
+class FirstAtOrBelow:
+    """
+    Answers "first tick >= start whose value is <= level" for many
+    (start, level) pairs at once, in O(log n) vectorised steps.
+    """
+
+    def __init__(self, values):
+        self.n = len(values)
+        blocks = -(-self.n // BLOCK) or 1
+        # Missing prices never trigger
+        padded = np.full(blocks * BLOCK, np.inf)
+        padded[:self.n] = np.where(np.isnan(values), np.inf, values)
+        self.values = padded
+        self.blocks = blocks
+
+        # table[k][i] = min of blocks [i, i + 2**k), clipped at the end
+        level = padded.reshape(blocks, BLOCK).min(axis=1)
+        self.table = [level]
+        while (1 << len(self.table)) <= blocks:
+            step = 1 << (len(self.table) - 1)
+            level = level.copy()
+            level[:-step] = np.minimum(level[:-step], level[step:])
+            self.table.append(level)
+
+    def _scan(self, block, levels, start=None):
+        ticks = block[:, None] * BLOCK + np.arange(BLOCK)
+        hit = self.values[ticks] <= levels[:, None]
+        if start is not None:
+            hit &= ticks >= start[:, None]
+        found = hit.any(axis=1)
+        return found, ticks[np.arange(len(block)), hit.argmax(axis=1)]
+
+    def find(self, start, levels):
+        """Tick index per pair, or n where the level is never reached again."""
+        # Levels still reached right at `start` (the common case while a cooldown repeats)
+        result = np.where(self.values[np.minimum(start, self.n - 1)] <= levels, start, self.n)
+        pending = np.flatnonzero(result == self.n)
+        if not len(pending):
+            return result
+
+        # Rest of the block `start` falls in
+        found, ticks = self._scan(start[pending] // BLOCK, levels[pending], start[pending])
+        result[pending[found]] = ticks[found]
+        rest = pending[~found]
+        if not len(rest):
+            return result
+
+        # Skip every whole block that stays above the level
+        pos = start[rest] // BLOCK + 1
+        lv = levels[rest]
+        last = self.blocks - 1
+        for k in range(len(self.table) - 1, -1, -1):
+            skip = (pos <= last) & (self.table[k][np.minimum(pos, last)] > lv)
+            pos += skip << k
+
+        inside = pos <= last
+        rest, pos, lv = rest[inside], pos[inside], lv[inside]
+        found, ticks = self._scan(pos, lv)
+        result[rest[found]] = ticks[found]
+        return result
+
+
+def fire_ticks(search, levels, ts, reset_minutes):
+    """
+    Ticks at which each level fires: the first tick that reaches it, then the
+    first one at least `reset_minutes` after the previous fire. Returns
+    (level index, tick index) arrays grouped by level, ticks ascending.
+    """
+    active = np.arange(len(levels))
+    start = np.zeros(len(levels), dtype=np.int64)
+    fired_levels, fired_ticks = [], []
+    # First tick allowed to fire again after a fire at each tick
+    after_cooldown = np.searchsorted(ts, ts + int(reset_minutes * 60_000)) if reset_minutes > 0 else None
+
+    # One round per fire, vectorised across every level still firing
+    while len(active):
+        ticks = search.find(start, levels[active])
+        hit = ticks < search.n
+        active, ticks = active[hit], ticks[hit]
+        fired_levels.append(active)
+        fired_ticks.append(ticks)
+        if after_cooldown is None:
+            break
+        start = after_cooldown[ticks]
+        keep = start < search.n
+        active, start = active[keep], start[keep]
+
+    fired_levels = np.concatenate(fired_levels) if fired_levels else np.empty(0, dtype=np.int64)
+    fired_ticks = np.concatenate(fired_ticks) if fired_ticks else np.empty(0, dtype=np.int64)
+    # Rounds are in time order, so a stable sort by level keeps each level's ticks ascending
+    order = np.argsort(fired_levels, kind="stable")
+    return fired_levels[order], fired_ticks[order]
+
+
+class Replay:
+    """Search structures for one price series, reusable across levels and cooldowns."""
+
+    def __init__(self, ts, buy, sell):
+        self.ts = ts
+        self._buy = FirstAtOrBelow(buy)
+        # price >= level  <=>  -price <= -level
+        self._sell = FirstAtOrBelow(-sell)
+
+    def run(self, buy_levels, sell_levels, reset_minutes):
+        """{"buy"|"sell": {level key: fire timestamps (ms)}} for one cooldown setting."""
+        results = {}
+        for side, index, search, sign in (
+            ("buy", ThresholdIndex(buy_levels), self._buy, 1),
+            ("sell", ThresholdIndex(sell_levels), self._sell, -1),
+        ):
+            levels = sign * np.array(index.values, dtype=np.float64)
+            level_idx, ticks = fire_ticks(search, levels, self.ts, reset_minutes)
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(level_idx, minlength=len(levels)))))
+            fire_ts = self.ts[ticks]
+            results[side] = {
+                key: fire_ts[bounds[i]:bounds[i + 1]]
+                for i, key in enumerate(map(units_key, index.units))
+            }
+        return results
+
+
+def parse_levels(value):
+    return [v for v in value.split(",") if v.strip()]
+
+
+def format_ms(t_ms):
+    return datetime.fromtimestamp(t_ms / 1000).astimezone().isoformat(timespec="seconds")
+
+
+def print_report(results, reset_minutes):
+    print(f"\n⏱️ Cooldown: {reset_minutes} min" + (" (fire once)" if reset_minutes == 0 else ""))
+    print(f"{'side':<5} {'level':>18} {'fires':>8}  {'first':<25} last")
+    for side, levels in results.items():
+        for key, fires in levels.items():
+            first = format_ms(fires[0]) if len(fires) else "-"
+            last = format_ms(fires[-1]) if len(fires) else "-"
+            print(f"{side.upper():<5} {key:>18} {len(fires):>8}  {first:<25} {last}")
+
+
+def print_sweep(sweep):
+    resets = list(sweep)
+    print(f"\n{'side':<5} {'level':>18} " + " ".join(f"{f'{r}m':>8}" for r in resets))
+    for side, levels in sweep[resets[0]].items():
+        for key in levels:
+            counts = " ".join(f"{len(sweep[r][side][key]):>8}" for r in resets)
+            print(f"{side.upper():<5} {key:>18} {counts}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prices", help="CSV, .npz or price-history.bin")
+    parser.add_argument("--buy", default=os.getenv("BUY_ALERTS", ""), help="comma-separated buy levels")
+    parser.add_argument("--sell", default=os.getenv("SELL_ALERTS", ""), help="comma-separated sell levels")
+    parser.add_argument("--reset-minutes", default=os.getenv("ALERT_RESET_MINUTES", "0"),
+                        help="cooldown in minutes; a comma-separated list sweeps them")
+    parser.add_argument("--json", action="store_true", help="print every fire timestamp as JSON")
+    args = parser.parse_args(argv)
+
+    ts, buy, sell = load_prices(args.prices)
+    if not len(ts):
+        sys.exit(f"❌ No prices in {args.prices}")
+    print(f"📂 {len(ts):,} ticks from {format_ms(ts[0])} to {format_ms(ts[-1])}", file=sys.stderr, flush=True)
+
+    replay = Replay(ts, buy, sell)
+    resets = [float(r) if "." in r else int(r) for r in parse_levels(args.reset_minutes)]
+    sweep = {r: replay.run(parse_levels(args.buy), parse_levels(args.sell), r) for r in resets}
+
+    if args.json:
+        json.dump({
+            str(r): {side: {key: fires.tolist() for key, fires in levels.items()} for side, levels in results.items()}
+            for r, results in sweep.items()
+        }, sys.stdout)
+        print()
+    elif len(sweep) == 1:
+        print_report(sweep[resets[0]], resets[0])
+    else:
+        print_sweep(sweep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Offline benchmarks for the monitor and API hot paths.
+
+    python -m benchmarks.run                    # compare against baselines.json
+    python -m benchmarks.run --update-baseline  # record new baselines
+    python -m benchmarks.run --only check_prices --latency 0.01 --error-rate 0.05
+
+Every upstream (Jupiter, Dexscreener, ntfy, Discord) is served by the local
+stubs in benchmarks/stubs.py, streamed prices by its WebSocket stub feed
+(price_stream times one tick to its alert). For each scenario the best cycle time,
+upstream calls per cycle and peak traced memory are reported; any metric
+beyond its baseline plus tolerance fails the run with exit code 1.
+"""
+import argparse
+import asyncio
+import atexit
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import USDC, PricePath, StubDiscordClient, StubPriceFeed, StubServer  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+UPSTREAMS = ("jupiter", "jupiter_price", "dexscreener")
+
+# Absolute slack on top of the relative tolerance, so tiny numbers don't flap
+TIME_SLACK_MS = 25.0
+MEMORY_SLACK_KIB = 64.0
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def spread_levels(price, count, width=0.2):
+    """`count` levels evenly spread over price ± width."""
+    if count == 1:
+        return [round(price, 8)]
+    return [round(price * (1 - width + 2 * width * i / (count - 1)), 8) for i in range(count)]
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="jupiter-bench-")
+        # Registered before the state writers' own atexit flush, so it runs after it
+        atexit.register(shutil.rmtree, self.workdir, True)
+        self.stub = StubServer(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            price_path=PricePath(args.price_path, seed=args.seed),
+            seed=args.seed,
+        )
+        self.feed = StubPriceFeed()
+        self.stream_thread = None
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def setup(self):
+        """Point the monitor and API at the stubs and a scratch dir, then import them."""
+        url = self.stub.url
+        os.environ.update({
+            "INPUT_MINT": USDC,
+            "OUTPUT_MINT": "TOKEN0",
+            "JUPITER_QUOTE_URL": f"{url}/quote",
+            "JUPITER_PRICE_URL": f"{url}/price",
+            # The shared limiter would otherwise measure itself, not the code
+            "JUPITER_RATE_LIMIT": str(10 ** 9),
+            "JUPITER_BURST": str(10 ** 6),
+            "NTFY_SERVER": url,
+            "NTFY_TOPIC": "bench",
+            "NTFY_OUTBOX_PATH": self.path("ntfy-outbox.json"),
+            "NTFY_BUNDLE_WINDOW": "0",
+            "NTFY_MIN_INTERVAL": "0",
+            "PRICE_STREAM_URL": self.feed.url,
+        })
+        # backend_api mounts ./frontend at import time
+        os.makedirs(self.path("frontend"), exist_ok=True)
+        os.chdir(self.workdir)
+
+        with quiet():
+            import main
+            import backend_api
+            from discord_delivery import DiscordDelivery
+
+        main.shared_json_path = main.status_writer.path = self.path("jupiter-latest.json")
+        main.config_json_path = self.path("config.json")
+        main.pairs_writer.path = self.path("pairs-latest.json")
+        main.backend_sink = CountingSink()
+
+        backend_api.config_writer.path = self.path("api-config.json")
+        backend_api.state_writer.path = self.path("api-state.json")
+        backend_api.alerts_writer.path = self.path("discord-alerts.json")
+        backend_api.DEXSCREENER_TOKENS_URL = f"{url}/latest/dex/tokens/"
+        backend_api.discord_delivery = DiscordDelivery(StubDiscordClient(self.stub))
+
+        self.main = main
+        self.api = backend_api
+
+    def write_config(self, buy_alerts, sell_alerts, reset_minutes=0):
+        with open(self.main.config_json_path, "w") as f:
+            json.dump({
+                "usd_amount": 100.0,
+                "buy_alerts": buy_alerts,
+                "sell_alerts": sell_alerts,
+                "alert_reset_minutes": reset_minutes,
+            }, f)
+
+    def token_price(self, token):
+        return self.stub.price_path.price(token, 0)
+
+    def measure(self, name, cycle, prepare=None):
+        """
+        Run `cycle` once to warm up, N times timed and twice under tracemalloc.
+        The fastest timed cycle and the smaller traced peak are reported, the
+        least noisy numbers on a shared machine.
+        """
+        cycles = self.args.cycles
+        with quiet():
+            if prepare:
+                prepare()
+            cycle()
+            self.stub.reset_counts()
+            timings = []
+            for _ in range(cycles):
+                if prepare:
+                    prepare()
+                started = time.perf_counter()
+                cycle()
+                timings.append((time.perf_counter() - started) * 1000)
+            calls = sum(self.stub.calls[u] for u in UPSTREAMS) / cycles
+
+            peaks = []
+            for _ in range(2):
+                if prepare:
+                    prepare()
+                tracemalloc.start()
+                cycle()
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+        return {
+            "name": name,
+            "cycle_ms": round(min(timings), 3),
+            "calls": round(calls, 2),
+            "peak_kib": round(min(peaks) / 1024, 1),
+        }
+
+    # ——————— scenarios ———————
+
+    def check_prices(self, thresholds):
+        main = self.main
+        price = self.token_price("TOKEN0")
+        levels = spread_levels(price, thresholds)
+        self.write_config(levels, levels)
+        main.last_buy_alert.clear()
+        main.last_sell_alert.clear()
+
+        # Each cycle sees fresh quotes, as it would once the cache TTL has passed
+        return self.measure(f"check_prices[thresholds={thresholds}]", main.check_prices, main.quote_cache.invalidate)
+
+    def clean_expired_alerts(self, triggered):
+        main = self.main
+        price = self.token_price("TOKEN0")
+        # Every level's cooldown is over, so each needs a re-arm
+        buy = spread_levels(price * 1.5, triggered, width=0.1)
+        sell = spread_levels(price * 0.5, triggered, width=0.1)
+        self.write_config(buy, sell, reset_minutes=1)
+        expired = time.time() - 3600
+
+        def prepare():
+            main.quote_cache.invalidate()
+            # The last cycle's debounced write, so its timer can't go off inside the next measurement
+            main.status_writer.flush()
+            main.load_dynamic_config()
+            main.last_buy_alert.update({key: expired for key in main.CONFIG.buy_index.units})
+            main.last_sell_alert.update({key: expired for key in main.CONFIG.sell_index.units})
+            main.cooldown_timers.rebuild(main.CONFIG.alert_reset_minutes)
+
+        return self.measure(f"clean_expired_alerts[triggered={triggered}]", main.clean_expired_alerts, prepare)
+
+    def check_all_pairs(self, pairs, source="quote", name="check_all_pairs"):
+        main = self.main
+        states = []
+        for i in range(pairs):
+            token = f"TOKEN{i}"
+            price = self.token_price(token)
+            if source == "spot" and i % 10:
+                # Nine pairs in ten have their levels well away from the price
+                buy, sell = spread_levels(price * 0.5, 10, width=0.1), spread_levels(price * 1.5, 10, width=0.1)
+            else:
+                buy = sell = spread_levels(price, 20)
+            states.append(main.PairState(USDC, token, 100.0, buy, sell))
+
+        loop = asyncio.new_event_loop()
+        client = main.create_quote_client()
+        main.price_source = main.PRICE_SOURCES[source]()
+
+        def cycle():
+            loop.run_until_complete(main.check_all_pairs(client, states))
+
+        try:
+            return self.measure(f"{name}[pairs={pairs}]", cycle, main.quote_cache.invalidate)
+        finally:
+            main.price_source = main.QuotePriceSource()
+            loop.run_until_complete(client.__aexit__(None, None, None))
+            loop.close()
+
+    def check_all_pairs_spot(self, pairs):
+        # The warm-up cycle quotes every pair once to calibrate; timed cycles quote only the near ones
+        return self.check_all_pairs(pairs, "spot", "check_all_pairs_spot")
+
+    def price_stream(self, thresholds):
+        main = self.main
+        price = self.token_price("TOKEN0")
+        levels = spread_levels(price, thresholds)
+        # Only the top buy level is reached, and no sell level
+        self.write_config(levels, [round(price * 10, 8)])
+        top = max(levels)
+        main.last_buy_alert.clear()
+        main.last_sell_alert.clear()
+        main.stream_scale = (1.0, 1.0)
+
+        if self.stream_thread is None:
+            stream = main.create_price_stream()
+            self.stream_thread = threading.Thread(target=asyncio.run, args=(stream.run(),), daemon=True)
+            self.stream_thread.start()
+            deadline = time.monotonic() + 10
+            while not stream.connected:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("price stream did not connect to the stub feed")
+                self.feed.push("TOKEN0", price * 5)  # reaches no level
+                time.sleep(0.01)
+
+        sink = main.backend_sink
+
+        def prepare():
+            main.load_dynamic_config()
+            main.last_buy_alert.clear()
+            sink.triggered.clear()
+
+        def cycle():
+            # Tick pushed, read off the socket, evaluated and its alert queued
+            self.feed.push("TOKEN0", top)
+            if not sink.triggered.wait(5):
+                raise RuntimeError("streamed tick fired no alert")
+
+        return self.measure(f"price_stream[thresholds={thresholds}]", cycle, prepare)
+
+    def check_all_alerts(self, alerts):
+        api = self.api
+        from token_alerts import TokenAlertIndex
+
+        contracts = max(1, alerts // 10)
+        entries = []
+        for i in range(alerts):
+            contract = f"Contract{i % contracts:05d}"
+            price = self.token_price(contract)
+            entries.append({
+                "id": f"alert-{i}",
+                "contract": contract,
+                "ticker": contract[-5:],
+                "pair": "SOL",
+                "type": "price",
+                "condition": "above" if i % 2 else "below",
+                "value": round(price * (0.9 + 0.2 * (i % 10) / 9), 8),
+                "guild_id": "1",
+                "channel_id": str(100 + i % 25),
+            })
+        api.token_alerts = TokenAlertIndex(entries)
+        api.dexscreener_client = None
+
+        loop = asyncio.new_event_loop()
+
+        def cycle():
+            loop.run_until_complete(api.check_all_alerts())
+
+        try:
+            return self.measure(f"check_all_alerts[alerts={alerts}]", cycle)
+        finally:
+            loop.run_until_complete(api.get_dexscreener_client().aclose())
+            api.dexscreener_client = None
+            loop.close()
+
+
+class CountingSink:
+    """Stands in for the API the monitor reports to."""
+
+    def __init__(self):
+        self.events = 0
+        self.triggered = threading.Event()
+
+    def trigger(self, side, units, fired_at):
+        self.events += 1
+        self.triggered.set()
+
+    def price(self, timestamp, buy_price, sell_price):
+        self.events += 1
+
+    def reset(self, side, units):
+        self.events += 1
+        return True
+
+
+SCENARIOS = {
+    "check_prices": ("check_prices", (10, 1000, 10000)),
+    "clean_expired_alerts": ("clean_expired_alerts", (10, 1000, 10000)),
+    "check_all_pairs": ("check_all_pairs", (10, 100, 500)),
+    "check_all_pairs_spot": ("check_all_pairs_spot", (10, 100, 500)),
+    "check_all_alerts": ("check_all_alerts", (100, 1000, 10000)),
+    "price_stream": ("price_stream", (10, 1000, 10000)),
+}
+
+
+def settings(args):
+    return {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "price_path": args.price_path,
+        "seed": args.seed,
+        "cycles": args.cycles,
+    }
+
+
+def compare(rows, baselines, tolerance):
+    regressions = []
+    for row in rows:
+        base = baselines.get(row["name"])
+        if base is None:
+            continue
+        if row["cycle_ms"] > base["cycle_ms"] * (1 + tolerance) + TIME_SLACK_MS:
+            regressions.append(f"{row['name']}: cycle {row['cycle_ms']}ms vs baseline {base['cycle_ms']}ms")
+        if row["calls"] > base["calls"] + 0.5:
+            regressions.append(f"{row['name']}: {row['calls']} upstream calls/cycle vs baseline {base['calls']}")
+        if row["peak_kib"] > base["peak_kib"] * (1 + tolerance) + MEMORY_SLACK_KIB:
+            regressions.append(f"{row['name']}: peak {row['peak_kib']} KiB vs baseline {base['peak_kib']} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--cycles", type=int, default=5, help="Timed cycles per scenario")
+    parser.add_argument("--latency", type=float, default=0.002, help="Stub response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub responses that are 429s")
+    parser.add_argument("--price-path", choices=("walk", "sine", "flat"), default="walk")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown / memory growth")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to baselines.json")
+    args = parser.parse_args()
+
+    bench = Bench(args)
+    rows = []
+    with bench.stub, bench.feed:
+        bench.setup()
+        for scenario in args.only or SCENARIOS:
+            method, sizes = SCENARIOS[scenario]
+            for size in sizes:
+                row = getattr(bench, method)(size)
+                rows.append(row)
+                print(f"{row['name']:<42} {row['cycle_ms']:>10.2f} ms {row['calls']:>8.1f} calls {row['peak_kib']:>10.1f} KiB", flush=True)
+
+    if args.update_baseline:
+        data = {"settings": settings(args), "results": {}}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                data["results"] = json.load(f).get("results", {})
+        data["results"].update({row["name"]: {k: v for k, v in row.items() if k != "name"} for row in rows})
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"📝 Baselines written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("ℹ️ No baselines yet — run with --update-baseline to record them")
+        return 0
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings(args):
+        print(f"⚠️ Baselines were recorded with {baseline.get('settings')} — not comparing")
+        return 0
+
+    regressions = compare(rows, baseline["results"], args.tolerance)
+    for line in regressions:
+        print(f"❌ REGRESSION {line}")
+    if regressions:
+        return 1
+    print("✅ No regressions against baselines")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
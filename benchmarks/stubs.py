@@ -0,0 +1,273 @@
+"""
+Local stand-ins for Jupiter's quote and price APIs, Dexscreener and ntfy, so
+the benchmarks never touch the network. All of them run on one threaded HTTP
+server; every handler sleeps `latency` seconds, fails `error_rate` of the
+time (429 with Retry-After: 0) and counts its requests. StubPriceFeed is
+a WebSocket price stream the benchmark pushes ticks into.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from websockets.asyncio.server import broadcast, serve
+
+USDC = "USDC"
+
+
+def token_hash(token, seed):
+    # hash() of a str changes between runs; results must not
+    return zlib.crc32(f"{token}:{seed}".encode())
+
+
+class PricePath:
+    """Deterministic USD price of a token over time (seconds since the server started)."""
+
+    def __init__(self, kind="walk", base=1.0, seed=1):
+        self.kind = kind
+        self.base = base
+        self.seed = seed
+        self._walks = {}
+        self._lock = threading.Lock()
+
+    def price(self, token, t):
+        # Every token gets its own level so thresholds spread across them
+        base = self.base * (1 + token_hash(token, self.seed) % 1000 / 1000)
+        if self.kind == "flat":
+            return base
+        if self.kind == "sine":
+            return base * (1 + 0.05 * math.sin(t / 10))
+        with self._lock:
+            # Random walk advanced once per request, 0.2% steps
+            rng, value = self._walks.get(token, (random.Random(token_hash(token, self.seed)), base))
+            value *= math.exp(rng.gauss(0, 0.002))
+            self._walks[token] = (rng, value)
+            return value
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when a pooled client opens many connections at once
+    request_queue_size = 1024
+
+
+class StubServer:
+    def __init__(self, latency=0.002, error_rate=0.0, price_path=None, spread=0.003, seed=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.price_path = price_path or PricePath(seed=seed)
+        self.spread = spread
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def quote(self, query):
+        input_mint, output_mint = query["inputMint"][0], query["outputMint"][0]
+        amount = int(query["amount"][0])
+        t = time.monotonic() - self._started
+        if input_mint == USDC:
+            out = amount / self.price_path.price(output_mint, t)
+        else:
+            out = amount * self.price_path.price(input_mint, t) * (1 - self.spread)
+        return {
+            "inputMint": input_mint,
+            "outputMint": output_mint,
+            "inAmount": str(amount),
+            "outAmount": str(int(out)),
+            "otherAmountThreshold": str(int(out * 0.99)),
+            "priceImpactPct": "0",
+            "slippageBps": 100,
+            "routePlan": [{"swapInfo": {"label": "Stub"}}],
+            "contextSlot": 1,
+        }
+
+    def prices(self, query):
+        # USDC per token, the same price the quote endpoint converts at
+        t = time.monotonic() - self._started
+        return {
+            "data": {
+                mint: {"id": mint, "type": "derivedPrice", "price": str(self.price_path.price(mint, t))}
+                for mint in query["ids"][0].split(",")
+            },
+            "timeTaken": 0.001,
+        }
+
+    def dexscreener_pairs(self, addresses):
+        t = time.monotonic() - self._started
+        pairs = []
+        for address in addresses:
+            price = self.price_path.price(address, t)
+            pairs.append({
+                "baseToken": {"address": address, "symbol": address[:6]},
+                "quoteToken": {"symbol": "SOL"},
+                "priceNative": str(price),
+                "priceUsd": str(price * 150),
+                "fdv": price * 1_000_000_000,
+            })
+        return {"pairs": pairs}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, delayed ACKs add ~40ms a request
+            disable_nagle_algorithm = True
+
+            def _reply(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, endpoint, respond):
+                stub._count(endpoint)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub._fail():
+                    self._reply(429, b"{}", {"Retry-After": "0"})
+                    return
+                self._reply(200, json.dumps(respond()).encode(), {"Content-Type": "application/json"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/quote":
+                    self._handle("jupiter", lambda: stub.quote(parse_qs(url.query)))
+                elif url.path == "/price":
+                    self._handle("jupiter_price", lambda: stub.prices(parse_qs(url.query)))
+                elif url.path.startswith("/latest/dex/tokens/"):
+                    addresses = url.path.rsplit("/", 1)[1].split(",")
+                    self._handle("dexscreener", lambda: stub.dexscreener_pairs(addresses))
+                else:
+                    self._reply(404)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._handle("ntfy", lambda: {})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class StubPriceFeed:
+    """
+    WebSocket price feed in its own event loop: subscribers send
+    {"subscribe": [mints]} and get {"mint", "price"} for every push() of one
+    of them. drop() closes every connection, as an outage would.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._subscribers = {}
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    async def _stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _start(self):
+        self._server = await serve(self._handler, "127.0.0.1", 0)
+
+    async def _handler(self, ws):
+        try:
+            self._subscribers[ws] = set(json.loads(await ws.recv()).get("subscribe", ()))
+            await ws.wait_closed()
+        finally:
+            self._subscribers.pop(ws, None)
+
+    def push(self, mint, price):
+        message = json.dumps({"mint": mint, "price": price})
+        self._loop.call_soon_threadsafe(
+            lambda: broadcast([ws for ws, mints in self._subscribers.items() if mint in mints], message)
+        )
+
+    def drop(self):
+        def close_all():
+            for ws in list(self._subscribers):
+                self._loop.create_task(ws.close())
+        self._loop.call_soon_threadsafe(close_all)
+
+
+class StubChannel:
+    def __init__(self, stub):
+        self.stub = stub
+
+    async def send(self, content):
+        self.stub._count("discord")
+
+
+class StubDiscordClient:
+    """Just enough of discord.Client for DiscordDelivery."""
+
+    def __init__(self, stub):
+        self.stub = stub
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def fetch_channel(self, channel_id):
+        self.stub._count("discord_fetch_channel")
+        return StubChannel(self.stub)
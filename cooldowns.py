@@ -0,0 +1,88 @@
+import heapq
+import threading
+import time
+
+
+class CooldownTimers:
+    """
+    Min-heap of cooldown expiries for the triggered BUY/SELL levels, so the
+    cleaner sleeps until the next level is due instead of scanning them all.
+
+    `sides` maps "buy"/"sell" to the live {units: epoch seconds} dicts. Entries
+    are never removed in place: one whose trigger time no longer matches its
+    dict (fired again, reset or pruned meanwhile) is dropped when it surfaces.
+    """
+
+    def __init__(self, sides):
+        self.sides = sides
+        self.reset_minutes = 0
+        self._heap = []
+        self._cond = threading.Condition()
+
+    def _push(self, expires, side, key, last_time):
+        heapq.heappush(self._heap, (expires, side, key, last_time))
+        # Only a new earliest expiry changes how long the cleaner sleeps
+        if self._heap[0][0] == expires:
+            self._cond.notify_all()
+
+    def arm(self, side, key, last_time):
+        """Schedule the expiry of a level that just fired at `last_time`."""
+        with self._cond:
+            if self.reset_minutes > 0:
+                self._push(last_time + self.reset_minutes * 60, side, key, last_time)
+
+    def retry(self, side, key, last_time, seconds):
+        """Look at an expired level again in `seconds` (e.g. the API was unreachable)."""
+        with self._cond:
+            self._push(time.time() + seconds, side, key, last_time)
+
+    def rebuild(self, reset_minutes):
+        """Re-arm every tracked level, after the trigger times were reloaded or the cooldown changed."""
+        with self._cond:
+            self.reset_minutes = reset_minutes
+            self._heap = []
+            if reset_minutes > 0:
+                cooldown = reset_minutes * 60
+                self._heap = [
+                    (last_time + cooldown, side, key, last_time)
+                    for side, alert_dict in self.sides.items()
+                    for key, last_time in list(alert_dict.items())
+                ]
+                heapq.heapify(self._heap)
+            self._cond.notify_all()
+
+    def set_reset_minutes(self, reset_minutes):
+        if reset_minutes != self.reset_minutes:
+            self.rebuild(reset_minutes)
+
+    def pop_expired(self, now):
+        """(side, key, trigger time) of every still-current level whose cooldown is over."""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, side, key, last_time = heapq.heappop(self._heap)
+                if self.sides[side].get(key) == last_time:
+                    due.append((side, key, last_time))
+        return due
+
+    def wait(self, stop=None):
+        """
+        Block until the earliest expiry is due; with nothing cooling down, until
+        a level fires. Returns False instead once `stop` (an Event) is set and
+        wake() was called.
+        """
+        with self._cond:
+            while True:
+                if stop is not None and stop.is_set():
+                    return False
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    return True
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._heap)
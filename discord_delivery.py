@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+from metrics import NOTIFICATION_FAILURES, NOTIFICATION_SECONDS
+
+# Discord rejects messages longer than this
+MESSAGE_LIMIT = 2000
+
+# Documented defaults: 5 messages / 5s per channel, 50 requests / s per bot
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+MAX_SEND_ATTEMPTS = 3
+# Undelivered digests kept per channel for the next pass; the oldest are dropped beyond this
+MAX_RETRY_DIGESTS = 20
+
+
+class RateLimitBucket:
+    """
+    Sliding-window limiter for one Discord rate-limit bucket. `acquire()`
+    waits for a free slot instead of letting the send fail, and `block()`
+    pauses the bucket when Discord answers 429 anyway.
+    """
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self._sends = deque()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sends and self._sends[0] <= now - self.per:
+                    self._sends.popleft()
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if len(self._sends) < self.limit:
+                        self._sends.append(now)
+                        return
+                    wait = self._sends[0] + self.per - now
+                await asyncio.sleep(wait)
+
+    def block(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def build_digests(messages):
+    """Combine one channel's alert messages into as few <= 2000 char messages as possible."""
+    if len(messages) == 1:
+        return [messages[0][:MESSAGE_LIMIT]]
+
+    digests = []
+    current = f"🔔 **{len(messages)} alerts triggered**"
+    for message in messages:
+        message = message[:MESSAGE_LIMIT]
+        if len(current) + 2 + len(message) > MESSAGE_LIMIT:
+            digests.append(current)
+            current = message
+        else:
+            current += "\n\n" + message
+    digests.append(current)
+    return digests
+
+
+class DiscordDelivery:
+    """
+    Sends alert digests through a discord.py client (or anything exposing
+    get_channel/fetch_channel and channels with an async send, such as a
+    local stub). Channels are resolved once and cached, and every send
+    waits on its channel bucket and the global bucket. A digest that still
+    fails is sent again at the start of the channel's next pass: its alerts
+    have already fired, so they would not come around again.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._channels = {}
+        self._buckets = {}
+        self._retry = {}        # channel id -> digests to send again
+        self._global = RateLimitBucket(*GLOBAL_RATE)
+        self.stats = {"messages": 0, "sends": 0, "channel_fetches": 0, "rate_limited": 0, "failed": 0}
+
+    async def get_channel(self, channel_id):
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            # The gateway cache usually has it; fall back to one REST lookup
+            channel = self.client.get_channel(channel_id)
+            if channel is None:
+                channel = await self.client.fetch_channel(channel_id)
+                self.stats["channel_fetches"] += 1
+            self._channels[channel_id] = channel
+        return channel
+
+    def _bucket(self, channel_id):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = RateLimitBucket(*CHANNEL_RATE)
+        return bucket
+
+    async def _send(self, channel_id, content):
+        bucket = self._bucket(channel_id)
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            await bucket.acquire()
+            await self._global.acquire()
+            started = time.perf_counter()
+            try:
+                channel = await self.get_channel(channel_id)
+                await channel.send(content)
+                NOTIFICATION_SECONDS.labels("discord").observe(time.perf_counter() - started)
+                self.stats["sends"] += 1
+                return
+            except discord.HTTPException as e:
+                NOTIFICATION_FAILURES.labels("discord").inc()
+                if isinstance(e, (discord.NotFound, discord.Forbidden)):
+                    self._channels.pop(channel_id, None)
+                    raise
+                if e.status != 429 or attempt == MAX_SEND_ATTEMPTS - 1:
+                    raise
+                self.stats["rate_limited"] += 1
+                retry_after = getattr(e, "retry_after", None) or float(e.response.headers.get("Retry-After", 1))
+                bucket.block(retry_after)
+
+    @property
+    def pending(self):
+        return bool(self._retry)
+
+    async def send_channel(self, channel_id, messages):
+        self.stats["messages"] += len(messages)
+        digests = self._retry.pop(channel_id, []) + (build_digests(messages) if messages else [])
+        for i, digest in enumerate(digests):
+            try:
+                await self._send(channel_id, digest)
+            except Exception as e:
+                self.stats["failed"] += 1
+                if isinstance(e, (discord.NotFound, discord.Forbidden)):
+                    # Gone or not ours to post in: retrying won't help
+                    print(f"[ALERT ERROR] Dropping {len(digests) - i} digest(s) for channel {channel_id}: {e}")
+                    return
+                self._retry[channel_id] = digests[i:][-MAX_RETRY_DIGESTS:]
+                print(f"[ALERT ERROR] Could not deliver {len(digests) - i} digest(s) to channel {channel_id}, retrying next pass: {e}")
+                return
+
+    async def send_digests(self, messages_by_channel):
+        """Send every channel's messages for one pass, and what earlier passes could not; channels proceed concurrently."""
+        channels = list(messages_by_channel) + [c for c in self._retry if c not in messages_by_channel]
+        await asyncio.gather(*(
+            self.send_channel(channel_id, messages_by_channel.get(channel_id, []))
+            for channel_id in channels
+        ))
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+
+def format_sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventBroker:
+    """
+    Fan-out of small state deltas to Server-Sent Events subscribers. Each
+    event is serialized once and queued for every open stream; a subscriber
+    whose queue fills up is dropped and resyncs from a snapshot on reconnect.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._subscribers = set()
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event_id, event, data):
+        if not self._subscribers:
+            return
+        message = format_sse(event_id, event, data)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)  # tells the stream to close
+
+    def __len__(self):
+        return len(self._subscribers)
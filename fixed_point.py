@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# Alert levels and trigger times are kept as integer 1e-8 price units and epoch
+# seconds in memory; the `.8f` keys and ISO strings exist only in JSON.
+
+SCALE = 100_000_000
+
+
+def to_units(value):
+    """Price (float, int or decimal string) -> integer 1e-8 units. Raises ValueError."""
+    try:
+        if isinstance(value, str):
+            # Exact for strings, so "0.1" and the key "0.10000000" agree
+            return int((Decimal(value.strip()) * SCALE).to_integral_value())
+        return round(float(value) * SCALE)
+    except (InvalidOperation, OverflowError):
+        raise ValueError(f"not a price: {value!r}") from None
+
+
+def from_units(units):
+    return units / SCALE
+
+
+# Every state write re-renders all trigger times, but they rarely change
+@lru_cache(maxsize=65536)
+def units_key(units):
+    """The legacy f"{price:.8f}" key, without going through a float."""
+    sign = "-" if units < 0 else ""
+    whole, frac = divmod(abs(units), SCALE)
+    return f"{sign}{whole}.{frac:08d}"
+
+
+def parse_time(value):
+    """ISO timestamp -> epoch seconds; naive timestamps are local time, as the monitor used to write them."""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return dt.timestamp()
+
+
+@lru_cache(maxsize=65536)
+def format_time(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def triggers_from_json(raw):
+    """{".8f" key: ISO time} -> {units: epoch seconds}, skipping empty or malformed entries."""
+    triggers = {}
+    for key, value in raw.items():
+        if not value:
+            continue
+        try:
+            triggers[to_units(key)] = parse_time(value)
+        except (TypeError, ValueError):
+            continue
+    return triggers
+
+
+def triggers_to_json(triggers):
+    return {units_key(u): format_time(t) for u, t in triggers.items()}
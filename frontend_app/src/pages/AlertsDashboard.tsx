@@ -17,6 +17,9 @@ import {
 
 ChartJS.register(LineElement, PointElement, LinearScale, CategoryScale, Tooltip, Legend);
 
+// Matches LATEST_PRICES_LIMIT in backend_api.py
+const HISTORY_POINTS = 100;
+
 function getAlertStatusWithCountdown(lastTime: string | undefined, resetMinutes: number): string {
   if (!lastTime) return "🟢 Active";
   try {
@@ -58,29 +61,55 @@ export default function AlertsDashboard() {
   const [alertValue, setAlertValue] = useState("");
   const [channelId, setChannelId] = useState("");
 
-  const fetchState = () => {
-    fetch("/api/state")
-      .then((res) => res.json())
-      .then((data) => {
-        setUsdAmount(data.usd_amount || 100);
-        setBuyAlerts(data.buy_alerts || []);
-        setSellAlerts(data.sell_alerts || []);
-        setLastBuyTimes(data.last_triggered_buy || {});
-        setLastSellTimes(data.last_triggered_sell || {});
-        setAlertResetMinutes(data.alert_reset_minutes || 0);
-        setHistory(data.latest_prices || []);
-        const last = data.latest_prices?.at(-1);
-        setLatestBuyPrice(last?.buy_price ?? null);
-        setLatestSellPrice(last?.sell_price ?? null);
-      })
-      .catch(() => toast.error("Failed to load state"));
+  const applyState = (data: any) => {
+    setUsdAmount(data.usd_amount || 100);
+    setBuyAlerts(data.buy_alerts || []);
+    setSellAlerts(data.sell_alerts || []);
+    setLastBuyTimes(data.last_triggered_buy || {});
+    setLastSellTimes(data.last_triggered_sell || {});
+    setAlertResetMinutes(data.alert_reset_minutes || 0);
+    setHistory(data.latest_prices || []);
+    const last = data.latest_prices?.at(-1);
+    setLatestBuyPrice(last?.buy_price ?? null);
+    setLatestSellPrice(last?.sell_price ?? null);
+    if (data.alerts) setAlerts(data.alerts);
   };
 
-  const fetchAlerts = () => {
-    fetch("/api/alerts")
-      .then((res) => res.json())
-      .then(setAlerts)
-      .catch(() => toast.error("Failed to load alerts"));
+  // Live updates: a full snapshot on connect, then small deltas as they happen
+  const subscribe = () => {
+    const source = new EventSource("/api/stream");
+    const on = (event: string, handler: (data: any) => void) =>
+      source.addEventListener(event, (e) => handler(JSON.parse((e as MessageEvent).data)));
+
+    on("snapshot", applyState);
+    on("price", (p) => {
+      setHistory((prev) => [...prev.slice(-(HISTORY_POINTS - 1)), p]);
+      setLatestBuyPrice(p.buy_price);
+      setLatestSellPrice(p.sell_price);
+    });
+    on("trigger", (t) => {
+      const setTimes = t.side === "buy" ? setLastBuyTimes : setLastSellTimes;
+      setTimes((prev) => ({ ...prev, [t.key]: t.timestamp }));
+    });
+    on("reset", (r) => {
+      const setTimes = r.side === "buy" ? setLastBuyTimes : setLastSellTimes;
+      setTimes((prev) => {
+        const next = { ...prev };
+        delete next[r.key];
+        return next;
+      });
+    });
+    on("config", (c) => {
+      setUsdAmount(c.usd_amount);
+      setBuyAlerts(c.buy_alerts);
+      setSellAlerts(c.sell_alerts);
+      setAlertResetMinutes(c.alert_reset_minutes);
+    });
+    on("history", () => setHistory([]));
+    on("alerts", (a) => {
+      setAlerts((prev) => (a.added ? [...prev, a.added] : prev.filter((x) => x.id !== a.deleted)));
+    });
+    return source;
   };
 
   const fetchTokenInfo = async () => {
@@ -120,7 +149,6 @@ export default function AlertsDashboard() {
       setSelectedPair("");
       setAlertValue("");
       setChannelId("");
-      fetchAlerts();
     } else {
       const err = await res.json();
       toast.error(err.detail || "Failed to add alert");
@@ -131,22 +159,19 @@ export default function AlertsDashboard() {
     const res = await fetch(`/api/alerts/${id}`, { method: "DELETE" });
     if (res.ok) {
       toast.success("Alert removed");
-      fetchAlerts();
     } else {
       toast.error("Failed to remove alert");
     }
   };
 
   useEffect(() => {
-    fetchState();
-    fetchAlerts();
-    const interval = setInterval(fetchState, 60000);
+    const source = subscribe();
     const refreshCountdown = setInterval(() => {
       setLastBuyTimes((prev) => ({ ...prev }));
       setLastSellTimes((prev) => ({ ...prev }));
     }, 1000);
     return () => {
-      clearInterval(interval);
+      source.close();
       clearInterval(refreshCountdown);
     };
   }, []);
@@ -173,7 +198,6 @@ export default function AlertsDashboard() {
     });
     if (res.ok) {
       toast.success("Reset minutes updated");
-      fetchState();
     }
   };
 
@@ -188,7 +212,6 @@ export default function AlertsDashboard() {
     if (res.ok) {
       toast.success(`${type} alert added`);
       type === "buy" ? setNewBuy("") : setNewSell("");
-      fetchState();
     }
   };
 
@@ -200,7 +223,6 @@ export default function AlertsDashboard() {
     });
     if (res.ok) {
       toast.success(`Reset ${type} alert`);
-      fetchState();
     } else {
       toast.error("Failed to reset alert");
     }
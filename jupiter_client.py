@@ -0,0 +1,233 @@
+import asyncio
+import os
+import threading
+import time
+from typing import NamedTuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+JUPITER_QUOTE_URL = os.getenv("JUPITER_QUOTE_URL", "https://quote-api.jup.ag/v6/quote")
+JUPITER_PRICE_URL = os.getenv("JUPITER_PRICE_URL", "https://lite-api.jup.ag/price/v2")
+# The price endpoint takes at most 100 comma-separated ids per request
+JUPITER_PRICE_BATCH = int(os.getenv("JUPITER_PRICE_BATCH", "100"))
+# Requests allowed per rolling minute across every caller in this process, and how
+# many of those may go out back to back
+JUPITER_RATE_LIMIT = int(os.getenv("JUPITER_RATE_LIMIT", "600"))
+JUPITER_BURST = int(os.getenv("JUPITER_BURST", "50"))
+JUPITER_MAX_RETRIES = int(os.getenv("JUPITER_MAX_RETRIES", "4"))
+SLIPPAGE_BPS = 100
+RETRY_BASE = 0.5
+RETRY_MAX = 30.0
+
+
+class Quote(NamedTuple):
+    """The parts of a Jupiter /quote response we use; amounts are in base units."""
+    input_mint: str
+    output_mint: str
+    in_amount: int
+    out_amount: int
+    other_amount_threshold: int
+    price_impact_pct: float
+    slippage_bps: int
+    route: tuple        # AMM labels along the route
+    context_slot: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            input_mint=data["inputMint"],
+            output_mint=data["outputMint"],
+            in_amount=int(data["inAmount"]),
+            out_amount=int(data["outAmount"]),
+            other_amount_threshold=int(data.get("otherAmountThreshold") or 0),
+            price_impact_pct=float(data.get("priceImpactPct") or 0),
+            slippage_bps=int(data.get("slippageBps") or 0),
+            route=tuple(step.get("swapInfo", {}).get("label", "") for step in data.get("routePlan", [])),
+            context_slot=int(data.get("contextSlot") or 0),
+        )
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `reserve()` takes the next token and returns how
+    long the caller must wait for it, so sync and async callers can share one
+    bucket and each sleep their own way. Refilling at (limit - burst) per
+    window keeps any rolling window at or under `limit` requests.
+    """
+
+    def __init__(self, limit, burst, window=60.0):
+        self.window = window
+        self._tat = 0.0  # theoretical arrival time of the next token (GCRA)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.set_limit(limit, burst)
+
+    def set_limit(self, limit, burst):
+        with self._lock:
+            self.burst = max(1, burst)
+            self.interval = self.window / max(1, limit - self.burst)
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now, self._paused_until)
+            wait = max(0.0, tat - (self.burst - 1) * self.interval - now, self._paused_until - now)
+            self._tat = tat + self.interval
+            return wait
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+rate_limiter = TokenBucket(JUPITER_RATE_LIMIT, JUPITER_BURST)
+
+
+def quote_params(input_mint, output_mint, amount):
+    return {
+        "inputMint": input_mint,
+        "outputMint": output_mint,
+        "amount": amount,
+        "slippageBps": SLIPPAGE_BPS,
+    }
+
+
+def observe_request(started, status, upstream="jupiter"):
+    UPSTREAM_SECONDS.labels(upstream).observe(time.perf_counter() - started)
+    UPSTREAM_REQUESTS.labels(upstream, str(status or "error")).inc()
+
+
+def retry_delay(status, headers, attempt):
+    """Seconds to wait before retrying a response with `status`, or None if it shouldn't be retried."""
+    if status != 429 and status < 500:
+        return None
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(RETRY_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return min(RETRY_MAX, RETRY_BASE * 2 ** attempt)
+
+
+class JupiterQuoteClient:
+    """Blocking quote client over one keep-alive requests.Session."""
+
+    def __init__(self, url=JUPITER_QUOTE_URL, timeout=10, limiter=rate_limiter, pool_size=10):
+        self.url = url
+        self.timeout = timeout
+        self.limiter = limiter
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def quote(self, input_mint, output_mint, amount):
+        """A Quote, or None once retries are exhausted or the pair has no route."""
+        params = quote_params(input_mint, output_mint, amount)
+        for attempt in range(JUPITER_MAX_RETRIES + 1):
+            time.sleep(self.limiter.reserve())
+            started = time.perf_counter()
+            try:
+                res = self.session.get(self.url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                observe_request(started, None)
+                print(f"⚠️ Quote request failed for {input_mint} → {output_mint}: {e}", flush=True)
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** attempt)
+            else:
+                observe_request(started, res.status_code)
+                if res.status_code == 200:
+                    return Quote.from_json(res.json())
+                delay = retry_delay(res.status_code, res.headers, attempt)
+                if delay is None:
+                    print(f"⚠️ Quote rejected for {input_mint} → {output_mint} ({res.status_code}): {res.text[:200]}", flush=True)
+                    return None
+                if res.status_code == 429:
+                    self.limiter.pause(delay)
+            if attempt < JUPITER_MAX_RETRIES:
+                time.sleep(delay)
+        print(f"❌ Giving up on quote {input_mint} → {output_mint} after {JUPITER_MAX_RETRIES + 1} attempts", flush=True)
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncJupiterQuoteClient:
+    """Async counterpart over a pooled httpx.AsyncClient; shares the same limiter."""
+
+    def __init__(self, http, url=JUPITER_QUOTE_URL, limiter=rate_limiter, price_url=JUPITER_PRICE_URL):
+        self.http = http
+        self.url = url
+        self.price_url = price_url
+        self.limiter = limiter
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+
+    async def _get(self, url, params, what, upstream):
+        """The JSON body, or None once retries are exhausted or the request was rejected."""
+        for attempt in range(JUPITER_MAX_RETRIES + 1):
+            await asyncio.sleep(self.limiter.reserve())
+            started = time.perf_counter()
+            try:
+                res = await self.http.get(url, params=params)
+            except httpx.HTTPError as e:
+                observe_request(started, None, upstream)
+                print(f"⚠️ {what} request failed: {e}", flush=True)
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** attempt)
+            else:
+                observe_request(started, res.status_code, upstream)
+                if res.status_code == 200:
+                    return res.json()
+                delay = retry_delay(res.status_code, res.headers, attempt)
+                if delay is None:
+                    print(f"⚠️ {what} rejected ({res.status_code}): {res.text[:200]}", flush=True)
+                    return None
+                if res.status_code == 429:
+                    self.limiter.pause(delay)
+            if attempt < JUPITER_MAX_RETRIES:
+                await asyncio.sleep(delay)
+        print(f"❌ Giving up on {what} after {JUPITER_MAX_RETRIES + 1} attempts", flush=True)
+        return None
+
+    async def quote(self, input_mint, output_mint, amount):
+        data = await self._get(
+            self.url, quote_params(input_mint, output_mint, amount), f"Quote {input_mint} → {output_mint}", "jupiter"
+        )
+        return Quote.from_json(data) if data is not None else None
+
+    async def prices(self, mints, vs_token=None):
+        """
+        Spot price of each mint in `vs_token` (USDC when None) from the
+        multi-id price endpoint, one request per JUPITER_PRICE_BATCH mints.
+        Mints Jupiter can't price are left out.
+        """
+        mints = list(dict.fromkeys(mints))
+        batches = [mints[i:i + JUPITER_PRICE_BATCH] for i in range(0, len(mints), JUPITER_PRICE_BATCH)]
+        responses = await asyncio.gather(*(
+            self._get(
+                self.price_url,
+                {"ids": ",".join(batch), **({"vsToken": vs_token} if vs_token else {})},
+                f"Price batch of {len(batch)}",
+                "jupiter_price",
+            )
+            for batch in batches
+        ))
+
+        prices = {}
+        for data in responses:
+            for mint, entry in ((data or {}).get("data") or {}).items():
+                try:
+                    price = float(entry["price"])
+                except (TypeError, KeyError, ValueError):
+                    continue  # null entry: no price for this mint
+                if price > 0:
+                    prices[mint] = price
+        return prices
@@ -1,35 +1,176 @@
 import os
 import time
 import threading
+import asyncio
 import requests
+import httpx
 import json
-from datetime import datetime, timedelta, timezone
+import multiprocessing
+import queue
+from datetime import datetime, timezone
+from typing import NamedTuple
+from prometheus_client import start_http_server
+from quote_cache import QuoteCache
+from alert_index import ThresholdIndex, refresh_index
+from persistence import JsonStateWriter, file_fingerprint
+from notifier import NtfyOutbox
+from poll_scheduler import AdaptivePoll, PollScheduler
+from cooldowns import CooldownTimers
+from price_stream import PRICE_STREAM_STALE, PRICE_STREAM_URL, PriceStream
+from fixed_point import format_time, from_units, parse_time, to_units, triggers_from_json, triggers_to_json, units_key
+from shards import HashRing, MonitorChannel
+from jupiter_client import JupiterQuoteClient, AsyncJupiterQuoteClient, JUPITER_BURST, JUPITER_RATE_LIMIT, rate_limiter
+from metrics import (
+    ALERT_EVALUATIONS, ALERTS_FIRED, CHECK_CYCLE_SECONDS, CHECK_LATENESS_SECONDS, STATE_WRITE_SECONDS,
+    STREAM_TICK_TO_ALERT_SECONDS,
+)
 
 INPUT_MINT = os.getenv("INPUT_MINT")
 OUTPUT_MINT = os.getenv("OUTPUT_MINT")
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "60"))
 
+# Multi-pair mode: a JSON list of pairs, each with its own amount and targets
+PAIRS_FILE = os.getenv("PAIRS_FILE")
+QUOTE_CONCURRENCY = int(os.getenv("QUOTE_CONCURRENCY", "256"))
+QUOTE_TIMEOUT = float(os.getenv("QUOTE_TIMEOUT", "10"))
+# How multi-pair mode prices pairs: "quote" takes two /quote calls per pair; "spot" prices
+# every mint through batched Jupiter price requests and quotes only pairs near a level
+PRICE_SOURCE = os.getenv("PRICE_SOURCE", "quote")
+# A pair is quoted in full when a level is within this percentage of its spot estimate,
+# or when its last full quote is older than SPOT_QUOTE_MAX_AGE seconds
+SPOT_NEAR_PCT = float(os.getenv("SPOT_NEAR_PCT", "2"))
+SPOT_QUOTE_MAX_AGE = float(os.getenv("SPOT_QUOTE_MAX_AGE", "600"))
+
+# Multi-pair mode across this many worker processes ("auto": one per core; 0 or 1: in-process)
+SHARD_WORKERS = os.getenv("SHARD_WORKERS", "0")
+SHARD_WORKERS = (os.cpu_count() or 1) if SHARD_WORKERS == "auto" else int(SHARD_WORKERS)
+# How often the supervisor looks for PAIRS_FILE changes and dead workers
+SHARD_CHECK_SECONDS = float(os.getenv("SHARD_CHECK_SECONDS", "10"))
+# Sharded workers' triggers and prices reach the API over this one WebSocket
+MONITOR_CHANNEL_URL = os.getenv("MONITOR_CHANNEL_URL", "ws://127.0.0.1:8000/api/monitor/events")
+
+# Adaptive polling: a pair is quoted sooner the closer it is to a level and the faster it
+# moves, between POLL_MIN_INTERVAL and POLL_MAX_INTERVAL. Off, every poll is CHECK_INTERVAL.
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "0") == "1"
+if ADAPTIVE_POLLING:
+    POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", min(10, CHECK_INTERVAL)))
+    POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", CHECK_INTERVAL * 10))
+    if POLL_MIN_INTERVAL > CHECK_INTERVAL:
+        print(f"⚠️ POLL_MIN_INTERVAL={POLL_MIN_INTERVAL:g}s is above CHECK_INTERVAL — using {CHECK_INTERVAL}s", flush=True)
+        POLL_MIN_INTERVAL = float(CHECK_INTERVAL)
+else:
+    POLL_MIN_INTERVAL = POLL_MAX_INTERVAL = CHECK_INTERVAL
+
+# Identical quote requests within this window share one upstream call. Kept well under the
+# poll interval: a check starts one interval after the last, and must not get its quote back
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", min(5.0, POLL_MIN_INTERVAL / 2)))
+if QUOTE_CACHE_TTL >= POLL_MIN_INTERVAL:
+    # Fixed-rate schedules (and adaptive pairs near a level) poll every POLL_MIN_INTERVAL
+    print(f"⚠️ QUOTE_CACHE_TTL={QUOTE_CACHE_TTL:g}s would reuse quotes across polls — using {POLL_MIN_INTERVAL / 2:g}s", flush=True)
+    QUOTE_CACHE_TTL = POLL_MIN_INTERVAL / 2
+
+# With PRICE_STREAM_URL set, streamed ticks drive the alerts and full quotes only keep their
+# buy/sell calibration fresh, at most this often; while the stream is down, polling is as above
+PRICE_STREAM_POLL_INTERVAL = float(os.getenv("PRICE_STREAM_POLL_INTERVAL", "300"))
+
 shared_json_path = "/shared/jupiter-latest.json"
 config_json_path = "/shared/config.json"
+pairs_json_path = "/shared/pairs-latest.json"
+
+# Standalone monitor serves Prometheus metrics here (embedded, they are on the API's /metrics)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
 
 NTFY_TOPIC = os.getenv("NTFY_TOPIC")
 NTFY_SERVER = os.getenv("NTFY_SERVER", "https://ntfy.sh")
+ntfy_outbox = NtfyOutbox(NTFY_SERVER)
 
+# ENV defaults; the live values are in CONFIG
 USD_AMOUNT = float(os.getenv("USD_AMOUNT", 100.0))
-BUY_ALERTS = []
-SELL_ALERTS = []
 ALERT_RESET_MINUTES = int(os.getenv("ALERT_RESET_MINUTES", 0))
 
+
+class MonitorConfig(NamedTuple):
+    """Validated, immutable config. Reloads build a new one and swap the CONFIG reference."""
+    usd_amount: float
+    buy_alerts: tuple
+    sell_alerts: tuple
+    alert_reset_minutes: int
+    buy_index: ThresholdIndex    # sorted, pre-parsed buy levels with their fixed-point units
+    sell_index: ThresholdIndex
+
+
+CONFIG = MonitorConfig(USD_AMOUNT, (), (), ALERT_RESET_MINUTES, ThresholdIndex(), ThresholdIndex())
+
+# Level units -> epoch seconds it last fired
 last_buy_alert = {}
 last_sell_alert = {}
+# Expiry heap over both dicts; the background cleaner sleeps on it
+cooldown_timers = CooldownTimers({"buy": last_buy_alert, "sell": last_sell_alert})
+# How soon a re-arm is retried when the API could not be told
+RESET_RETRY_SECONDS = 5
+# Quote checks and streamed ticks may evaluate at the same time; one fire per crossing.
+# An embedded config reload takes it too, so it never lands between a fire and its trigger
+evaluation_lock = threading.Lock()
 
-print("✅ Starting script, checking env vars...", flush=True)
-print(f"INPUT_MINT: {INPUT_MINT}", flush=True)
-print(f"OUTPUT_MINT: {OUTPUT_MINT}", flush=True)
+# Streamed spot price -> buy/sell price, from the last full quote; None until one lands
+stream_scale = None
+last_tick = None
+price_stream = None
+# Set when the stream drops, so polling takes over without waiting out the long interval
+stream_dropped = threading.Event()
 
-if not INPUT_MINT or not OUTPUT_MINT:
-    print("❌ Missing required environment variables. Exiting.", flush=True)
-    exit(1)
+quote_cache = QuoteCache(QUOTE_CACHE_TTL)
+# Keep-alive session for the blocking path; shares the process-wide Jupiter rate limiter
+quote_client = JupiterQuoteClient(timeout=QUOTE_TIMEOUT)
+
+# Coalesced, atomic writers for the files shared with the API/UI
+status_writer = JsonStateWriter(shared_json_path)
+pairs_writer = JsonStateWriter(pairs_json_path)
+
+
+class HttpBackendSink:
+    """Delivers trigger/price/reset events to the API over loopback HTTP."""
+
+    base_url = "http://127.0.0.1:8000"
+
+    def trigger(self, side, units, fired_at):
+        try:
+            requests.post(f"{self.base_url}/api/trigger", json={
+                "side": side,
+                "price": from_units(units),
+                "timestamp": format_time(fired_at)
+            })
+        except Exception as e:
+            print(f"⚠️ Failed to notify backend of {side} trigger: {e}", flush=True)
+
+    def price(self, timestamp, buy_price, sell_price):
+        try:
+            requests.post(f"{self.base_url}/api/price", json={
+                "timestamp": timestamp,
+                "buy_price": buy_price,
+                "sell_price": sell_price
+            })
+        except Exception as e:
+            print(f"❌ Failed to send price to backend: {e}", flush=True)
+
+    def reset(self, side, units):
+        resp = requests.post(f"{self.base_url}/api/reset-alert", json={"side": side, "price": from_units(units)})
+        return resp.ok
+
+
+# When backend_api embeds the monitor (EMBEDDED_MONITOR=1) it swaps in its own
+# sink and hands us its state, so no loopback HTTP or shared-file parsing is needed.
+# The provider exposes version() (bumped on every relevant change) and snapshot().
+backend_sink = HttpBackendSink()
+config_provider = None
+# Receives multi-pair triggers: the API's monitor channel, or a shard worker's supervisor
+pair_sink = None
+
+def embed(sink, provider):
+    global backend_sink, config_provider
+    backend_sink = sink
+    config_provider = provider
+    ntfy_outbox.start()
 
 def parse_env_alerts(env_value):
     try:
@@ -37,142 +178,197 @@ def parse_env_alerts(env_value):
     except Exception:
         return []
 
-def load_dynamic_config():
-    global USD_AMOUNT, BUY_ALERTS, SELL_ALERTS, ALERT_RESET_MINUTES
+def build_config(data, previous):
+    """Validate raw config values into a new MonitorConfig; missing fields keep `previous`."""
+    usd_amount = float(data.get("usd_amount", previous.usd_amount))
+    buy_alerts = data.get("buy_alerts", previous.buy_alerts)
+    sell_alerts = data.get("sell_alerts", previous.sell_alerts)
+    reset_minutes = int(data.get("alert_reset_minutes", previous.alert_reset_minutes))
+
+    if usd_amount <= 0:
+        raise ValueError(f"usd_amount must be positive, got {usd_amount}")
+    if not isinstance(buy_alerts, (list, tuple)) or not isinstance(sell_alerts, (list, tuple)):
+        raise ValueError("buy_alerts and sell_alerts must be lists")
+    if reset_minutes < 0:
+        raise ValueError(f"alert_reset_minutes must be >= 0, got {reset_minutes}")
+
+    buy_alerts = tuple(buy_alerts)
+    sell_alerts = tuple(sell_alerts)
+    return MonitorConfig(
+        usd_amount,
+        buy_alerts,
+        sell_alerts,
+        reset_minutes,
+        refresh_index(previous.buy_index, buy_alerts),
+        refresh_index(previous.sell_index, sell_alerts),
+    )
+
+def env_config_data():
+    return {
+        "buy_alerts": parse_env_alerts(os.getenv("BUY_ALERTS", "")),
+        "sell_alerts": parse_env_alerts(os.getenv("SELL_ALERTS", "")),
+        "alert_reset_minutes": int(os.getenv("ALERT_RESET_MINUTES", ALERT_RESET_MINUTES)),
+    }
+
+# What the current CONFIG / trigger times were built from; an unchanged source is skipped
+_config_source = object()
+_status_source = None
+_raw_triggers = None
+_config_lock = threading.Lock()
 
-    # ——————— load config.json as before ———————
-    if os.path.exists(config_json_path):
-        try:
-            with open(config_json_path) as f:
-                data = json.load(f)
-                USD_AMOUNT = float(data.get("usd_amount", USD_AMOUNT))
-                BUY_ALERTS = data.get("buy_alerts", BUY_ALERTS)
-                SELL_ALERTS = data.get("sell_alerts", SELL_ALERTS)
-                ALERT_RESET_MINUTES = int(data.get("alert_reset_minutes", ALERT_RESET_MINUTES))
-        except Exception as e:
-            print(f"⚠️ Failed to load config.json: {e}", flush=True)
-    else:
-        print("ℹ️ No config.json found — using ENV defaults", flush=True)
-        BUY_ALERTS = parse_env_alerts(os.getenv("BUY_ALERTS", ""))
-        SELL_ALERTS = parse_env_alerts(os.getenv("SELL_ALERTS", ""))
-        ALERT_RESET_MINUTES = int(os.getenv("ALERT_RESET_MINUTES", ALERT_RESET_MINUTES))
+def load_dynamic_config():
+    """
+    Pick up config and trigger-time changes. Sources are fingerprinted
+    (stat() for the shared files, a version counter when embedded), so an
+    unchanged config costs a stat() per call and nothing is re-parsed.
+    """
+    global CONFIG, _config_source, _status_source
+
+    with _config_lock:
+        if config_provider is not None:
+            # ——————— embedded in the API: read its state directly ———————
+            # Not between a fire and its trigger reaching the API: this snapshot would lack it
+            with evaluation_lock:
+                version = config_provider.version()
+                if version == _config_source:
+                    return
+                data = config_provider.snapshot()
+                try:
+                    CONFIG = build_config(data, CONFIG)
+                    cooldown_timers.set_reset_minutes(CONFIG.alert_reset_minutes)
+                except (TypeError, ValueError) as e:
+                    print(f"⚠️ Ignoring invalid config: {e}", flush=True)
+                # Already in memory form, nothing to parse
+                set_trigger_times(data["triggered_buy"], data["triggered_sell"])
+                _config_source = version
+                prune_trigger_times()
+            return
 
-    # ——————— load & normalize jupiter-latest.json timestamps ———————
-    if os.path.exists(shared_json_path):
+        # ——————— load config.json only when it changed ———————
+        fingerprint = file_fingerprint(config_json_path)
+        if fingerprint != _config_source:
+            _config_source = fingerprint
+            try:
+                if fingerprint is None:
+                    print("ℹ️ No config.json found — using ENV defaults", flush=True)
+                    data = env_config_data()
+                else:
+                    with open(config_json_path) as f:
+                        data = json.load(f)
+                CONFIG = build_config(data, CONFIG)
+                cooldown_timers.set_reset_minutes(CONFIG.alert_reset_minutes)
+            except Exception as e:
+                print(f"⚠️ Failed to load config.json: {e}", flush=True)
+            prune_trigger_times()
+
+        # ——————— load & normalize trigger timestamps only when someone else wrote them ———————
+        fingerprint = file_fingerprint(shared_json_path)
+        if fingerprint is None or fingerprint == _status_source:
+            return
+        if fingerprint != status_writer.written_fingerprint and status_writer.pending:
+            # Land our own pending write first so the reload below can't undo it; only
+            # then, so the debounce keeps coalescing writes on every other tick
+            status_writer.flush()
+            fingerprint = file_fingerprint(shared_json_path)
+        _status_source = fingerprint
+        if fingerprint == status_writer.written_fingerprint:
+            return  # our own write — memory is already up to date
         try:
             with open(shared_json_path) as f:
                 state_data = json.load(f)
         except Exception as e:
             print(f"⚠️ Failed to open jupiter-latest.json: {e}", flush=True)
             return
+        load_trigger_times(state_data)
+        prune_trigger_times()
 
-        local_tz = datetime.now().astimezone().tzinfo
-
-        # rebuild last_buy_alert in UTC
-        last_buy_alert.clear()
-        for k, v in state_data.get("last_triggered_buy", {}).items():
-            if not v:
-                continue
-            dt = datetime.fromisoformat(v)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=local_tz).astimezone(timezone.utc)
-            else:
-                dt = dt.astimezone(timezone.utc)
-            last_buy_alert[k] = dt
-
-        # rebuild last_sell_alert in UTC
-        last_sell_alert.clear()
-        for k, v in state_data.get("last_triggered_sell", {}).items():
-            if not v:
-                continue
-            dt = datetime.fromisoformat(v)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=local_tz).astimezone(timezone.utc)
-            else:
-                dt = dt.astimezone(timezone.utc)
-            last_sell_alert[k] = dt
 
+def prune_trigger_times():
     # ——————— prune any timestamps for alerts that no longer exist ———————
-    valid_buy_keys  = { f"{float(x):.8f}" for x in BUY_ALERTS }
     for k in list(last_buy_alert):
-        if k not in valid_buy_keys:
+        if k not in CONFIG.buy_index:
             last_buy_alert.pop(k)
 
-    valid_sell_keys = { f"{float(x):.8f}" for x in SELL_ALERTS }
     for k in list(last_sell_alert):
-        if k not in valid_sell_keys:
+        if k not in CONFIG.sell_index:
             last_sell_alert.pop(k)
 
     # now last_buy_alert & last_sell_alert only contain timestamps
-    # for alerts still present in BUY_ALERTS / SELL_ALERTS
+    # for alerts still present in the configured buy/sell lists
 
 
+def load_trigger_times(state_data):
+    """Trigger times from jupiter-latest.json ({".8f" key: ISO time})."""
+    global _raw_triggers
+
+    # Unchanged timestamps don't need their ISO strings parsed again
+    raw = (state_data.get("last_triggered_buy", {}), state_data.get("last_triggered_sell", {}))
+    if raw == _raw_triggers:
+        return
+    _raw_triggers = raw
+    set_trigger_times(triggers_from_json(raw[0]), triggers_from_json(raw[1]))
+
+
+def set_trigger_times(buy, sell):
+    """Replace the trigger times ({units: epoch seconds}) and re-arm their cooldowns."""
+    last_buy_alert.clear()
+    last_buy_alert.update(buy)
+    last_sell_alert.clear()
+    last_sell_alert.update(sell)
+    cooldown_timers.rebuild(CONFIG.alert_reset_minutes)
 
 
 def to_lamports(amount): return int(amount * 1_000_000)
 
 def send_alert(title, message):
+    # Queued only; the outbox thread delivers, retries and bundles
     if not NTFY_TOPIC:
         return
-    try:
-        url = f"{NTFY_SERVER.rstrip('/')}/{NTFY_TOPIC}"
-        requests.post(
-            url,
-            data=message.encode("utf-8"),
-            headers={"Title": title, "Content-Type": "text/plain; charset=utf-8"}
-        )
-    except Exception as e:
-        print(f"❌ Failed to send alert: {e}", flush=True)
+    ntfy_outbox.send(NTFY_TOPIC, title, message)
 
-def notify_backend_trigger(side: str, price: float):
-    try:
-        requests.post("http://127.0.0.1:8000/api/trigger", json={
-            "side": side,
-            "price": round(price, 8),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        })
-    except Exception as e:
-        print(f"⚠️ Failed to notify backend of {side} trigger: {e}", flush=True)
+def notify_backend_trigger(side: str, units: int, fired_at: float):
+    backend_sink.trigger(side, units, fired_at)
+
+def fetch_out_amount(input_mint, output_mint, amount_lamports):
+    quote = quote_client.quote(input_mint, output_mint, amount_lamports)
+    return quote.out_amount / 1_000_000 if quote else None
 
 def get_out_amount(input_mint, output_mint, amount_lamports):
-    url = f"https://quote-api.jup.ag/v6/quote?inputMint={input_mint}&outputMint={output_mint}&amount={amount_lamports}&slippage=1"
-    res = requests.get(url)
-    if res.status_code == 200:
-        data = res.json()
-        return int(data.get("outAmount", 0)) / 1_000_000
-    return None
+    return quote_cache.get(
+        (input_mint, output_mint, amount_lamports),
+        lambda: fetch_out_amount(input_mint, output_mint, amount_lamports),
+    )
 
 
-def should_alert(alert_dict, key):
+def should_alert(alert_dict, key, reset_minutes=None):
     """
     Decide whether we should fire an alert for `key`, and return
-    (allow: bool, timestamp_to_set: datetime or None).
+    (allow: bool, timestamp_to_set: epoch seconds or None).
 
-    - If ALERT_RESET_MINUTES == 0: only allow on first encounter (when key not in alert_dict).
+    `reset_minutes` defaults to CONFIG.alert_reset_minutes.
+    - If reset_minutes == 0: only allow on first encounter (when key not in alert_dict).
       Once triggered, it will remain blocked until you call reset (which removes alert_dict[key]).
-    - If ALERT_RESET_MINUTES > 0: allow when there's no timestamp or the cooldown has expired.
+    - If reset_minutes > 0: allow when there's no timestamp or the cooldown has expired.
     """
-    now_utc = datetime.now(timezone.utc)
+    if reset_minutes is None:
+        reset_minutes = CONFIG.alert_reset_minutes
+    now = time.time()
     last_time = alert_dict.get(key)
 
     # 🛑 Zero-reset mode: fire exactly once then block forever until manual reset
-    if ALERT_RESET_MINUTES == 0:
+    if reset_minutes == 0:
         if last_time is None:
-            return True, now_utc    # first trigger
+            return True, now        # first trigger
         else:
             return False, None      # already triggered, stay off
 
-    # From here on ALERT_RESET_MINUTES > 0
-
-    # Normalize older, naive timestamps to UTC
-    if last_time and last_time.tzinfo is None:
-        last_time = last_time.replace(tzinfo=timezone.utc)
+    # From here on reset_minutes > 0
 
     # ✅ No previous trigger or cooldown expired → allow and clear old timestamp
-    if not last_time or (now_utc - last_time) >= timedelta(minutes=ALERT_RESET_MINUTES):
-        if last_time:
+    if last_time is None or now - last_time >= reset_minutes * 60:
+        if last_time is not None:
             alert_dict.pop(key, None)
-        return True, now_utc
+        return True, now
 
     # ❌ Still in cooldown
     return False, None
@@ -180,71 +376,79 @@ def should_alert(alert_dict, key):
 
 
 
+@STATE_WRITE_SECONDS.labels("write_status_json").time()
 def write_status_json(price_buy, price_sell, token_received, usdc_returned):
-    try:
-        json_data = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "usd_amount": USD_AMOUNT,
-            "price_per_token_buy": round(price_buy, 8) if price_buy else None,
-            "price_per_token_sell": round(price_sell, 8) if price_sell else None,
-            "token_received": round(token_received, 8) if token_received else None,
-            "usdc_returned": round(usdc_returned, 8) if usdc_returned else None,
-            "buy_alerts": BUY_ALERTS,
-            "sell_alerts": SELL_ALERTS,
-            "last_triggered_buy": {k: v.isoformat() for k, v in last_buy_alert.items()},
-            "last_triggered_sell": {k: v.isoformat() for k, v in last_sell_alert.items()},
-            "alert_reset_minutes": ALERT_RESET_MINUTES
-        }
-        with open(shared_json_path, "w") as f:
-            json.dump(json_data, f, indent=2)
-    except Exception as e:
-        print(f"❌ Failed to write shared status file: {e}", flush=True)
+    if config_provider is not None:
+        return  # embedded: the API owns jupiter-latest.json
+    cfg = CONFIG
+    status_writer.merge({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "usd_amount": cfg.usd_amount,
+        "price_per_token_buy": round(price_buy, 8) if price_buy else None,
+        "price_per_token_sell": round(price_sell, 8) if price_sell else None,
+        "token_received": round(token_received, 8) if token_received else None,
+        "usdc_returned": round(usdc_returned, 8) if usdc_returned else None,
+        "buy_alerts": cfg.buy_alerts,
+        "sell_alerts": cfg.sell_alerts,
+        "alert_reset_minutes": cfg.alert_reset_minutes,
+    })
+    write_cooldowns_json()
+
+def write_cooldowns_json():
+    if config_provider is not None:
+        return
+    # Only the trigger timestamps changed — leave the last known prices alone.
+    # Copied (atomically) and formatted when the debounced write runs.
+    status_writer.merge({
+        "last_triggered_buy": lambda: triggers_to_json(dict(last_buy_alert)),
+        "last_triggered_sell": lambda: triggers_to_json(dict(last_sell_alert)),
+    })
+
+def fire_buy_alerts(cfg, price_buy, source):
+    """Fire every BUY level the price reached that isn't cooling down; returns how many fired."""
+    fired = 0
+    with evaluation_lock:
+        # Only levels at or above the buy price can fire
+        ALERT_EVALUATIONS.labels(source).inc()
+        for alert_price, price_key in cfg.buy_index.buy_triggered(price_buy):
+            trigger_ready, trigger_time = should_alert(last_buy_alert, price_key, cfg.alert_reset_minutes)
+            if trigger_ready:
+                fired += 1
+                ALERTS_FIRED.labels(source).inc()
+                send_alert("Buy Price Alert", f"Buy price ${price_buy:.8f} is ≤ target ${alert_price}")
+                notify_backend_trigger("buy", price_key, trigger_time)
+                last_buy_alert[price_key] = trigger_time
+                cooldown_timers.arm("buy", price_key, trigger_time)
+    return fired
+
+def fire_sell_alerts(cfg, price_sell, source):
+    """Fire every SELL level the price reached that isn't cooling down; returns how many fired."""
+    fired = 0
+    with evaluation_lock:
+        # Only levels at or below the sell price can fire
+        ALERT_EVALUATIONS.labels(source).inc()
+        for alert_price, price_key in cfg.sell_index.sell_triggered(price_sell):
+            trigger_ready, trigger_time = should_alert(last_sell_alert, price_key, cfg.alert_reset_minutes)
+            if trigger_ready:
+                fired += 1
+                ALERTS_FIRED.labels(source).inc()
+                send_alert("Sell Price Alert", f"Sell price ${price_sell:.8f} is ≥ target ${alert_price}")
+                notify_backend_trigger("sell", price_key, trigger_time)
+                last_sell_alert[price_key] = trigger_time
+                cooldown_timers.arm("sell", price_key, trigger_time)
+    return fired
 
 def check_prices():
     load_dynamic_config()
-    usdc_lamports = to_lamports(USD_AMOUNT)
+    cfg = CONFIG  # one snapshot for the whole cycle
+    usd_amount = cfg.usd_amount
+    usdc_lamports = to_lamports(usd_amount)
 
     local_now = datetime.now().astimezone()
     print(f"\n📅 {local_now.strftime('%Y-%m-%d %H:%M:%S %Z')} — Price Check", flush=True)
 
-    # ✅ Clear expired cooldowns so alerts behave like fresh ones
-    now_utc = datetime.now(timezone.utc)
-    if ALERT_RESET_MINUTES > 0:
-        cooldown_delta = timedelta(minutes=ALERT_RESET_MINUTES)
-
-        # Clean up buy alerts
-        for key in list(last_buy_alert.keys()):
-            last_time = last_buy_alert[key]
-            if last_time.tzinfo is None:
-                last_time = last_time.replace(tzinfo=timezone.utc)
-            if (now_utc - last_time) >= cooldown_delta:
-                print(f"🔁 Cooldown expired — clearing BUY alert {key}", flush=True)
-                del last_buy_alert[key]
-
-        # Clean up sell alerts
-        for key in list(last_sell_alert.keys()):
-            last_time = last_sell_alert[key]
-            if last_time.tzinfo is None:
-                last_time = last_time.replace(tzinfo=timezone.utc)
-            if (now_utc - last_time) >= cooldown_delta:
-                print(f"🔁 Cooldown expired — clearing SELL alert {key}", flush=True)
-                del last_sell_alert[key]
-
-    # ✅ Force timestamp cleanup if alert is marked Active again
-    all_buy_keys = [f"{float(b):.8f}" for b in BUY_ALERTS]
-    all_sell_keys = [f"{float(s):.8f}" for s in SELL_ALERTS]
-
-    for key in all_buy_keys:
-        ready, _ = should_alert(last_buy_alert, key)
-        if ready and key in last_buy_alert:
-            print(f"🧹 Auto-clean: BUY alert {key} is active — clearing old timestamp", flush=True)
-            del last_buy_alert[key]
-
-    for key in all_sell_keys:
-        ready, _ = should_alert(last_sell_alert, key)
-        if ready and key in last_sell_alert:
-            print(f"🧹 Auto-clean: SELL alert {key} is active — clearing old timestamp", flush=True)
-            del last_sell_alert[key]
+    # Expired cooldowns need no sweep here: should_alert() lets them fire and
+    # the background cleaner re-arms them in the API when they expire
 
     # ✅ Fetch price data
     token_received = get_out_amount(INPUT_MINT, OUTPUT_MINT, usdc_lamports)
@@ -254,172 +458,869 @@ def check_prices():
 
     # ✅ BUY CHECK
     if token_received:
-        price_buy = USD_AMOUNT / token_received
-        print(f"💵 Buying token with ${USD_AMOUNT} USDC:")
+        price_buy = usd_amount / token_received
+        print(f"💵 Buying token with ${usd_amount} USDC:")
         print(f"   Price per token: ${price_buy:.8f}")
         print(f"   Token received: {token_received:.8f}")
 
-        for target in BUY_ALERTS:
-            try:
-                alert_price = float(str(target).strip())
-                price_key = f"{alert_price:.8f}"
-                trigger_ready, trigger_time = should_alert(last_buy_alert, price_key)
-
-                if trigger_ready and price_buy <= alert_price:
-                    send_alert("Buy Price Alert", f"Buy price ${price_buy:.8f} is ≤ target ${alert_price}")
-                    notify_backend_trigger("buy", alert_price)
-                    last_buy_alert[price_key] = trigger_time
-                    write_status_json(price_buy, price_sell, token_received, usdc_returned)
-            except ValueError:
-                continue
+        fire_buy_alerts(cfg, price_buy, "monitor")
     else:
         print("❌ Could not fetch USDC → token quote.", flush=True)
 
     # ✅ SELL CHECK
     if usdc_returned and token_received:
         price_sell = usdc_returned / token_received
-        print(f"\n💸 Selling ${USD_AMOUNT} worth of token:")
+        print(f"\n💸 Selling ${usd_amount} worth of token:")
         print(f"   Price per token: ${price_sell:.8f}")
         print(f"   USDC received: {usdc_returned:.8f}")
 
-        for target in SELL_ALERTS:
-            try:
-                alert_price = float(str(target).strip())
-                price_key = f"{alert_price:.8f}"
-                trigger_ready, trigger_time = should_alert(last_sell_alert, price_key)
-
-                if trigger_ready and price_sell >= alert_price:
-                    send_alert("Sell Price Alert", f"Sell price ${price_sell:.8f} is ≥ target ${alert_price}")
-                    notify_backend_trigger("sell", alert_price)
-                    last_sell_alert[price_key] = trigger_time
-                    write_status_json(price_buy, price_sell, token_received, usdc_returned)
-            except ValueError:
-                continue
+        fire_sell_alerts(cfg, price_sell, "monitor")
     else:
         print("❌ Could not fetch token → USDC quote.", flush=True)
 
-    # ✅ Final status save and debug tracking
+    calibrate_stream(price_buy, price_sell)
+
+    # ✅ Final status save and debug tracking (one merge covers every trigger above)
     write_status_json(price_buy, price_sell, token_received, usdc_returned)
-    print(f"🧠 Tracked BUY cooldowns: {list(last_buy_alert.keys())}", flush=True)
-    print(f"🧠 Tracked SELL cooldowns: {list(last_sell_alert.keys())}", flush=True)
+    print(f"🧠 Tracked BUY cooldowns: {[from_units(u) for u in last_buy_alert]}", flush=True)
+    print(f"🧠 Tracked SELL cooldowns: {[from_units(u) for u in last_sell_alert]}", flush=True)
 
-    try:
-        requests.post("http://127.0.0.1:8000/api/price", json={
-            "timestamp": datetime.now().isoformat(),
-            "buy_price": price_buy,
-            "sell_price": price_sell
+    backend_sink.price(datetime.now().isoformat(), price_buy, price_sell)
+    return price_buy, price_sell
+
+
+def create_poll():
+    return AdaptivePoll(POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, CHECK_INTERVAL)
+
+
+def next_check_delay(poll, prices):
+    """Seconds until the single-pair monitor should check again, given check_prices()' result."""
+    price_buy, price_sell = prices
+    cfg = CONFIG
+    delay = poll.next_delay(price_buy, price_sell, cfg.buy_index.values, cfg.sell_index.values)
+    if ADAPTIVE_POLLING:
+        print(f"⏳ Next check in {delay:.0f}s", flush=True)
+    return delay
+
+
+def calibrate_stream(price_buy, price_sell):
+    """Scale streamed spot prices to what a full quote of USD_AMOUNT pays, using the tick closest to it."""
+    global stream_scale
+    tick = last_tick
+    if tick is None or not tick.price or not price_buy or not price_sell:
+        return
+    if time.perf_counter() - tick.received > PRICE_STREAM_STALE:
+        return
+    stream_scale = (price_buy / tick.price, price_sell / tick.price)
+
+
+def on_price_tick(tick):
+    """Evaluate one streamed (already coalesced) price against the BUY/SELL levels."""
+    global last_tick
+    if tick.mint != OUTPUT_MINT:
+        return
+    last_tick = tick
+    if tick.buy_price and tick.sell_price:
+        price_buy, price_sell = tick.buy_price, tick.sell_price
+    elif stream_scale is not None:
+        price_buy, price_sell = tick.price * stream_scale[0], tick.price * stream_scale[1]
+    else:
+        return  # not calibrated until the first full quote
+
+    load_dynamic_config()
+    cfg = CONFIG
+    fired = fire_buy_alerts(cfg, price_buy, "stream") + fire_sell_alerts(cfg, price_sell, "stream")
+    if fired:
+        latency = time.perf_counter() - tick.received
+        STREAM_TICK_TO_ALERT_SECONDS.observe(latency)
+        write_cooldowns_json()
+        print(f"⚡ {fired} alert(s) from the price stream, {latency * 1000:.1f}ms after the tick "
+              f"(buy ${price_buy:.8f}, sell ${price_sell:.8f})", flush=True)
+
+
+def create_price_stream(wake=None):
+    """
+    Stream consumer for OUTPUT_MINT, or None without PRICE_STREAM_URL.
+    `wake` is called (in the stream's event loop) when the stream drops.
+    """
+    if not PRICE_STREAM_URL:
+        return None
+
+    def on_state(connected):
+        if connected:
+            print(f"📡 Price stream connected — full quotes every {PRICE_STREAM_POLL_INTERVAL:.0f}s", flush=True)
+        else:
+            print("📡 Price stream lost — falling back to polling", flush=True)
+            if wake:
+                wake()
+
+    global price_stream
+    price_stream = PriceStream(PRICE_STREAM_URL, [OUTPUT_MINT], on_price_tick, on_state)
+    return price_stream
+
+
+def stream_poll_delay(delay):
+    """While the stream is up and usable, polls only recalibrate, so they can be much rarer."""
+    if price_stream is None or not price_stream.connected:
+        return delay
+    tick = last_tick
+    if stream_scale is None and not (tick and tick.buy_price and tick.sell_price):
+        return delay  # keep polling until a quote lines up with a tick
+    return max(delay, PRICE_STREAM_POLL_INTERVAL)
+
+
+def background_alert_cleaner(stop=None):
+    # Sleeps until the next cooldown expires; idle while nothing is cooling down.
+    # An embedding API sets `stop` (then wakes the timers) when this process stops leading.
+    while cooldown_timers.wait(stop):
+        try:
+            clean_expired_alerts()
+        except Exception as e:
+            print(f"❌ [BG] Error: {e}", flush=True)
+            time.sleep(RESET_RETRY_SECONDS)
+
+
+def clean_expired_alerts():
+    """Re-arm every level whose cooldown is over, locally and in the API."""
+    # 🔄 pick up any UI changes (reset‐minutes or manual resets) first
+    load_dynamic_config()
+    cfg = CONFIG
+
+    reset_any = False
+    for label, key, last_time in cooldown_timers.pop_expired(time.time()):
+        index, alert_dict = (cfg.buy_index, last_buy_alert) if label == "buy" else (cfg.sell_index, last_sell_alert)
+        alert_price = index.by_units.get(key)
+        if alert_price is None:
+            continue
+        try:
+            print(f"🧹 [BG] {label.upper()} alert {alert_price} cooldown expired — re-arming", flush=True)
+            if backend_sink.reset(label, key):
+                # Unless it fired again meanwhile; persisted below so the UI sees it
+                if alert_dict.get(key) == last_time:
+                    alert_dict.pop(key, None)
+                    reset_any = True
+                continue
+        except Exception as e:
+            print(f"❌ [BG] Failed to re-arm {label.upper()} alert {alert_price}: {e}", flush=True)
+        cooldown_timers.retry(label, key, last_time, RESET_RETRY_SECONDS)
+
+    if reset_any:
+        write_cooldowns_json()
+
+
+# ——————— multi-pair mode ———————
+
+class PairState:
+    """Per-pair config and cooldown state for the multi-pair monitor."""
+
+    __slots__ = (
+        "input_mint", "output_mint", "usd_amount", "buy_alerts", "sell_alerts", "buy_index", "sell_index",
+        "name", "last_buy_alert", "last_sell_alert", "price_buy", "price_sell", "token_received",
+        "usdc_returned", "updated_at", "poll", "price_source", "buy_scale", "sell_scale", "quoted_at",
+    )
+
+    def __init__(self, input_mint, output_mint, usd_amount, buy_alerts, sell_alerts, name=None):
+        self.input_mint = input_mint
+        self.output_mint = output_mint
+        self.usd_amount = float(usd_amount)
+        self.buy_alerts = buy_alerts
+        self.sell_alerts = sell_alerts
+        self.buy_index = ThresholdIndex(buy_alerts)
+        self.sell_index = ThresholdIndex(sell_alerts)
+        self.name = name or output_mint
+        self.last_buy_alert = {}
+        self.last_sell_alert = {}
+        self.price_buy = None
+        self.price_sell = None
+        self.token_received = None
+        self.usdc_returned = None
+        self.updated_at = None
+        self.poll = create_poll()
+        self.price_source = None
+        # Quoted price / spot price at the last full quote, and when it was taken (monotonic)
+        self.buy_scale = None
+        self.sell_scale = None
+        self.quoted_at = None
+
+    @property
+    def key(self):
+        return pair_key(self.input_mint, self.output_mint, self.usd_amount)
+
+    def calibrate(self, spot):
+        """Remember how the full quote just taken relates to `spot` (spread, price impact, decimals)."""
+        if self.price_buy and self.price_sell and spot:
+            self.buy_scale = self.price_buy / spot
+            self.sell_scale = self.price_sell / spot
+            self.quoted_at = time.monotonic()
+
+    def apply_spot(self, spot):
+        """
+        Take prices from `spot` scaled by the last full quote instead of quoting.
+        Returns False, leaving the pair untouched, when it needs a full quote:
+        no recent calibration, or a level within SPOT_NEAR_PCT of the estimate.
+        """
+        if not spot or self.quoted_at is None or time.monotonic() - self.quoted_at > SPOT_QUOTE_MAX_AGE:
+            return False
+        price_buy = spot * self.buy_scale
+        price_sell = spot * self.sell_scale
+        margin = SPOT_NEAR_PCT / 100
+        # Buy levels fire at price <= level, sell levels at price >= level
+        if self.buy_index.values and self.buy_index.values[-1] >= price_buy * (1 - margin):
+            return False
+        if self.sell_index.values and self.sell_index.values[0] <= price_sell * (1 + margin):
+            return False
+
+        self.price_buy = price_buy
+        self.price_sell = price_sell
+        self.token_received = self.usd_amount / price_buy
+        self.usdc_returned = price_sell * self.token_received
+        self.updated_at = datetime.now(timezone.utc)
+        self.price_source = "spot"
+        return True
+
+    def to_json(self):
+        return {
+            "name": self.name,
+            "input_mint": self.input_mint,
+            "output_mint": self.output_mint,
+            "usd_amount": self.usd_amount,
+            "price_per_token_buy": round(self.price_buy, 8) if self.price_buy else None,
+            "price_per_token_sell": round(self.price_sell, 8) if self.price_sell else None,
+            "token_received": round(self.token_received, 8) if self.token_received else None,
+            "usdc_returned": round(self.usdc_returned, 8) if self.usdc_returned else None,
+            "buy_alerts": self.buy_alerts,
+            "sell_alerts": self.sell_alerts,
+            "last_triggered_buy": triggers_to_json(self.last_buy_alert),
+            "last_triggered_sell": triggers_to_json(self.last_sell_alert),
+            "timestamp": self.updated_at.isoformat() if self.updated_at else None,
+            "price_source": self.price_source,
+        }
+
+
+def pair_key(input_mint, output_mint, usd_amount):
+    return f"{input_mint}:{output_mint}:{float(usd_amount):g}"
+
+
+def entry_key(entry):
+    return pair_key(entry["input_mint"], entry["output_mint"], entry["usd_amount"])
+
+
+def load_pair_entries(path):
+    """
+    Read the PAIRS_FILE list into plain dicts. Each entry needs an
+    `output_mint`; `input_mint` falls back to INPUT_MINT, `usd_amount` to
+    USD_AMOUNT, and the alert lists accept either JSON arrays or the
+    comma-separated ENV format.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+
+    entries = []
+    for entry in raw:
+        input_mint = entry.get("input_mint", INPUT_MINT)
+        output_mint = entry.get("output_mint")
+        if not input_mint or not output_mint:
+            print(f"⚠️ Skipping pair without mints: {entry}", flush=True)
+            continue
+        buy_alerts = entry.get("buy_alerts", [])
+        sell_alerts = entry.get("sell_alerts", [])
+        if isinstance(buy_alerts, str):
+            buy_alerts = parse_env_alerts(buy_alerts)
+        if isinstance(sell_alerts, str):
+            sell_alerts = parse_env_alerts(sell_alerts)
+        entries.append({
+            "input_mint": input_mint,
+            "output_mint": output_mint,
+            "usd_amount": float(entry.get("usd_amount", USD_AMOUNT)),
+            "buy_alerts": buy_alerts,
+            "sell_alerts": sell_alerts,
+            "name": entry.get("name"),
         })
+    return entries
+
+
+def pair_from_entry(entry, triggers=None):
+    """PairState for a load_pair_entries() entry; `triggers` is (buy, sell) trigger JSON to carry over."""
+    pair = PairState(
+        entry["input_mint"],
+        entry["output_mint"],
+        entry["usd_amount"],
+        entry["buy_alerts"],
+        entry["sell_alerts"],
+        name=entry["name"],
+    )
+    if triggers:
+        pair.last_buy_alert.update(triggers_from_json(triggers[0]))
+        pair.last_sell_alert.update(triggers_from_json(triggers[1]))
+    return pair
+
+
+def load_pairs(path, triggers=None):
+    """PairStates for PAIRS_FILE; `triggers` is load_pair_triggers() output to start from."""
+    triggers = triggers or {}
+    return [pair_from_entry(entry, triggers.get(entry_key(entry))) for entry in load_pair_entries(path)]
+
+
+def load_pair_triggers(path):
+    """
+    {pair key: (buy, sell) trigger JSON} from the last run's pairs-latest.json,
+    so levels that fired stay fired across a restart until they are reset.
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f).get("pairs", [])
+        return {
+            pair_key(p["input_mint"], p["output_mint"], p["usd_amount"]):
+                (p.get("last_triggered_buy") or {}, p.get("last_triggered_sell") or {})
+            for p in saved
+        }
+    except FileNotFoundError:
+        return {}
     except Exception as e:
-        print(f"❌ Failed to send price to backend: {e}", flush=True)
+        print(f"⚠️ Failed to load trigger times from {path}: {e}", flush=True)
+        return {}
 
 
-def background_alert_cleaner():
-    while True:
-        # 🔄 pick up any UI changes (reset‐minutes or manual resets)
-        load_dynamic_config()
+def reset_pair(pair, side, units, before):
+    """
+    Re-arm one of `pair`'s levels for a reset from the API. Only the trigger
+    the API saw (fired at `before`) is undone, not a newer one.
+    """
+    triggered = pair.last_buy_alert if side == "buy" else pair.last_sell_alert
+    fired_at = triggered.get(units)
+    # A millisecond of slack: `before` made a round trip through ISO text
+    if fired_at is None or fired_at > before + 0.001:
+        return False
+    del triggered[units]
+    print(f"♻️ [{pair.name}] {side.capitalize()} alert at ${from_units(units)} re-armed", flush=True)
+    return True
+
+
+def create_quote_client():
+    # One pooled client for every pair; keep-alive connections are reused across cycles
+    return AsyncJupiterQuoteClient(httpx.AsyncClient(
+        timeout=QUOTE_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=QUOTE_CONCURRENCY,
+            max_keepalive_connections=QUOTE_CONCURRENCY,
+        ),
+    ))
+
+
+async def fetch_out_amount_async(client, input_mint, output_mint, amount_lamports):
+    quote = await client.quote(input_mint, output_mint, amount_lamports)
+    return quote.out_amount / 1_000_000 if quote else None
+
+
+async def get_out_amount_async(client, input_mint, output_mint, amount_lamports):
+    return await quote_cache.aget(
+        (input_mint, output_mint, amount_lamports),
+        lambda: fetch_out_amount_async(client, input_mint, output_mint, amount_lamports),
+    )
+
+
+async def quote_pair(client, pair):
+    # The sell leg quotes what the buy leg returned, so the two stay sequential per pair
+    token_received = await get_out_amount_async(
+        client, pair.input_mint, pair.output_mint, to_lamports(pair.usd_amount)
+    )
+    usdc_returned = (
+        await get_out_amount_async(client, pair.output_mint, pair.input_mint, to_lamports(token_received))
+        if token_received else None
+    )
+
+    pair.token_received = token_received
+    pair.usdc_returned = usdc_returned
+    pair.price_buy = pair.usd_amount / token_received if token_received else None
+    pair.price_sell = usdc_returned / token_received if token_received and usdc_returned else None
+    pair.updated_at = datetime.now(timezone.utc)
+    pair.price_source = "quote"
+
+
+def evaluate_pair(pair):
+    if pair.price_buy is None:
+        print(f"❌ [{pair.name}] Could not fetch USDC → token quote.", flush=True)
+    else:
+        ALERT_EVALUATIONS.labels("pairs").inc()
+        for alert_price, price_key in pair.buy_index.buy_triggered(pair.price_buy):
+            trigger_ready, trigger_time = should_alert(pair.last_buy_alert, price_key)
+            if trigger_ready:
+                ALERTS_FIRED.labels("pairs").inc()
+                send_alert(
+                    f"Buy Price Alert — {pair.name}",
+                    f"Buy price ${pair.price_buy:.8f} is ≤ target ${alert_price}",
+                )
+                pair.last_buy_alert[price_key] = trigger_time
+                if pair_sink is not None:
+                    pair_sink.trigger(pair, "buy", price_key, trigger_time)
+
+    if pair.price_sell is None:
+        print(f"❌ [{pair.name}] Could not fetch token → USDC quote.", flush=True)
+    else:
+        ALERT_EVALUATIONS.labels("pairs").inc()
+        for alert_price, price_key in pair.sell_index.sell_triggered(pair.price_sell):
+            trigger_ready, trigger_time = should_alert(pair.last_sell_alert, price_key)
+            if trigger_ready:
+                ALERTS_FIRED.labels("pairs").inc()
+                send_alert(
+                    f"Sell Price Alert — {pair.name}",
+                    f"Sell price ${pair.price_sell:.8f} is ≥ target ${alert_price}",
+                )
+                pair.last_sell_alert[price_key] = trigger_time
+                if pair_sink is not None:
+                    pair_sink.trigger(pair, "sell", price_key, trigger_time)
+
+
+def write_pairs_json(pairs):
+    pairs_writer.merge({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "alert_reset_minutes": CONFIG.alert_reset_minutes,
+        "pairs": [p.to_json() for p in pairs],
+    })
+
 
-        now_utc = datetime.now(timezone.utc)
-        usdc_lamports = to_lamports(USD_AMOUNT)
+class QuotePriceSource:
+    """Two /quote calls per pair: the exact buy and sell price for its USD amount."""
 
-        # fetch live buy/sell prices
-        token_received = get_out_amount(INPUT_MINT, OUTPUT_MINT, usdc_lamports)
-        usdc_returned = (
-            get_out_amount(OUTPUT_MINT, INPUT_MINT, to_lamports(token_received))
-            if token_received else None
+    async def refresh(self, client, pairs):
+        """Price every pair in place; returns one result per pair (an exception if it failed)."""
+        return await asyncio.gather(*(quote_pair(client, p) for p in pairs), return_exceptions=True)
+
+
+class SpotPriceSource(QuotePriceSource):
+    """
+    Prices every mint through batched Jupiter price requests (one per
+    JUPITER_PRICE_BATCH mints and input token) and takes full quotes only for
+    pairs near a level, not yet calibrated, or unpriced by the batch.
+    """
+
+    async def refresh(self, client, pairs):
+        by_input = {}
+        for pair in pairs:
+            by_input.setdefault(pair.input_mint, []).append(pair.output_mint)
+        batches = await asyncio.gather(
+            *(client.prices(mints, vs_token=input_mint) for input_mint, mints in by_input.items()),
+            return_exceptions=True,
         )
-        price_buy = USD_AMOUNT / token_received if token_received else None
-        price_sell = usdc_returned / token_received if token_received and usdc_returned else None
-
-        for alert_list, alert_dict, current_price, label in [
-            (BUY_ALERTS,  last_buy_alert,  price_buy,  "buy"),
-            (SELL_ALERTS, last_sell_alert, price_sell, "sell")
-        ]:
-            for raw_price in alert_list:
-                key = f"{float(raw_price):.8f}"
-                last_time = alert_dict.get(key)
-                if not last_time:
-                    continue
-
-                # ensure tz‐aware UTC
-                if last_time.tzinfo is None:
-                    last_time = last_time.replace(tzinfo=timezone.utc)
-                else:
-                    last_time = last_time.astimezone(timezone.utc)
+        spot = {}
+        for input_mint, prices in zip(by_input, batches):
+            if isinstance(prices, Exception):
+                print(f"⚠️ Spot prices for {input_mint} pairs failed, quoting them instead: {prices}", flush=True)
+                continue
+            spot[input_mint] = prices
 
-                delta = now_utc - last_time
-                cooldown_expired = (
-                    ALERT_RESET_MINUTES > 0 and
-                    delta >= timedelta(minutes=ALERT_RESET_MINUTES)
-                )
-                should_be_active = (
-                    current_price is not None and
-                    ((label == "buy"  and current_price <= float(raw_price)) or
-                     (label == "sell" and current_price >= float(raw_price)))
+        quoted = [p for p in pairs if not p.apply_spot(spot.get(p.input_mint, {}).get(p.output_mint))]
+        results = dict(zip(map(id, quoted), await super().refresh(client, quoted)))
+        for pair in quoted:
+            pair.calibrate(spot.get(pair.input_mint, {}).get(pair.output_mint))
+        print(f"🔎 {len(pairs) - len(quoted)} pairs priced from spot, {len(quoted)} quoted", flush=True)
+        return [results.get(id(p)) for p in pairs]
+
+
+PRICE_SOURCES = {"quote": QuotePriceSource, "spot": SpotPriceSource}
+price_source = PRICE_SOURCES.get(PRICE_SOURCE, QuotePriceSource)()
+
+
+async def check_all_pairs(client, pairs):
+    local_now = datetime.now().astimezone()
+    print(f"\n📅 {local_now.strftime('%Y-%m-%d %H:%M:%S %Z')} — Price Check ({len(pairs)} pairs)", flush=True)
+
+    started = time.monotonic()
+    results = await price_source.refresh(client, pairs)
+    for pair, result in zip(pairs, results):
+        if isinstance(result, Exception):
+            print(f"❌ [{pair.name}] Error: {result}", flush=True)
+        else:
+            evaluate_pair(pair)
+
+    print(f"⏱️ Checked {len(pairs)} pairs in {time.monotonic() - started:.2f}s", flush=True)
+
+
+async def run_multi_pair(pairs_file):
+    global pair_sink
+    pairs = load_pairs(pairs_file, load_pair_triggers(pairs_json_path))
+    print(f"🚀 Jupiter Price Monitor started in multi-pair mode ({len(pairs)} pairs).", flush=True)
+    if PRICE_SOURCE not in PRICE_SOURCES:
+        print(f"⚠️ Unknown PRICE_SOURCE '{PRICE_SOURCE}' — using quotes", flush=True)
+    by_key = {pair.key: pair for pair in pairs}
+    pair_sink = channel = PairChannel(MONITOR_CHANNEL_URL)
+    channel.start()
+    channel.send_keys(by_key)
+
+    def after_cycle(pairs, checked):
+        write_pairs_json(pairs)
+        for pair in checked:
+            channel.send_pair(pair.key, pair.to_json())
+
+    def updates():
+        rearmed = [
+            by_key[key] for key, side, units, before in channel.take_resets()
+            if key in by_key and reset_pair(by_key[key], side, units, before)
+        ]
+        if rearmed:
+            after_cycle(pairs, rearmed)
+
+    await run_pairs(pairs, after_cycle, updates)
+
+
+async def run_pairs(pairs, after_cycle, updates=None):
+    """
+    Check `pairs` as they come due; `after_cycle(pairs, checked)` runs after
+    every check. `updates()`, if given, is polled about once a second and may
+    return a new pair list: pairs kept from the old one keep their schedule,
+    new ones are checked right away.
+    """
+    # Pairs wait in a heap by next due time; each wake-up checks only the ones that are due.
+    # Dropped pairs stay in the heap until they surface and are skipped.
+    scheduler = PollScheduler()
+    for pair in pairs:
+        scheduler.schedule(pair, 0)
+    active = set(map(id, pairs))
+
+    async with create_quote_client() as client:
+        while True:
+            wake = scheduler.next_due()
+            if updates is not None:
+                wake = min(wake, time.monotonic() + 1.0) if wake is not None else time.monotonic() + 1.0
+                await asyncio.sleep(max(0.0, wake - time.monotonic()))
+                replaced = updates()
+                if replaced is not None:
+                    for pair in replaced:
+                        if id(pair) not in active:
+                            scheduler.schedule(pair, 0)
+                    pairs, active = replaced, set(map(id, replaced))
+            elif wake is None:
+                return  # nothing to check, ever
+            else:
+                await asyncio.sleep(max(0.0, wake - time.monotonic()))
+
+            started = time.monotonic()
+            if scheduler.next_due() is None or scheduler.next_due() > started:
+                continue
+            CHECK_LATENESS_SECONDS.labels("pairs").observe(max(0.0, started - scheduler.next_due()))
+            due = [p for p in scheduler.pop_due(started) if id(p) in active]
+            if not due:
+                continue
+            try:
+                await check_all_pairs(client, due)
+            except Exception as e:
+                print(f"❌ Error: {e}", flush=True)
+            CHECK_CYCLE_SECONDS.labels("pairs").observe(time.monotonic() - started)
+            for pair in due:
+                delay = pair.poll.next_delay(
+                    pair.price_buy, pair.price_sell, pair.buy_index.values, pair.sell_index.values
                 )
+                scheduler.schedule(pair, delay, started)
+            after_cycle(pairs, due)
 
-                if cooldown_expired and should_be_active:
-                    try:
-                        print(f"🧹 [BG] {label.upper()} alert {key} expired — auto-resetting", flush=True)
-                        resp = requests.post(
-                            "http://127.0.0.1:8000/api/reset-alert",
-                            json={"side": label, "price": float(raw_price)}
-                        )
-                        if resp.ok:
-                            # clear locally and persist so check_prices/UI see it immediately
-                            alert_dict.pop(key, None)
-                            write_status_json(None, None, None, None)
-                    except Exception as e:
-                        print(f"❌ [BG] Failed to auto-reset {label.upper()} alert {key}: {e}", flush=True)
 
-        time.sleep(5)
+class PairChannel(MonitorChannel):
+    """
+    The MonitorChannel of a multi-pair monitor: its pair list, pair statuses
+    and triggers for the API, and the resets the API sends back. Stands in for
+    pair_sink in the single-process monitor.
+    """
 
+    def __init__(self, url):
+        super().__init__(url, on_message=self._received)
+        self.resets = queue.Queue()
 
+    def _received(self, message):
+        if message.get("type") == "reset":
+            self.resets.put(message)
 
+    def take_resets(self):
+        """Resets received since the last call, as (pair key, side, units, trigger time to undo)."""
+        resets = []
+        while True:
+            try:
+                message = self.resets.get_nowait()
+            except queue.Empty:
+                return resets
+            try:
+                resets.append((message["pair"], message["side"], to_units(message["key"]), parse_time(message["before"])))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"⚠️ Skipping reset {message}: {e}", flush=True)
 
+    def send_keys(self, keys):
+        self.send({"type": "pairs", "keys": list(keys)})
 
-# 🚀 NEW: Handle reset requests that trigger again immediately if needed
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
-from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+    def send_pair(self, key, snapshot):
+        self.send({"type": "pair", "pair": key, "state": snapshot})
 
-app = FastAPI()
+    def send_trigger(self, key, side, units, fired_at):
+        self.send({
+            "type": "trigger", "pair": key, "side": side,
+            "price": units_key(units), "timestamp": format_time(fired_at),
+        })
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    def trigger(self, pair, side, units, fired_at):
+        self.send_trigger(pair.key, side, units, fired_at)
 
-class ResetAlert(BaseModel):
-    side: str
-    price: float
-
-@app.post("/api/reset-alert")
-def reset_alert(data: ResetAlert):
-    key = f"{data.price:.8f}"
-    if data.side == "buy":
-        last_buy_alert.pop(key, None)
-    elif data.side == "sell":
-        last_sell_alert.pop(key, None)
-    else:
-        return {"success": False, "error": "Invalid side"}
 
-    # ✨ Immediately write updated config so it's saved
-    write_status_json(None, None, None, None)
-    return {"success": True}
+class ShardEvents:
+    """
+    A worker's alerts, triggers and pair snapshots, handed to the supervisor
+    in one queue message per cycle. Stands in for both ntfy_outbox (the
+    supervisor owns the outbox file) and pair_sink.
+    """
+
+    def __init__(self, shard, events):
+        self.shard = shard
+        self.events = events
+        self.alerts = []
+        self.triggers = []
+
+    def send(self, topic, title, message):
+        self.alerts.append((topic, title, message))
+
+    def trigger(self, pair, side, units, fired_at):
+        self.triggers.append((pair.key, side, units, fired_at))
+
+    def flush(self, checked):
+        self.events.put((self.shard, [(p.key, p.to_json()) for p in checked], self.triggers, self.alerts))
+        self.alerts, self.triggers = [], []
+
+
+def run_shard_worker(shard, workers, assigned, commands, events):
+    """
+    Worker process: runs the multi-pair loop over its share of the pairs.
+    `assigned` is a list of (entry, triggers) for the pairs it owns; later
+    ("assign", assigned) commands replace it, and ("reset", key, side, units,
+    before) ones re-arm a level.
+    """
+    global ntfy_outbox, pair_sink
+    ntfy_outbox = pair_sink = ShardEvents(shard, events)
+    # Each process has its own bucket, so each gets its share of the Jupiter limit
+    rate_limiter.set_limit(JUPITER_RATE_LIMIT / workers, JUPITER_BURST / workers)
+    owned = {}  # pair key -> (entry, PairState)
+
+    def assign(assigned):
+        kept = {}
+        for entry, triggers in assigned:
+            key = entry_key(entry)
+            current = owned.get(key)
+            # Unchanged pairs keep their state; new or edited ones start from the supervisor's trigger times
+            if current is None or current[0] != entry:
+                current = (entry, pair_from_entry(entry, triggers))
+            kept[key] = current
+        owned.clear()
+        owned.update(kept)
+        return [pair for _, pair in owned.values()]
+
+    def updates():
+        latest, resets = None, []
+        while True:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                break
+            if command[0] == "assign":
+                latest = command[1]
+            else:
+                resets.append(command[1:])
+        pairs = None
+        if latest is not None:
+            pairs = assign(latest)
+            print(f"🧩 Shard {shard} now has {len(pairs)} pairs", flush=True)
+        rearmed = [
+            owned[key][1] for key, side, units, before in resets
+            if key in owned and reset_pair(owned[key][1], side, units, before)
+        ]
+        if rearmed:
+            # Report them now, so the supervisor's file and the API don't wait for their next check
+            ntfy_outbox.flush(rearmed)
+        return pairs
+
+    pairs = assign(assigned)
+    print(f"🧩 Shard {shard} started with {len(pairs)} pairs", flush=True)
+    try:
+        asyncio.run(run_pairs(pairs, lambda pairs, checked: ntfy_outbox.flush(checked), updates))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardSupervisor:
+    """
+    Splits PAIRS_FILE across `workers` processes by consistent hashing and
+    collects what they report: alerts go out through this process' ntfy
+    outbox, pair snapshots into pairs-latest.json, and triggers and prices to
+    the API over one PairChannel, which brings resets back to the owning
+    worker. Edits to PAIRS_FILE are rebalanced onto the running workers; a
+    worker that dies is restarted with its pairs.
+    """
+
+    def __init__(self, pairs_file, workers):
+        self.pairs_file = pairs_file
+        self.ring = HashRing(range(workers))
+        # spawn: workers start from a clean interpreter, not a fork of this one's threads
+        self.ctx = multiprocessing.get_context("spawn")
+        self.events = self.ctx.Queue()
+        self.channel = PairChannel(MONITOR_CHANNEL_URL)
+        # The last run's trigger times, for pairs no worker has reported on yet
+        self.saved_triggers = load_pair_triggers(pairs_json_path)
+        self.entries = {}      # pair key -> entry, in PAIRS_FILE order
+        self.snapshots = {}    # pair key -> latest to_json() from its worker
+        self.assignment = {shard: [] for shard in self.ring.shards}
+        self.processes = {}
+        self.commands = {}
+        self._source = None
+
+    def _assigned(self, shard):
+        # Trigger times travel with a pair when it moves, so its cooldowns survive the move
+        return [
+            (self.entries[key], self._triggers(key))
+            for key in self.assignment[shard]
+        ]
+
+    def _triggers(self, key):
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            return self.saved_triggers.get(key)
+        return snapshot["last_triggered_buy"], snapshot["last_triggered_sell"]
+
+    def start_worker(self, shard):
+        commands = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=run_shard_worker,
+            args=(shard, len(self.ring.shards), self._assigned(shard), commands, self.events),
+            name=f"pair-shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[shard] = process
+        self.commands[shard] = commands
+
+    def reload(self):
+        """Pick up PAIRS_FILE changes and send every shard whose pairs changed its new list."""
+        fingerprint = file_fingerprint(self.pairs_file)
+        if fingerprint == self._source:
+            return
+        self._source = fingerprint
+        try:
+            entries = load_pair_entries(self.pairs_file)
+        except Exception as e:
+            print(f"⚠️ Failed to load {self.pairs_file}: {e}", flush=True)
+            return
+
+        previous, self.entries = self.entries, {}
+        for entry in entries:
+            key = entry_key(entry)
+            if key in self.entries:
+                print(f"⚠️ Skipping duplicate pair {key}", flush=True)
+                continue
+            self.entries[key] = entry
+        for key in set(self.snapshots) - set(self.entries):
+            del self.snapshots[key]
+        self.channel.send_keys(self.entries)
+
+        assignment = self.ring.assign(self.entries)
+        for shard, keys in assignment.items():
+            changed = keys != self.assignment[shard] or any(self.entries[k] != previous.get(k) for k in keys)
+            self.assignment[shard] = keys
+            if shard in self.processes and changed:
+                self.commands[shard].put(("assign", self._assigned(shard)))
+        sizes = ", ".join(str(len(keys)) for keys in assignment.values())
+        print(f"🧩 {len(self.entries)} pairs across {len(assignment)} shards ({sizes})", flush=True)
+
+    def revive(self):
+        for shard in self.ring.shards:
+            process = self.processes.get(shard)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"⚠️ Shard {shard} exited ({process.exitcode}) — restarting it", flush=True)
+            self.start_worker(shard)
+
+    def handle(self, shard, pairs, triggers, alerts):
+        for topic, title, message in alerts:
+            ntfy_outbox.send(topic, title, message)
+        for key, side, units, fired_at in triggers:
+            self.channel.send_trigger(key, side, units, fired_at)
+        for key, snapshot in pairs:
+            if key not in self.entries:
+                continue  # removed while that cycle ran
+            self.snapshots[key] = snapshot
+            self.channel.send_pair(key, snapshot)
+
+    def forward_resets(self):
+        for key, side, units, before in self.channel.take_resets():
+            if key in self.entries:
+                self.commands[self.ring.shard_for(key)].put(("reset", key, side, units, before))
+
+    def write_status(self):
+        keys, snapshots = list(self.entries), self.snapshots
+        pairs_writer.merge({
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "alert_reset_minutes": CONFIG.alert_reset_minutes,
+            # Built on the writer's thread; a pair removed meanwhile is just skipped
+            "pairs": lambda: [p for p in map(snapshots.get, keys) if p is not None],
+        })
+
+    def run(self):
+        print(f"🚀 Jupiter Price Monitor started in sharded multi-pair mode ({len(self.ring.shards)} workers).", flush=True)
+        self.channel.start()
+        self.reload()
+        self.revive()
+        checked = time.monotonic()
+        while True:
+            try:
+                message = self.events.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            else:
+                self.handle(*message)
+                self.write_status()
+            self.forward_resets()
+            if time.monotonic() - checked >= SHARD_CHECK_SECONDS:
+                checked = time.monotonic()
+                self.reload()
+                self.revive()
+
 
 if __name__ == "__main__":
+    print("✅ Starting script, checking env vars...", flush=True)
+    ntfy_outbox.start()  # resends anything left over from the last run
+    start_http_server(METRICS_PORT)
+
+    if PAIRS_FILE:
+        print(f"PAIRS_FILE: {PAIRS_FILE}", flush=True)
+        if SHARD_WORKERS > 1:
+            ShardSupervisor(PAIRS_FILE, SHARD_WORKERS).run()
+        else:
+            asyncio.run(run_multi_pair(PAIRS_FILE))
+        exit(0)
+
+    print(f"INPUT_MINT: {INPUT_MINT}", flush=True)
+    print(f"OUTPUT_MINT: {OUTPUT_MINT}", flush=True)
+
+    if not INPUT_MINT or not OUTPUT_MINT:
+        print("❌ Missing required environment variables. Exiting.", flush=True)
+        exit(1)
+
     print("🚀 Jupiter Price Monitor started.", flush=True)
     
     # 🧠 Start background cleaner in a thread
     threading.Thread(target=background_alert_cleaner, daemon=True).start()
     
     
+    # 📡 Streamed prices, if configured, in their own event loop
+    stream = create_price_stream(wake=stream_dropped.set)
+    if stream:
+        threading.Thread(target=asyncio.run, args=(stream.run(),), name="price-stream", daemon=True).start()
+
+    poll = create_poll()
+    due = time.monotonic()
     while True:
+        started = time.monotonic()
+        CHECK_LATENESS_SECONDS.labels("single").observe(max(0.0, started - due))
+        delay = CHECK_INTERVAL
         try:
-            check_prices()
+            delay = next_check_delay(poll, check_prices())
         except Exception as e:
             print(f"❌ Error: {e}", flush=True)
-        time.sleep(CHECK_INTERVAL)
+        CHECK_CYCLE_SECONDS.labels("single").observe(time.monotonic() - started)
+        due = started + stream_poll_delay(delay)
+        # A dropped stream cuts the wait short
+        if stream_dropped.wait(max(0.0, due - time.monotonic())):
+            stream_dropped.clear()
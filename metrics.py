@@ -0,0 +1,80 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Shared by the API (/metrics) and the monitor (its own port, or /metrics when embedded).
+# With several API workers, PROMETHEUS_MULTIPROC_DIR makes every worker write its samples
+# there and /metrics adds them up; gauges then need a multiprocess_mode.
+
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_seconds",
+    "Latency of upstream HTTP requests",
+    ["upstream"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total",
+    "Upstream HTTP requests by response status (\"error\" when no response came back)",
+    ["upstream", "status"],
+)
+
+CHECK_CYCLE_SECONDS = Histogram(
+    "check_cycle_seconds",
+    "Duration of one price check cycle",
+    ["mode"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+CHECK_LATENESS_SECONDS = Histogram(
+    "check_lateness_seconds",
+    "How long after its scheduled time a price check started",
+    ["mode"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60),
+)
+
+STATE_WRITE_SECONDS = Histogram(
+    "state_write_seconds",
+    "Time spent in state/status write calls on the hot path",
+    ["writer"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+STATE_FLUSH_SECONDS = Histogram(
+    "state_flush_seconds",
+    "Time spent writing a JSON state file to disk",
+    ["file"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
+
+NOTIFICATION_SECONDS = Histogram(
+    "notification_send_seconds",
+    "Latency of one notification push",
+    ["channel"],
+)
+NOTIFICATION_FAILURES = Counter(
+    "notification_failures_total",
+    "Notification pushes that failed (including ones retried later)",
+    ["channel"],
+)
+
+ALERT_EVALUATIONS = Counter(
+    "alert_evaluations_total",
+    "Prices evaluated against alert levels",
+    ["source"],
+)
+ALERTS_FIRED = Counter(
+    "alerts_fired_total",
+    "Alerts that fired",
+    ["source"],
+)
+
+STREAM_TICKS = Counter(
+    "price_stream_ticks_total",
+    "Streamed price ticks, evaluated or coalesced into a newer one",
+    ["outcome"],
+)
+STREAM_TICK_TO_ALERT_SECONDS = Histogram(
+    "price_stream_tick_to_alert_seconds",
+    "Time from reading a streamed tick to queuing the alerts it fired",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+STREAM_CONNECTED = Gauge(
+    "price_stream_connected",
+    "1 while the price stream is up, 0 while polling is the only price source",
+    multiprocess_mode="livemax",  # only the leader worker streams
+)
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+from persistence import JsonStateWriter
+from metrics import NOTIFICATION_FAILURES, NOTIFICATION_SECONDS
+
+NTFY_OUTBOX_PATH = os.getenv("NTFY_OUTBOX_PATH", "/shared/ntfy-outbox.json")
+NTFY_OUTBOX_SIZE = int(os.getenv("NTFY_OUTBOX_SIZE", "500"))
+NTFY_TIMEOUT = float(os.getenv("NTFY_TIMEOUT", "10"))
+# Alerts queued within this window (one price check) go out as a single push
+NTFY_BUNDLE_WINDOW = float(os.getenv("NTFY_BUNDLE_WINDOW", "1"))
+NTFY_BUNDLE_MAX = 20
+# Minimum gap between pushes to the same topic; alerts queued meanwhile are bundled
+NTFY_MIN_INTERVAL = float(os.getenv("NTFY_MIN_INTERVAL", "5"))
+NTFY_MAX_ATTEMPTS = int(os.getenv("NTFY_MAX_ATTEMPTS", "8"))
+RETRY_BASE = 2.0
+RETRY_MAX = 300.0
+
+
+class NtfyOutbox:
+    """
+    Bounded queue of ntfy pushes drained by one background thread, so callers
+    never wait on the notifier. Failed pushes are retried with exponential
+    backoff (or the server's Retry-After), every topic is rate limited on its
+    own, and undelivered messages are saved to disk and resent after a restart.
+    The file is only read and written once the outbox is started, so a process
+    that imports the monitor without sending (a shard worker) never touches it.
+    """
+
+    def __init__(self, server, path=NTFY_OUTBOX_PATH, maxsize=NTFY_OUTBOX_SIZE):
+        self.server = server.rstrip("/")
+        self.maxsize = maxsize
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._session = requests.Session()
+        self._next_send = {}  # topic -> time.time() before which nothing is pushed
+        self._thread = None
+        self._path = path
+        self._writer = None
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                pending = json.load(f).get("pending", [])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Could not read ntfy outbox: {e}", flush=True)
+            return
+        self._pending.extend(pending[-self.maxsize:])
+        if self._pending:
+            print(f"📬 {len(self._pending)} undelivered alert(s) restored from the outbox", flush=True)
+
+    def _persist(self):
+        # Snapshot taken when the debounced write runs, not on every change
+        if self._writer:
+            self._writer.merge({"pending": self._snapshot})
+
+    def _snapshot(self):
+        # Messages are copied because attempts change in place
+        with self._cond:
+            return [dict(m) for m in self._pending]
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                if self._path:
+                    self._writer = JsonStateWriter(self._path)
+                    self._load(self._path)
+                self._thread = threading.Thread(target=self._run, name="ntfy-outbox", daemon=True)
+                self._thread.start()
+
+    def send(self, topic, title, message):
+        self.start()  # restores what the last run left before anything new is queued
+        with self._cond:
+            if len(self._pending) >= self.maxsize:
+                dropped = self._pending.popleft()
+                print(f"⚠️ ntfy outbox full — dropping '{dropped['title']}'", flush=True)
+            self._pending.append({
+                "topic": topic,
+                "title": title,
+                "message": message,
+                "created": time.time(),
+                "attempts": 0,
+            })
+            self._persist()
+            self._cond.notify()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _next_batch(self):
+        """Block until some topic may be pushed, then return its oldest messages."""
+        with self._cond:
+            while True:
+                now = time.time()
+                wake = None
+                for m in self._pending:
+                    ready_at = max(self._next_send.get(m["topic"], 0.0), m["created"] + NTFY_BUNDLE_WINDOW)
+                    if ready_at <= now:
+                        topic = m["topic"]
+                        return topic, [p for p in self._pending if p["topic"] == topic][:NTFY_BUNDLE_MAX]
+                    wake = ready_at if wake is None else min(wake, ready_at)
+                self._cond.wait(None if wake is None else wake - now)
+
+    def _run(self):
+        while True:
+            topic, batch = self._next_batch()
+            delivered, retry_after = self._post(topic, batch)
+
+            with self._cond:
+                now = time.time()
+                if delivered:
+                    done = batch
+                    self._next_send[topic] = now + NTFY_MIN_INTERVAL
+                else:
+                    for m in batch:
+                        m["attempts"] += 1
+                    done = [m for m in batch if m["attempts"] >= NTFY_MAX_ATTEMPTS]
+                    for m in done:
+                        print(f"❌ Giving up on alert '{m['title']}' after {m['attempts']} attempts", flush=True)
+                    backoff = min(RETRY_MAX, RETRY_BASE * 2 ** (batch[0]["attempts"] - 1))
+                    self._next_send[topic] = now + max(backoff, retry_after or 0.0)
+
+                if done:
+                    sent = {id(m) for m in done}
+                    self._pending = deque(m for m in self._pending if id(m) not in sent)
+                self._persist()
+
+    def _post(self, topic, batch):
+        """Push `batch` as one notification. Returns (delivered, retry_after seconds or None)."""
+        if len(batch) == 1:
+            title, body = batch[0]["title"], batch[0]["message"]
+        else:
+            title = f"{len(batch)} Price Alerts"
+            body = "\n".join(f"{m['title']}: {m['message']}" for m in batch)
+
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+        params = None
+        if title.isascii():
+            headers["Title"] = title
+        else:
+            params = {"title": title}  # HTTP headers can't carry non-latin titles
+
+        started = time.perf_counter()
+        try:
+            res = self._session.post(
+                f"{self.server}/{topic}",
+                data=body.encode("utf-8"),
+                headers=headers,
+                params=params,
+                timeout=NTFY_TIMEOUT,
+            )
+        except requests.RequestException as e:
+            NOTIFICATION_FAILURES.labels("ntfy").inc()
+            print(f"⚠️ Failed to send alert, will retry: {e}", flush=True)
+            return False, None
+        finally:
+            NOTIFICATION_SECONDS.labels("ntfy").observe(time.perf_counter() - started)
+
+        if res.ok:
+            return True, None
+        NOTIFICATION_FAILURES.labels("ntfy").inc()
+        if res.status_code == 429 or res.status_code >= 500:
+            print(f"⚠️ ntfy returned {res.status_code}, will retry", flush=True)
+            try:
+                return False, float(res.headers.get("Retry-After", 0))
+            except ValueError:
+                return False, None
+
+        # Any other 4xx won't get better by retrying
+        print(f"❌ ntfy rejected alert '{title}' ({res.status_code}): {res.text[:200]}", flush=True)
+        return True, None
@@ -0,0 +1,94 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from metrics import STATE_FLUSH_SECONDS
+
+# Dirty fields are collected for this long before one write hits the disk,
+# which also caps every file at 1 / PERSIST_DEBOUNCE writes per second
+PERSIST_DEBOUNCE = float(os.getenv("PERSIST_DEBOUNCE", "0.5"))
+
+_writers = []
+
+
+def file_fingerprint(path):
+    """(inode, mtime, size) of `path`, or None if it doesn't exist. Atomic renames always change the inode."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def write_atomic(path, data):
+    """Write `data` to a temp file next to `path` and rename it into place."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonStateWriter:
+    """
+    Write-behind JSON document. `merge()` records changed top-level fields and
+    arms a debounce timer; when it fires, every field merged since the last
+    write goes out in one compact, atomic write. Callers must pass values they
+    will not mutate afterwards (copy lists/dicts that stay live in memory), or
+    a zero-argument callable that builds the value when the write happens.
+    """
+
+    def __init__(self, path, debounce=None):
+        self.path = path
+        self.debounce = PERSIST_DEBOUNCE if debounce is None else debounce
+        self._document = {}
+        self._dirty = {}
+        self._timer = None
+        self.written_fingerprint = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        _writers.append(self)
+
+    def merge(self, fields):
+        with self._lock:
+            self._dirty.update(fields)
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write pending changes now (no-op when nothing is dirty)."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                dirty, self._dirty = self._dirty, {}
+            # Outside the lock: a callable may take its owner's lock, which can be held around merge()
+            for key, value in dirty.items():
+                self._document[key] = value() if callable(value) else value
+            data = json.dumps(self._document, separators=(",", ":"))
+            started = time.perf_counter()
+            try:
+                write_atomic(self.path, data)
+                STATE_FLUSH_SECONDS.labels(os.path.basename(self.path)).observe(time.perf_counter() - started)
+                # Lets a reader of the same file tell its own writes apart from other processes'
+                self.written_fingerprint = file_fingerprint(self.path)
+            except Exception as e:
+                print(f"❌ Failed to write {os.path.basename(self.path)}: {e}", flush=True)
+
+    @property
+    def pending(self):
+        return bool(self._dirty)
+
+
+@atexit.register
+def flush_all():
+    for writer in _writers:
+        writer.flush()
@@ -0,0 +1,101 @@
+import heapq
+import itertools
+import math
+import time
+from bisect import bisect_left, bisect_right
+
+# Weight of the newest return in the volatility estimate
+VOLATILITY_ALPHA = 0.2
+# Log distance (≈0.5%) within which a pair whose price hasn't moved yet still counts as at a level
+NEAR_LEVEL = 0.005
+
+
+class AdaptivePoll:
+    """
+    Picks the delay until a pair's next quote from how far its price is from
+    the nearest level that could fire and how fast it has been moving.
+
+    Volatility is an EWMA of squared log returns per second. Treating price
+    as a random walk, covering a log distance d takes about (d / (z * sigma))²
+    seconds at z standard deviations, so a pair far from every level or
+    barely moving is polled rarely and one close to a level often. The
+    result is always clamped to [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval, max_interval, default_interval, safety=3.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.safety = safety
+        self.variance = None  # per second, of log price
+        self._last = None     # (monotonic time, price)
+
+    def _clamp(self, seconds):
+        return min(self.max_interval, max(self.min_interval, seconds))
+
+    def observe(self, price, now=None):
+        now = time.monotonic() if now is None else now
+        if self._last is not None and price > 0 and self._last[1] > 0:
+            dt = now - self._last[0]
+            if dt > 0:
+                sample = math.log(price / self._last[1]) ** 2 / dt
+                if self.variance is None:
+                    self.variance = sample
+                else:
+                    self.variance += VOLATILITY_ALPHA * (sample - self.variance)
+        self._last = (now, price)
+
+    def next_delay(self, price_buy, price_sell, buy_levels, sell_levels, now=None):
+        """
+        Record this cycle's prices and return seconds until the next poll.
+        `buy_levels`/`sell_levels` must be sorted (ThresholdIndex.values).
+        """
+        if not price_buy:
+            return self._clamp(self.default_interval)
+        self.observe(price_buy, now)
+
+        # Nearest level not crossed yet: the highest buy level under the buy
+        # price and the lowest sell level over the sell price
+        distance = None
+        i = bisect_left(buy_levels, price_buy)
+        if i > 0 and buy_levels[i - 1] > 0:
+            distance = math.log(price_buy / buy_levels[i - 1])
+        if price_sell:
+            j = bisect_right(sell_levels, price_sell)
+            if j < len(sell_levels):
+                d = math.log(sell_levels[j] / price_sell)
+                distance = d if distance is None else min(distance, d)
+
+        if distance is None:
+            return self.max_interval
+        if self.variance is None:
+            return self._clamp(self.default_interval)
+        if self.variance == 0:
+            # No movement seen doesn't mean none is coming: only a flat price far from every level waits long
+            return self.min_interval if distance <= NEAR_LEVEL else self.max_interval
+        return self._clamp((distance / (self.safety * math.sqrt(self.variance))) ** 2)
+
+
+class PollScheduler:
+    """Min-heap of items keyed by their next due time (time.monotonic())."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()  # ties keep insertion order and never compare items
+
+    def schedule(self, item, delay, now=None):
+        now = time.monotonic() if now is None else now
+        heapq.heappush(self._heap, (now + delay, next(self._seq), item))
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def __len__(self):
+        return len(self._heap)
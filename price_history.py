@@ -0,0 +1,157 @@
+import mmap
+import struct
+from datetime import datetime
+
+HEADER = struct.Struct("<8sQQQ")  # magic, capacity, count, head
+MAGIC = b"PXHIST01"
+
+
+def price_point(t_ms, buy_price, sell_price):
+    """One sample in the legacy `latest_prices` shape."""
+    return {
+        "timestamp": datetime.fromtimestamp(t_ms / 1000).astimezone().isoformat(),
+        "buy_price": buy_price,
+        "sell_price": sell_price,
+    }
+
+
+def ohlc_buckets(samples, resolution_ms):
+    """
+    OHLC buckets for (t_ms, buy, sell) samples in time order, aligned to
+    multiples of `resolution_ms`. Each bucket is
+    [bucket_start_ms, count, buy_o, buy_h, buy_l, buy_c, sell_o, sell_h, sell_l, sell_c].
+    """
+    out = []
+    bucket = None
+    for t, b, s in samples:
+        bucket_start = t - t % resolution_ms
+        if bucket is None or bucket[0] != bucket_start:
+            bucket = [bucket_start, 1, b, b, b, b, s, s, s, s]
+            out.append(bucket)
+            continue
+        bucket[1] += 1
+        if b > bucket[3]: bucket[3] = b
+        if b < bucket[4]: bucket[4] = b
+        bucket[5] = b
+        if s > bucket[7]: bucket[7] = s
+        if s < bucket[8]: bucket[8] = s
+        bucket[9] = s
+    return out
+
+
+class PriceHistory:
+    """
+    Fixed-size ring buffer of (timestamp ms, buy, sell) samples kept in a
+    memory-mapped file as three parallel int64/float64 arrays, so appends
+    never copy and the history survives restarts.
+    """
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        size = HEADER.size + capacity * 24
+
+        try:
+            fresh = not self._has_header(path)
+            with open(path, "w+b" if fresh else "r+b") as f:
+                f.truncate(size)
+                self._mm = mmap.mmap(f.fileno(), size)
+        except OSError as e:
+            print(f"⚠️ Price history not persisted ({e}) — keeping it in memory", flush=True)
+            fresh = True
+            self._mm = mmap.mmap(-1, size)
+
+        self._view = view = memoryview(self._mm)
+        offset = HEADER.size
+        self.ts = view[offset:offset + capacity * 8].cast("q")
+        offset += capacity * 8
+        self.buy = view[offset:offset + capacity * 8].cast("d")
+        offset += capacity * 8
+        self.sell = view[offset:offset + capacity * 8].cast("d")
+
+        if fresh:
+            self.count = self.head = 0
+            self._write_header()
+        else:
+            _, _, self.count, self.head = HEADER.unpack_from(self._mm, 0)
+
+    def _has_header(self, path):
+        try:
+            with open(path, "rb") as f:
+                magic, capacity, _, _ = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return False
+        if magic != MAGIC or capacity != self.capacity:
+            print(f"ℹ️ Price history at {path} has another layout — starting fresh", flush=True)
+            return False
+        return True
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, self.capacity, self.count, self.head)
+
+    def _slot(self, i):
+        # Logical index 0 is the oldest sample still in the buffer
+        return (self.head - self.count + i) % self.capacity
+
+    def _bisect(self, t_ms):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._slot(mid)] < t_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t_ms, buy_price, sell_price):
+        # Keep timestamps monotonic so range lookups can bisect
+        if self.count and t_ms < self.ts[self._slot(self.count - 1)]:
+            t_ms = self.ts[self._slot(self.count - 1)]
+        slot = self.head
+        self.ts[slot] = t_ms
+        self.buy[slot] = buy_price
+        self.sell[slot] = sell_price
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def clear(self):
+        self.count = self.head = 0
+        self._write_header()
+
+    def first_timestamp(self):
+        return self.ts[self._slot(0)] if self.count else None
+
+    def _points(self, first, last):
+        points = []
+        for i in range(first, last):
+            slot = self._slot(i)
+            points.append(price_point(self.ts[slot], self.buy[slot], self.sell[slot]))
+        return points
+
+    def latest(self, n):
+        """The newest `n` samples in the legacy `latest_prices` shape."""
+        return self._points(max(0, self.count - n), self.count)
+
+    def since(self, t_ms, n):
+        """Samples newer than `t_ms`, at most the newest `n` of them."""
+        return self._points(max(self._bisect(t_ms + 1), self.count - n), self.count)
+
+    def last_timestamp(self):
+        return self.ts[self._slot(self.count - 1)] if self.count else None
+
+    def buckets(self, start_ms, end_ms, resolution_ms):
+        """OHLC buckets over [start_ms, end_ms), see ohlc_buckets()."""
+        slots = (self._slot(i) for i in range(self._bisect(start_ms), self._bisect(end_ms)))
+        return ohlc_buckets(((self.ts[k], self.buy[k], self.sell[k]) for k in slots), resolution_ms)
+
+    def close(self):
+        self.ts.release()
+        self.buy.release()
+        self.sell.release()
+        self._view.release()
+        self._mm.flush()
+        self._mm.close()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import time
+from typing import NamedTuple
+
+import httpx
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from metrics import STREAM_CONNECTED, STREAM_TICKS
+
+# ws:// or wss:// for a WebSocket feed, http(s):// for line-delimited JSON over a streamed GET
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL")
+# No tick for this long counts as a dropped stream
+PRICE_STREAM_STALE = float(os.getenv("PRICE_STREAM_STALE", "30"))
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 60.0
+
+
+class Tick(NamedTuple):
+    """One streamed price. `received` is the perf_counter() reading when it came off the wire."""
+    mint: str
+    price: float
+    buy_price: float
+    sell_price: float
+    received: float
+
+
+def parse_ticks(payload, received):
+    """
+    Ticks from one message: a JSON object, a list of them, or several
+    newline-delimited. Each needs a `mint` (or `id`) and a `price`, or its own
+    `buy_price`/`sell_price`; anything else is skipped.
+    """
+    items = []
+    for line in payload.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        items.extend(data if isinstance(data, list) else [data])
+
+    ticks = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        mint = item.get("mint") or item.get("id")
+        try:
+            price, buy, sell = (float(item[k]) if item.get(k) is not None else None
+                                for k in ("price", "buy_price", "sell_price"))
+        except (TypeError, ValueError):
+            continue
+        if mint and (price or (buy and sell)):
+            ticks.append(Tick(mint, price, buy, sell, received))
+    return ticks
+
+
+class PriceStream:
+    """
+    Consumes a push price feed for `mints` and hands the newest tick of each
+    mint to `on_tick`, a blocking callable run in a worker thread. Ticks that
+    arrive while one is being evaluated replace each other, so a burst costs
+    one evaluation per mint. Reconnects with backoff; `on_state(connected)`
+    is called whenever the feed goes up or down.
+    """
+
+    def __init__(self, url, mints, on_tick, on_state=None):
+        self.url = url
+        self.mints = list(mints)
+        self.on_tick = on_tick
+        self.on_state = on_state
+        self.connected = False
+        self._latest = {}
+        self._pending = None
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            STREAM_CONNECTED.set(1 if connected else 0)
+            if self.on_state:
+                self.on_state(connected)
+
+    def _receive(self, payload):
+        for tick in parse_ticks(payload, time.perf_counter()):
+            if tick.mint in self._latest:
+                STREAM_TICKS.labels("coalesced").inc()
+            self._latest[tick.mint] = tick
+        if self._latest:
+            self._set_connected(True)
+            self._pending.set()
+
+    async def _evaluate(self):
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            ticks, self._latest = self._latest, {}
+            for tick in ticks.values():
+                STREAM_TICKS.labels("evaluated").inc()
+                try:
+                    await asyncio.to_thread(self.on_tick, tick)
+                except Exception as e:
+                    print(f"❌ Error evaluating streamed price for {tick.mint}: {e}", flush=True)
+
+    async def _consume_ws(self):
+        async with connect(self.url, open_timeout=PRICE_STREAM_STALE) as ws:
+            await ws.send(json.dumps({"subscribe": self.mints}))
+            while True:
+                message = await asyncio.wait_for(ws.recv(), PRICE_STREAM_STALE)
+                self._receive(message if isinstance(message, str) else message.decode())
+
+    async def _consume_lines(self):
+        timeout = httpx.Timeout(PRICE_STREAM_STALE)
+        async with httpx.AsyncClient(timeout=timeout) as http:
+            async with http.stream("GET", self.url, params={"ids": ",".join(self.mints)}) as res:
+                res.raise_for_status()
+                lines = res.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(anext(lines), PRICE_STREAM_STALE)
+                    except StopAsyncIteration:
+                        return
+                    self._receive(line)
+
+    async def run(self):
+        self._pending = asyncio.Event()
+        evaluator = asyncio.create_task(self._evaluate())
+        consume = self._consume_ws if self.url.startswith(("ws://", "wss://")) else self._consume_lines
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await consume()
+                    reason = "closed by the server"
+                except asyncio.TimeoutError:
+                    reason = f"no price for {PRICE_STREAM_STALE:.0f}s"
+                except (OSError, WebSocketException, httpx.HTTPError) as e:
+                    reason = str(e) or type(e).__name__
+                if self.connected:
+                    attempt = 0
+                self._set_connected(False)
+                delay = min(RECONNECT_MAX, RECONNECT_BASE * 2 ** attempt)
+                attempt += 1
+                print(f"📡 Price stream down ({reason}) — reconnecting in {delay:.0f}s", flush=True)
+                await asyncio.sleep(delay)
+        finally:
+            evaluator.cancel()
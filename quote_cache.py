@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class QuoteCache:
+    """
+    TTL cache for Jupiter quotes keyed by (input_mint, output_mint, amount).
+
+    Concurrent misses on the same key are collapsed into a single upstream
+    call (single-flight): the first caller fetches, everyone else waits for
+    its result. Failed lookups (None) are shared with the waiters but never
+    cached, so the next cycle retries.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = float(ttl)
+        self._entries = {}
+        self._inflight = {}
+        self._ainflight = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return True, entry[1]
+        return False, None
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            if value is not None and self.ttl > 0:
+                self._entries[key] = (now + self.ttl, value)
+            # Sell-leg amounts change every cycle, so drop stale keys now and then
+            if now >= self._next_sweep:
+                for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[k]
+                self._next_sweep = now + max(self.ttl, 1.0)
+
+    def get(self, key, fetch):
+        """Blocking lookup for threads; `fetch` is called at most once per key in flight."""
+        with self._lock:
+            hit, value = self._lookup(key, time.monotonic())
+            if hit:
+                return value
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+
+        if not leader:
+            call.done.wait()
+            return call.value
+
+        try:
+            call.value = fetch()
+        finally:
+            self._store(key, call.value)
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+        return call.value
+
+    async def aget(self, key, fetch):
+        """Async lookup; `fetch` is a coroutine function awaited at most once per key in flight."""
+        with self._lock:
+            hit, value = self._lookup(key, time.monotonic())
+        if hit:
+            return value
+
+        future = self._ainflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = future
+        value = None
+        try:
+            value = await fetch()
+        finally:
+            self._store(key, value)
+            self._ainflight.pop(key, None)
+            future.set_result(value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,122 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect
+
+# Points per shard on the hash ring; more points spread pairs more evenly
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+# Events held for the API while the channel is down; the oldest go first
+MONITOR_CHANNEL_BUFFER = int(os.getenv("MONITOR_CHANNEL_BUFFER", "100000"))
+MONITOR_CHANNEL_BATCH = 1000
+# Longest an idle channel goes without checking for messages from the API
+MONITOR_CHANNEL_RECEIVE = 0.5
+RECONNECT_MAX = 60.0
+
+
+def ring_hash(value):
+    # Stable across processes and runs, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of pair keys onto shards. Adding or removing a pair
+    never moves another one, and changing the shard count moves only about
+    1/n of them.
+    """
+
+    def __init__(self, shards, vnodes=SHARD_VNODES):
+        self.shards = list(shards)
+        points = sorted((ring_hash(f"{shard}#{i}"), shard) for shard in self.shards for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        i = bisect.bisect(self._hashes, ring_hash(key))
+        return self._owners[i % len(self._owners)]
+
+    def assign(self, keys):
+        """{shard: [keys]} for every shard, keys in their given order."""
+        assignment = {shard: [] for shard in self.shards}
+        for key in keys:
+            assignment[self.shard_for(key)].append(key)
+        return assignment
+
+
+class MonitorChannel:
+    """
+    One WebSocket to the API for every event of a multi-pair monitor. Events
+    queued since the last frame go out together as {"events": [...]}, so a
+    cycle of thousands of pairs costs a few frames, not a POST each. Reconnects
+    with backoff and keeps what was queued meanwhile, up to `maxsize` events.
+    Messages the API sends back (pair resets) go to `on_message`, on the
+    channel's thread.
+    """
+
+    def __init__(self, url, maxsize=MONITOR_CHANNEL_BUFFER, on_message=None):
+        self.url = url
+        self.on_message = on_message
+        self._pending = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="monitor-channel", daemon=True)
+            self._thread.start()
+
+    def send(self, event):
+        with self._cond:
+            self._pending.append(event)
+            self._cond.notify()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _next_batch(self, timeout):
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            return [self._pending.popleft() for _ in range(min(len(self._pending), MONITOR_CHANNEL_BATCH))]
+
+    def _requeue(self, batch):
+        with self._cond:
+            # Back in front, in order; anything past maxsize falls off the newest end
+            self._pending.extendleft(reversed(batch))
+
+    def _receive(self, ws):
+        while True:
+            try:
+                message = ws.recv(timeout=0)
+            except TimeoutError:
+                return
+            if self.on_message is not None:
+                self.on_message(json.loads(message))
+
+    def _run(self):
+        attempt = 0
+        while True:
+            try:
+                with connect(self.url, open_timeout=10) as ws:
+                    print(f"🔌 Monitor channel connected to {self.url}", flush=True)
+                    attempt = 0
+                    while True:
+                        batch = self._next_batch(MONITOR_CHANNEL_RECEIVE)
+                        if batch:
+                            try:
+                                ws.send(json.dumps({"events": batch}, separators=(",", ":")))
+                            except Exception:
+                                self._requeue(batch)
+                                raise
+                        self._receive(ws)
+            except (OSError, WebSocketException) as e:
+                delay = min(RECONNECT_MAX, 2 ** attempt)
+                attempt += 1
+                print(f"⚠️ Monitor channel down ({e}) — {len(self)} events queued, retrying in {delay}s", flush=True)
+                time.sleep(delay)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sqlite3
+
+# Seconds a leader lease lasts without renewal; the holder renews it every third of that
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+# How often each API worker reads the change log for the other workers' changes
+SHARED_STATE_POLL = float(os.getenv("SHARED_STATE_POLL", "0.25"))
+# Changes kept in the log; a worker that falls further behind reloads everything instead
+CHANGE_LOG_KEEP = 10000
+
+
+class LeaderLease:
+    """
+    A lease in the shared store that decides which API worker runs the jobs
+    there must be only one of. The holder renews it every ttl/3; when it stops
+    (crash, stalled event loop) another worker takes over once it expires.
+    A worker that can't renew steps down right away rather than risk two
+    leaders.
+    """
+
+    def __init__(self, store, name, holder, ttl=LEADER_LEASE_SECONDS):
+        self.store = store
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.held = False
+
+    async def run(self, on_acquired, on_lost):
+        try:
+            while True:
+                try:
+                    held = self.store.acquire_lease(self.name, self.holder, self.ttl)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Could not renew the {self.name} lease: {e}", flush=True)
+                    held = False
+                if held != self.held:
+                    self.held = held
+                    print(f"👑 Worker {self.holder} {'is now' if held else 'is no longer'} the {self.name}", flush=True)
+                    (on_acquired if held else on_lost)()
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if self.held:
+                # Hand over at once instead of after the lease runs out
+                self.store.release_lease(self.name, self.holder)
+
+
+class ChangeFeed:
+    """
+    Follows the store's change log and hands every change another worker
+    made to `apply(change_id, event, data)`, in order. SQLite has no
+    LISTEN/NOTIFY, so this polls; each poll is one indexed range read.
+    If the log was pruned past where this worker stopped, `resync(change_id)`
+    reloads everything instead.
+    """
+
+    def __init__(self, store, origin, apply, resync, since):
+        self.store = store
+        self.origin = origin
+        self.apply = apply
+        self.resync = resync
+        self.last_id = since
+        self._pruned_at = since
+
+    def poll(self, until=None):
+        """
+        Apply everything new. With `until`, stop after that id: a worker that
+        just logged change `until` applies the ones before it, then publishes
+        its own, and leaves the later ones for the next poll.
+        """
+        while until is None or self.last_id < until:
+            changes = self.store.changes_since(self.last_id)
+            if not changes:
+                return
+            # Ids are consecutive (writers are serialized), so a gap means pruned rows
+            if changes[0][0] > self.last_id + 1:
+                self.last_id = self.store.last_change_id()
+                self.resync(self.last_id)
+                return
+            for change_id, event, data, origin in changes:
+                if until is not None and change_id > until:
+                    return
+                self.last_id = change_id
+                if origin != self.origin:
+                    self.apply(change_id, event, data)
+            if self.last_id - self._pruned_at >= CHANGE_LOG_KEEP:
+                self.store.prune_changes(CHANGE_LOG_KEEP)
+                self._pruned_at = self.last_id
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(SHARED_STATE_POLL)
+            try:
+                self.poll()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not read shared changes: {e}", flush=True)
+            except Exception as e:
+                print(f"❌ Error applying shared changes: {e}", flush=True)
@@ -0,0 +1,460 @@
+"""
+SQLite (WAL) storage for the API: settings, BUY/SELL levels with their
+trigger times, a log of trigger events, Discord alerts with their last
+observed values, and price ticks. Every change is one short transaction
+over the rows it touches.
+
+The JSON files remain the import/export format:
+
+    python sqlite_store.py export /shared/monitor.db /backup
+    python sqlite_store.py import /shared/monitor.db /backup
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from fixed_point import from_units, parse_time, to_units, triggers_from_json, triggers_to_json
+from persistence import write_atomic
+from price_history import ohlc_buckets, price_point
+
+CONFIG_FILE = "config.json"
+STATE_FILE = "jupiter-latest.json"
+ALERTS_FILE = "discord-alerts.json"
+# Price rows past capacity are pruned every this many appends, not on each one
+PRUNE_EVERY = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS levels (
+    side TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    value REAL NOT NULL,
+    triggered_at REAL,
+    PRIMARY KEY (side, units)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trigger_events (
+    id INTEGER PRIMARY KEY,
+    side TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    fired_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trigger_events_level ON trigger_events (side, units, fired_at);
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    contract TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    type TEXT NOT NULL,
+    guild_id TEXT,
+    channel_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_key ON alerts (contract, pair, type);
+CREATE INDEX IF NOT EXISTS alerts_guild ON alerts (guild_id, channel_id);
+CREATE INDEX IF NOT EXISTS alerts_channel ON alerts (channel_id);
+CREATE TABLE IF NOT EXISTS alert_values (
+    contract TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (contract, pair, type)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS prices (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    buy REAL NOT NULL,
+    sell REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prices_ts ON prices (ts);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    origin TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pair_states (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SqliteStore:
+    """
+    One connection shared by the API's threads behind a lock. WAL keeps
+    readers (e.g. the sqlite3 CLI or a backup) from blocking writes, and
+    synchronous=NORMAL makes each commit a WAL append without an fsync.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _is_empty(db):
+        return not any(
+            db.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in ("settings", "levels", "alerts", "prices")
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ——————— settings and levels ———————
+
+    def settings(self):
+        return {name: json.loads(value) for name, value in self.query("SELECT name, value FROM settings")}
+
+    def set_setting(self, name, value):
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+
+    def levels(self, side):
+        """(sorted level values, {units: trigger time}) for one side."""
+        rows = self.query("SELECT units, value, triggered_at FROM levels WHERE side = ? ORDER BY units", (side,))
+        return [value for _, value, _ in rows], {units: t for units, _, t in rows if t is not None}
+
+    def add_levels(self, side, values):
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO levels (side, units, value) VALUES (?, ?, ?)",
+                [(side, to_units(v), v) for v in values],
+            )
+
+    def remove_level(self, side, units):
+        with self.transaction() as db:
+            db.execute("DELETE FROM levels WHERE side = ? AND units = ?", (side, units))
+
+    def trigger(self, side, units, fired_at):
+        with self.transaction() as db:
+            db.execute("UPDATE levels SET triggered_at = ? WHERE side = ? AND units = ?", (fired_at, side, units))
+            db.execute("INSERT INTO trigger_events (side, units, fired_at) VALUES (?, ?, ?)", (side, units, fired_at))
+
+    def reset(self, side, units):
+        with self.transaction() as db:
+            db.execute("UPDATE levels SET triggered_at = NULL WHERE side = ? AND units = ?", (side, units))
+
+    def trigger_events(self, limit=100):
+        """The newest trigger events, newest first."""
+        rows = self.query("SELECT side, units, fired_at FROM trigger_events ORDER BY id DESC LIMIT ?", (limit,))
+        return [{"side": side, "price": from_units(units), "fired_at": t} for side, units, t in rows]
+
+    # ——————— Discord alerts ———————
+
+    def alerts(self, guild_id=None, channel_id=None, contract=None):
+        """Alerts in the order they were added, optionally filtered (each filter is indexed)."""
+        where, params = [], []
+        for column, value in (("guild_id", guild_id), ("channel_id", channel_id), ("contract", contract)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT data FROM alerts" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY rowid"
+        return [json.loads(data) for data, in self.query(sql, params)]
+
+    def add_alert(self, alert):
+        with self.transaction() as db:
+            self._insert_alert(db, alert)
+
+    def _insert_alert(self, db, alert):
+        db.execute(
+            "INSERT OR REPLACE INTO alerts (id, contract, pair, type, guild_id, channel_id, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (alert["id"], alert["contract"], alert["pair"], alert["type"],
+             alert.get("guild_id"), alert.get("channel_id"), json.dumps(alert)),
+        )
+
+    def delete_alert(self, alert_id):
+        with self.transaction() as db:
+            row = db.execute("SELECT contract, pair, type FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+            if row is None:
+                return
+            db.execute("DELETE FROM alerts WHERE id = ?", (alert_id,))
+            # Last observed values only matter while some alert watches that key
+            db.execute(
+                "DELETE FROM alert_values WHERE contract = ? AND pair = ? AND type = ? AND NOT EXISTS "
+                "(SELECT 1 FROM alerts WHERE contract = ? AND pair = ? AND type = ?)",
+                row + row,
+            )
+
+    def alert_values(self):
+        return {(c, p, t): v for c, p, t, v in self.query("SELECT contract, pair, type, value FROM alert_values")}
+
+    def set_alert_values(self, values):
+        """Upsert {(contract, pair, type): value} for the keys observed in one pass."""
+        if not values:
+            return
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO alert_values VALUES (?, ?, ?, ?)",
+                [(*key, value) for key, value in values.items()],
+            )
+
+    # ——————— shared state across API workers ———————
+
+    def epoch(self):
+        """Tag for this database, the same in every process that opens it."""
+        (value,), = self.query("SELECT value FROM meta WHERE name = 'epoch'")
+        return value
+
+    def record_change(self, event, data, origin):
+        """Append to the change log; the returned id is the new shared state version."""
+        with self.transaction() as db:
+            return db.execute(
+                "INSERT INTO changes (event, data, origin) VALUES (?, ?, ?)",
+                (event, json.dumps(data, separators=(",", ":")), origin),
+            ).lastrowid
+
+    def last_change_id(self):
+        (change_id,), = self.query("SELECT COALESCE(MAX(id), 0) FROM changes")
+        return change_id
+
+    def changes_since(self, change_id, limit=1000):
+        """[(id, event, data, origin)] logged after `change_id`, oldest first."""
+        rows = self.query(
+            "SELECT id, event, data, origin FROM changes WHERE id > ? ORDER BY id LIMIT ?", (change_id, limit)
+        )
+        return [(i, event, json.loads(data), origin) for i, event, data, origin in rows]
+
+    def prune_changes(self, keep):
+        with self.transaction() as db:
+            db.execute("DELETE FROM changes WHERE id <= (SELECT MAX(id) FROM changes) - ?", (keep,))
+
+    def acquire_lease(self, name, holder, ttl):
+        """Take or renew the lease `name` for `ttl` seconds; False while someone else holds it."""
+        now = time.time()
+        with self.transaction() as db:
+            row = db.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, holder, now + ttl))
+        return True
+
+    def release_lease(self, name, holder):
+        with self.transaction() as db:
+            db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def pair_states(self):
+        return [json.loads(state) for state, in self.query("SELECT state FROM pair_states ORDER BY key")]
+
+    def pair_state(self, key):
+        rows = self.query("SELECT state FROM pair_states WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_pair_states(self, states):
+        """Upsert {pair key: status} in one transaction."""
+        if not states:
+            return
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO pair_states VALUES (?, ?)",
+                [(key, json.dumps(state)) for key, state in states.items()],
+            )
+
+    def keep_pair_states(self, keys):
+        """Drop the status of every pair not in `keys`."""
+        keep = set(keys)
+        with self.transaction() as db:
+            stale = [(key,) for key, in db.execute("SELECT key FROM pair_states") if key not in keep]
+            db.executemany("DELETE FROM pair_states WHERE key = ?", stale)
+
+    # ——————— JSON import / export ———————
+
+    def import_documents(self, config, latest, alerts_doc, defaults, replace=True):
+        """
+        Replace everything with the contents of config.json,
+        jupiter-latest.json and discord-alerts.json (each may be {});
+        settings and levels missing from config.json come from `defaults`.
+        With replace=False nothing happens unless the store is empty, which
+        is checked in the same transaction. Returns whether it imported.
+        """
+        triggered = {
+            "buy": triggers_from_json(latest.get("last_triggered_buy", {})),
+            "sell": triggers_from_json(latest.get("last_triggered_sell", {})),
+        }
+        prices = []
+        for entry in latest.get("latest_prices", []):
+            try:
+                prices.append((int(parse_time(entry["timestamp"]) * 1000), float(entry["buy_price"]), float(entry["sell_price"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        with self.transaction() as db:
+            if not replace and not self._is_empty(db):
+                return False
+            for table in ("settings", "levels", "trigger_events", "alerts", "alert_values", "prices"):
+                db.execute(f"DELETE FROM {table}")
+            for name in ("usd_amount", "alert_reset_minutes"):
+                db.execute("INSERT INTO settings VALUES (?, ?)", (name, json.dumps(config.get(name, defaults[name]))))
+            for side in ("buy", "sell"):
+                for value in config.get(f"{side}_alerts", defaults[f"{side}_alerts"]):
+                    units = to_units(value)
+                    db.execute(
+                        "INSERT OR IGNORE INTO levels VALUES (?, ?, ?, ?)",
+                        (side, units, float(value), triggered[side].get(units)),
+                    )
+            for alert in alerts_doc.get("alerts", []):
+                self._insert_alert(db, alert)
+            db.executemany(
+                "INSERT OR REPLACE INTO alert_values VALUES (?, ?, ?, ?)",
+                [(*key.split("|", 2), value) for key, value in alerts_doc.get("last_values", {}).items()],
+            )
+            db.executemany("INSERT INTO prices (ts, buy, sell) VALUES (?, ?, ?)", sorted(prices))
+        return True
+
+    def export_documents(self, latest_prices=100):
+        """(config.json, jupiter-latest.json, discord-alerts.json) documents as the JSON backend writes them."""
+        settings = self.settings()
+        buy, triggered_buy = self.levels("buy")
+        sell, triggered_sell = self.levels("sell")
+        config = {
+            "usd_amount": settings.get("usd_amount"),
+            "buy_alerts": buy,
+            "sell_alerts": sell,
+            "alert_reset_minutes": settings.get("alert_reset_minutes"),
+        }
+        latest = {
+            "last_triggered_buy": triggers_to_json(triggered_buy),
+            "last_triggered_sell": triggers_to_json(triggered_sell),
+            "latest_prices": SqlitePriceHistory(self, capacity=None).latest(latest_prices),
+        }
+        alerts_doc = {
+            "alerts": self.alerts(),
+            "last_values": {"|".join(key): value for key, value in self.alert_values().items()},
+        }
+        return config, latest, alerts_doc
+
+
+class SqlitePriceHistory:
+    """PriceHistory's interface over the `prices` table, keeping the newest `capacity` ticks."""
+
+    def __init__(self, store, capacity):
+        self.store = store
+        self.capacity = capacity
+        self._appends = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the row count after the table was changed behind our back (e.g. an import)."""
+        (self.count, self._last_ts), = self.store.query("SELECT COUNT(*), MAX(ts) FROM prices")
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t_ms, buy_price, sell_price):
+        # Keep timestamps monotonic, as the ring buffer does
+        if self._last_ts is not None and t_ms < self._last_ts:
+            t_ms = self._last_ts
+        with self.store.transaction() as db:
+            db.execute("INSERT INTO prices (ts, buy, sell) VALUES (?, ?, ?)", (t_ms, buy_price, sell_price))
+            count = self.count + 1
+            self._appends += 1
+            if self.capacity and count > self.capacity and self._appends >= PRUNE_EVERY:
+                # Row ids are consecutive, so this keeps exactly the newest `capacity`
+                db.execute("DELETE FROM prices WHERE id <= (SELECT MAX(id) FROM prices) - ?", (self.capacity,))
+                self._appends = 0
+                count = self.capacity
+        self.count = count
+        self._last_ts = t_ms
+
+    def clear(self):
+        with self.store.transaction() as db:
+            db.execute("DELETE FROM prices")
+        self.count = 0
+        self._last_ts = None
+
+    def first_timestamp(self):
+        (ts,), = self.store.query("SELECT MIN(ts) FROM prices")
+        return ts
+
+    def last_timestamp(self):
+        return self._last_ts
+
+    def latest(self, n):
+        """The newest `n` samples in the legacy `latest_prices` shape."""
+        rows = self.store.query("SELECT ts, buy, sell FROM prices ORDER BY id DESC LIMIT ?", (n,))
+        return [price_point(*row) for row in reversed(rows)]
+
+    def since(self, t_ms, n):
+        """Samples newer than `t_ms`, at most the newest `n` of them."""
+        rows = self.store.query("SELECT ts, buy, sell FROM prices WHERE ts > ? ORDER BY id DESC LIMIT ?", (t_ms, n))
+        return [price_point(*row) for row in reversed(rows)]
+
+    def buckets(self, start_ms, end_ms, resolution_ms):
+        """OHLC buckets over [start_ms, end_ms), see ohlc_buckets()."""
+        rows = self.store.query(
+            "SELECT ts, buy, sell FROM prices WHERE ts >= ? AND ts < ? ORDER BY ts, id", (start_ms, end_ms)
+        )
+        return ohlc_buckets(rows, resolution_ms)
+
+    def close(self):
+        pass  # the store owns the connection
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] not in ("import", "export"):
+        sys.exit("usage: python sqlite_store.py import|export DB_PATH JSON_DIR")
+    command, db_path, directory = argv
+    store = SqliteStore(db_path)
+    paths = [os.path.join(directory, name) for name in (CONFIG_FILE, STATE_FILE, ALERTS_FILE)]
+
+    if command == "export":
+        os.makedirs(directory, exist_ok=True)
+        for path, document in zip(paths, store.export_documents()):
+            write_atomic(path, json.dumps(document, indent=2))
+        print(f"📤 Exported {db_path} to {directory}")
+    else:
+        config, latest, alerts_doc = map(read_json, paths)
+        defaults = {"usd_amount": 100.0, "buy_alerts": [], "sell_alerts": [], "alert_reset_minutes": 0}
+        store.import_documents(config, latest, alerts_doc, defaults)
+        print(f"📥 Imported {directory} into {db_path}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from event_stream import EventBroker
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    # SQLite storage with the monitor embedded: nothing is read from or mirrored to /shared
+    tmp = tmp_path_factory.mktemp("api")
+    (tmp / "frontend").mkdir()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("STORAGE_BACKEND", "sqlite")
+        mp.setenv("SQLITE_PATH", str(tmp / "monitor.db"))
+        mp.setenv("EMBEDDED_MONITOR", "1")
+        mp.chdir(tmp)
+        yield importlib.import_module("backend_api")
+
+
+@pytest.fixture
+def client(api):
+    return TestClient(api.app)
+
+
+def test_etag_matching(api):
+    etag_matches = api.etag_matches
+    etag = 'W/"abc-7"'
+    assert etag_matches('W/"abc-7"', etag)
+    assert etag_matches('"abc-7"', etag)
+    assert etag_matches('W/"abc-6", W/"abc-7"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"abc-6"', etag)
+    assert not etag_matches('W/"other-7"', etag)
+
+
+def test_state_is_304_until_it_changes(api, client):
+    first = client.get("/api/state")
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert etag == f'W/"{api.STATE_EPOCH}-{api.state_version}"'
+
+    cached = client.get("/api/state", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    api.state_changed("config", {"usd_amount": 100})
+    changed = client.get("/api/state", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_field_selection_shares_the_etag(client):
+    full = client.get("/api/state")
+    partial = client.get("/api/state?fields=usd_amount")
+    assert partial.json() == {"usd_amount": full.json()["usd_amount"]}
+    assert partial.headers["etag"] == full.headers["etag"]
+    assert client.get("/api/state?fields=bogus").status_code == 400
+
+
+def stream_request():
+    return Request({"type": "http", "method": "GET", "path": "/api/stream", "headers": [], "query_string": b""})
+
+
+def parse_sse(message):
+    fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+    return int(fields["id"]), fields["event"]
+
+
+def test_stream_starts_from_a_snapshot_then_sends_numbered_deltas(api):
+    async def read_stream():
+        response = await api.stream_events(stream_request())
+        events = response.body_iterator
+        try:
+            snapshot = parse_sse(await anext(events))
+            api.state_changed("config", {"usd_amount": 250})
+            # Another worker's change, applied through the shared change log
+            api.store.record_change("reset", {"side": "buy", "key": "1.00000000"}, "other-worker")
+            api.change_feed.poll()
+            return snapshot, parse_sse(await anext(events)), parse_sse(await anext(events))
+        finally:
+            await events.aclose()
+
+    version = api.state_version
+    snapshot, own, remote = asyncio.run(read_stream())
+    # A reconnecting client resumes from the snapshot's id; deltas continue from there
+    assert snapshot == (version, "snapshot")
+    assert own == (version + 1, "config")
+    assert remote == (version + 2, "reset")
+    assert api.state_version == version + 2
+
+
+def test_slow_subscriber_is_dropped_to_resync():
+    async def overflow():
+        broker = EventBroker(queue_size=2)
+        queue = broker.subscribe()
+        for event_id in range(3):
+            broker.publish(event_id, "price", {})
+        return len(broker), [queue.get_nowait() for _ in range(queue.qsize())]
+
+    subscribers, queued = asyncio.run(overflow())
+    assert subscribers == 0
+    # Only the close marker is left: the stream ends and the client reconnects to a snapshot
+    assert queued == [None]
@@ -0,0 +1,65 @@
+import threading
+
+from cooldowns import CooldownTimers
+
+
+def timers(buy=None, sell=None, reset_minutes=1):
+    sides = {"buy": dict(buy or {}), "sell": dict(sell or {})}
+    cooldowns = CooldownTimers(sides)
+    cooldowns.rebuild(reset_minutes)
+    return cooldowns, sides
+
+
+def test_pops_expired_levels_in_expiry_order():
+    cooldowns, _ = timers(buy={1: 100.0, 2: 50.0}, sell={3: 75.0})
+    assert cooldowns.pop_expired(50.0 + 59) == []
+    assert cooldowns.pop_expired(100.0 + 60) == [("buy", 2, 50.0), ("sell", 3, 75.0), ("buy", 1, 100.0)]
+    assert cooldowns.pop_expired(10_000.0) == []
+
+
+def test_levels_that_fired_again_or_were_reset_are_skipped():
+    cooldowns, sides = timers(buy={1: 100.0, 2: 100.0})
+    sides["buy"][1] = 130.0          # fired again
+    cooldowns.arm("buy", 1, 130.0)
+    del sides["buy"][2]              # reset
+    assert cooldowns.pop_expired(170.0) == []
+    assert cooldowns.pop_expired(190.0) == [("buy", 1, 130.0)]
+
+
+def test_zero_reset_minutes_never_expires():
+    cooldowns, _ = timers(buy={1: 100.0}, reset_minutes=0)
+    cooldowns.arm("buy", 2, 100.0)
+    assert cooldowns.pop_expired(10 ** 12) == []
+
+
+def test_changing_the_cooldown_rebuilds_the_heap():
+    cooldowns, _ = timers(buy={1: 100.0}, reset_minutes=10)
+    assert cooldowns.pop_expired(100.0 + 60) == []
+    cooldowns.set_reset_minutes(1)
+    assert cooldowns.pop_expired(100.0 + 60) == [("buy", 1, 100.0)]
+
+
+def test_retry_looks_again_later(monkeypatch):
+    cooldowns, _ = timers(buy={1: 100.0})
+    assert cooldowns.pop_expired(160.0) == [("buy", 1, 100.0)]
+    monkeypatch.setattr("cooldowns.time.time", lambda: 1000.0)
+    cooldowns.retry("buy", 1, 100.0, 5)
+    assert cooldowns.pop_expired(1004.0) == []
+    assert cooldowns.pop_expired(1005.0) == [("buy", 1, 100.0)]
+
+
+def test_wait_returns_false_once_stopped_and_woken():
+    cooldowns, _ = timers()
+    stop = threading.Event()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(cooldowns.wait(stop)))
+    waiter.start()
+    stop.set()
+    cooldowns.wake()
+    waiter.join(timeout=5)
+    assert result == [False]
+
+
+def test_wait_returns_true_when_a_level_is_due():
+    cooldowns, _ = timers(buy={1: 0.0})
+    assert cooldowns.wait() is True
@@ -0,0 +1,47 @@
+import pytest
+
+from fixed_point import format_time, from_units, parse_time, to_units, triggers_from_json, triggers_to_json, units_key
+
+
+def test_strings_are_exact():
+    assert to_units("0.1") == 10_000_000
+    assert to_units("0.10000000") == to_units("0.1")
+    assert to_units(" 1.23456789 ") == 123_456_789
+
+
+def test_floats_round_to_the_nearest_unit():
+    assert to_units(0.1 + 0.2) == to_units("0.3")
+    assert to_units(0.000000009) == 1
+    assert to_units(2) == 200_000_000
+
+
+def test_sub_unit_strings_round_half_even():
+    assert to_units("0.000000005") == 0
+    assert to_units("0.000000015") == 2
+
+
+def test_bad_prices_raise_value_error():
+    with pytest.raises(ValueError):
+        to_units("abc")
+    with pytest.raises(ValueError):
+        to_units(float("inf"))
+
+
+def test_units_key_matches_the_legacy_format():
+    for price in (0.1, 1.5, 123.45678901, 0.00001234):
+        assert units_key(to_units(price)) == f"{price:.8f}"
+    assert units_key(-150_000_000) == "-1.50000000"
+    assert from_units(to_units("2.5")) == 2.5
+
+
+def test_times_round_trip():
+    epoch = 1767225600.123456
+    assert parse_time(format_time(epoch)) == pytest.approx(epoch, abs=1e-6)
+    assert format_time(0) == "1970-01-01T00:00:00+00:00"
+
+
+def test_triggers_round_trip_and_skip_bad_entries():
+    triggers = {to_units("0.5"): 1767225600.0, to_units("2"): 1767225700.5}
+    assert triggers_from_json(triggers_to_json(triggers)) == triggers
+    raw = {"0.50000000": "2026-01-01T00:00:00+00:00", "x": "2026-01-01T00:00:00+00:00", "1.0": "", "2.0": "not a time"}
+    assert triggers_from_json(raw) == {50_000_000: 1767225600.0}
@@ -0,0 +1,42 @@
+from shards import HashRing
+
+KEYS = [f"USDC:TOKEN{i}:100" for i in range(2000)]
+
+
+def owners(ring):
+    return {key: ring.shard_for(key) for key in KEYS}
+
+
+def test_assignment_is_stable_across_instances():
+    assert owners(HashRing(range(4))) == owners(HashRing(range(4)))
+
+
+def test_every_shard_gets_a_fair_share():
+    counts = {shard: len(keys) for shard, keys in HashRing(range(4)).assign(KEYS).items()}
+    assert set(counts) == {0, 1, 2, 3}
+    assert sum(counts.values()) == len(KEYS)
+    assert min(counts.values()) > len(KEYS) / 4 * 0.6
+
+
+def test_assign_keeps_the_given_order():
+    assignment = HashRing(range(3)).assign(KEYS)
+    for keys in assignment.values():
+        assert keys == sorted(keys, key=KEYS.index)
+
+
+def test_adding_a_shard_only_moves_keys_onto_it():
+    before, after = owners(HashRing(range(4))), owners(HashRing(range(5)))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 4 for key in moved)
+    # About 1/5 of the keys, not a reshuffle
+    assert len(moved) < len(KEYS) * 0.35
+
+
+def test_removing_a_shard_only_moves_its_keys():
+    before, after = owners(HashRing(range(5))), owners(HashRing(range(4)))
+    assert all(before[key] == 4 for key in KEYS if before[key] != after[key])
+
+
+def test_adding_or_removing_keys_moves_no_other_key():
+    ring = HashRing(range(4))
+    assert ring.assign(KEYS[:1000])[2] == [key for key in ring.assign(KEYS)[2] if key in set(KEYS[:1000])]
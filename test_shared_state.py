@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import shared_state
+from shared_state import ChangeFeed, LeaderLease
+from sqlite_store import SqliteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteStore(str(tmp_path / "monitor.db"))
+    yield store
+    store.close()
+
+
+class Recorder:
+    def __init__(self):
+        self.applied = []
+        self.resyncs = []
+
+    def apply(self, change_id, event, data):
+        self.applied.append((change_id, event, data))
+
+    def resync(self, change_id):
+        self.resyncs.append(change_id)
+
+
+def feed(store, origin="w1", since=0):
+    recorder = Recorder()
+    return ChangeFeed(store, origin, recorder.apply, recorder.resync, since), recorder
+
+
+def test_applies_other_workers_changes_in_order(store):
+    change_feed, recorder = feed(store)
+    store.record_change("price", 1, "w2")
+    store.record_change("config", 2, "w1")
+    store.record_change("trigger", 3, "w3")
+    change_feed.poll()
+    assert recorder.applied == [(1, "price", 1), (3, "trigger", 3)]
+    assert change_feed.last_id == 3
+    change_feed.poll()
+    assert len(recorder.applied) == 2
+
+
+def test_poll_until_stops_at_the_callers_change(store):
+    change_feed, recorder = feed(store)
+    store.record_change("price", 1, "w2")
+    own = store.record_change("config", 2, "w1")
+    store.record_change("price", 3, "w2")
+    change_feed.poll(until=own)
+    assert recorder.applied == [(1, "price", 1)]
+    assert change_feed.last_id == own
+    change_feed.poll()
+    assert recorder.applied[-1] == (3, "price", 3)
+
+
+def test_pruned_gap_resyncs_instead_of_skipping(store):
+    change_feed, recorder = feed(store)
+    for n in range(5):
+        store.record_change("price", n, "w2")
+    store.prune_changes(2)
+    change_feed.poll()
+    assert recorder.applied == []
+    assert recorder.resyncs == [5]
+    assert change_feed.last_id == 5
+
+
+def test_prunes_the_log_as_it_goes(store, monkeypatch):
+    monkeypatch.setattr(shared_state, "CHANGE_LOG_KEEP", 3)
+    change_feed, recorder = feed(store)
+    for n in range(5):
+        store.record_change("price", n, "w2")
+    change_feed.poll()
+    assert len(recorder.applied) == 5
+    assert [c[0] for c in store.changes_since(0)] == [3, 4, 5]
+
+
+def test_leader_hands_over_the_lease_when_stopped(store):
+    events = []
+
+    async def lead_briefly():
+        lease = LeaderLease(store, "leader", "w1", ttl=30)
+        task = asyncio.create_task(lease.run(lambda: events.append("acquired"), lambda: events.append("lost")))
+        await asyncio.sleep(0.05)
+        assert not store.acquire_lease("leader", "w2", 30)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(lead_briefly())
+    assert events == ["acquired"]
+    assert store.acquire_lease("leader", "w2", 30)
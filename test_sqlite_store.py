@@ -0,0 +1,66 @@
+import pytest
+
+from sqlite_store import SqliteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteStore(str(tmp_path / "monitor.db"))
+    yield store
+    store.close()
+
+
+def test_lease_is_exclusive_until_it_expires(store, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("sqlite_store.time.time", lambda: now[0])
+    assert store.acquire_lease("leader", "a", 15)
+    assert not store.acquire_lease("leader", "b", 15)
+    now[0] += 10
+    # Renewing pushes the expiry out again
+    assert store.acquire_lease("leader", "a", 15)
+    now[0] += 10
+    assert not store.acquire_lease("leader", "b", 15)
+    now[0] += 6
+    assert store.acquire_lease("leader", "b", 15)
+    assert not store.acquire_lease("leader", "a", 15)
+
+
+def test_released_lease_can_be_taken_at_once(store):
+    assert store.acquire_lease("leader", "a", 15)
+    store.release_lease("leader", "b")  # not b's to release
+    assert not store.acquire_lease("leader", "b", 15)
+    store.release_lease("leader", "a")
+    assert store.acquire_lease("leader", "b", 15)
+
+
+def test_leases_are_independent(store):
+    assert store.acquire_lease("leader", "a", 15)
+    assert store.acquire_lease("other", "b", 15)
+
+
+def test_change_log_ids_are_consecutive_versions(store):
+    assert store.last_change_id() == 0
+    ids = [store.record_change("price", {"n": n}, "w1") for n in range(3)]
+    assert ids == [1, 2, 3]
+    assert store.last_change_id() == 3
+    assert store.changes_since(1) == [(2, "price", {"n": 1}, "w1"), (3, "price", {"n": 2}, "w1")]
+    assert store.changes_since(0, limit=1) == [(1, "price", {"n": 0}, "w1")]
+
+
+def test_prune_keeps_the_newest_changes(store):
+    for n in range(10):
+        store.record_change("price", n, "w1")
+    store.prune_changes(3)
+    assert [c[0] for c in store.changes_since(0)] == [8, 9, 10]
+    # Ids keep counting up after a prune
+    assert store.record_change("price", 10, "w1") == 11
+
+
+def test_epoch_survives_reopening(tmp_path):
+    path = str(tmp_path / "monitor.db")
+    first = SqliteStore(path)
+    epoch = first.epoch()
+    first.close()
+    second = SqliteStore(path)
+    assert second.epoch() == epoch
+    second.close()
@@ -0,0 +1,72 @@
+from token_alerts import TokenAlertIndex
+
+KEY = ("MINT", "SOL", "price")
+
+
+def alert(alert_id, condition, value):
+    return {"id": alert_id, "contract": "MINT", "pair": "SOL", "type": "price", "condition": condition, "value": value}
+
+
+def fired_ids(index, value):
+    return sorted(a["id"] for a in index.crossings(KEY, value))
+
+
+def test_first_value_fires_what_already_holds():
+    index = TokenAlertIndex([alert("a1", "above", 1.0), alert("a2", "above", 3.0), alert("b1", "below", 1.5)])
+    assert fired_ids(index, 2.0) == ["a1"]
+
+
+def test_fires_once_per_crossing():
+    index = TokenAlertIndex([alert("a", "above", 2.0)], {KEY: 1.0})
+    assert fired_ids(index, 2.5) == ["a"]
+    # Staying above doesn't fire again
+    assert fired_ids(index, 3.0) == []
+    # Back below and up again is a new crossing
+    assert fired_ids(index, 1.0) == []
+    assert fired_ids(index, 2.1) == ["a"]
+
+
+def test_one_move_fires_every_threshold_it_passes():
+    alerts = [alert("a1", "above", 1.0), alert("a2", "above", 2.0), alert("a3", "above", 4.0)]
+    alerts += [alert("b1", "below", 0.5), alert("b2", "below", 3.0)]
+    index = TokenAlertIndex(alerts, {KEY: 0.9})
+    assert fired_ids(index, 3.0) == ["a1", "a2"]
+    assert fired_ids(index, 0.4) == ["b1", "b2"]
+
+
+def test_reaching_a_threshold_is_not_past_it():
+    index = TokenAlertIndex([alert("a", "above", 2.0), alert("b", "below", 1.0)], {KEY: 1.5})
+    assert fired_ids(index, 2.0) == []
+    assert fired_ids(index, 2.0001) == ["a"]
+    assert fired_ids(index, 1.0) == []
+    assert fired_ids(index, 0.9999) == ["b"]
+
+
+def test_new_alert_that_already_holds_fires_once():
+    index = TokenAlertIndex([], {KEY: 5.0})
+    index.add(alert("a", "above", 2.0))
+    assert fired_ids(index, 5.0) == ["a"]
+    assert fired_ids(index, 5.5) == []
+
+
+def test_new_alert_is_not_fired_twice_when_also_crossed():
+    index = TokenAlertIndex([alert("old", "above", 0.1)])
+    assert fired_ids(index, 1.0) == ["old"]
+    index.add(alert("a", "above", 2.0))
+    assert fired_ids(index, 3.0) == ["a"]
+
+
+def test_duplicates_and_unknown_conditions_are_rejected():
+    index = TokenAlertIndex([alert("a", "above", 2.0)])
+    assert not index.add(alert("a2", "above", 2.0))
+    assert not index.add(alert("a", "below", 1.0))
+    assert not index.add(alert("c", "equals", 1.0))
+    assert len(index) == 1
+
+
+def test_removing_the_last_alert_forgets_the_key():
+    index = TokenAlertIndex([alert("a", "above", 2.0)], {KEY: 1.0})
+    assert index.remove("a")["id"] == "a"
+    assert index.remove("a") is None
+    assert KEY not in index.last_values
+    assert index.crossings(KEY, 3.0) == []
@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+
+
+def alert_key(alert):
+    return (alert["contract"], alert["pair"], alert["type"])
+
+
+def alert_signature(alert):
+    return (alert["contract"], alert["pair"], alert["type"], alert["condition"], alert["value"])
+
+
+class _Thresholds:
+    """One side of a key: alerts sorted by threshold value."""
+
+    def __init__(self):
+        self.values = []
+        self.alerts = []
+
+    def add(self, alert):
+        i = bisect_right(self.values, alert["value"])
+        self.values.insert(i, alert["value"])
+        self.alerts.insert(i, alert)
+
+    def remove(self, alert):
+        i = bisect_left(self.values, alert["value"])
+        while self.alerts[i] is not alert:
+            i += 1
+        del self.values[i]
+        del self.alerts[i]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TokenAlertIndex:
+    """
+    Multi-token Discord alerts grouped by (contract, pair, type), with the
+    `above` and `below` thresholds of each group kept sorted.
+
+    Alerts are edge-triggered: with the last observed value per key, the
+    thresholds crossed by a new value form one contiguous slice per side,
+    found by bisection. An alert that stays past its threshold doesn't fire
+    again until the value goes back and crosses it once more. A newly added
+    alert is checked once against the next value, so one that already holds
+    still notifies.
+    """
+
+    def __init__(self, alerts=(), last_values=None):
+        self._groups = {}       # key -> {"above": _Thresholds, "below": _Thresholds}
+        self._by_id = {}
+        self._signatures = set()
+        self._new = {}          # key -> alerts not evaluated yet
+        self.last_values = dict(last_values or {})
+        for alert in alerts:
+            self.add(alert)
+
+    def __contains__(self, alert):
+        return alert_signature(alert) in self._signatures
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, alert):
+        """Index `alert`; False if an identical one already exists."""
+        signature = alert_signature(alert)
+        if signature in self._signatures or alert["id"] in self._by_id:
+            return False
+        if alert["condition"] not in ("above", "below"):
+            return False
+        key = alert_key(alert)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {"above": _Thresholds(), "below": _Thresholds()}
+        group[alert["condition"]].add(alert)
+        self._signatures.add(signature)
+        self._by_id[alert["id"]] = alert
+        self._new.setdefault(key, []).append(alert)
+        return True
+
+    def remove(self, alert_id):
+        alert = self._by_id.pop(alert_id, None)
+        if alert is None:
+            return None
+        key = alert_key(alert)
+        group = self._groups[key]
+        group[alert["condition"]].remove(alert)
+        self._signatures.discard(alert_signature(alert))
+        if key in self._new:
+            self._new[key] = [a for a in self._new[key] if a is not alert]
+        if not group["above"] and not group["below"]:
+            del self._groups[key]
+            self._new.pop(key, None)
+            self.last_values.pop(key, None)
+        return alert
+
+    def keys(self):
+        return self._groups.keys()
+
+    def contracts(self):
+        return {key[0] for key in self._groups}
+
+    def crossings(self, key, value):
+        """Alerts under `key` that fire now that `value` was observed; records `value`."""
+        group = self._groups.get(key)
+        if group is None:
+            return []
+        previous = self.last_values.get(key)
+        self.last_values[key] = value
+
+        above, below = group["above"], group["below"]
+        if previous is None:
+            # Nothing to compare against yet: everything that holds fires once
+            fired = above.alerts[:bisect_left(above.values, value)]
+            fired += below.alerts[bisect_right(below.values, value):]
+            self._new.pop(key, None)
+            return fired
+
+        fired = []
+        if value > previous:
+            # above: previous <= threshold < value
+            fired = above.alerts[bisect_left(above.values, previous):bisect_left(above.values, value)]
+        elif value < previous:
+            # below: value < threshold <= previous
+            fired = below.alerts[bisect_right(below.values, value):bisect_right(below.values, previous)]
+
+        new = self._new.pop(key, None)
+        if new:
+            seen = {id(a) for a in fired}
+            for alert in new:
+                holds = value > alert["value"] if alert["condition"] == "above" else value < alert["value"]
+                if holds and id(alert) not in seen:
+                    fired.append(alert)
+        return fired